@@ -89,6 +89,9 @@ if _initialize_octodon_env():
     from datetime import datetime
     from octodon.clockwork import ClockWorkTimeLog
     from octodon.cli import get_config
+    from octodon.daemon import get_socket_path
+    from octodon.daemon import request
+    from octodon.exceptions import DaemonError
     from octodon.github import Github
     from octodon.utils import format_spent_time
     from octodon.utils import get_time_sum
@@ -138,7 +141,16 @@ def OctodonClock():
     ticket_match = Github.ticket_pattern.search(line)
     if ticket_match:
         config = get_config()
-        if config.has_section("github"):
+        issue_id = ticket_match[1]
+        summary = None
+        # ask octodond first, it has the issues at hand
+        socket_path = get_socket_path(config)
+        if os.path.exists(socket_path):
+            try:
+                summary = request(socket_path, "issue_title", issue_id=issue_id, timeout=5)
+            except DaemonError:
+                summary = None
+        if summary is None and config.has_section("github"):
             if config.has_option("github", "token_command"):
                 cmd = config.get("github", "token_command")
                 token = subprocess.check_output(cmd.split(" ")).strip().decode("utf-8")
@@ -151,11 +163,11 @@ def OctodonClock():
             except:
                 issue = None
             if issue:
-                issue_id = ticket_match[1]
                 summary = issue.get("title", "")
-                issue_text = f"{summary} {issue_id}"
-                if issue_text not in line:
-                    line = line.replace(issue_id, issue_text)
+        if summary:
+            issue_text = f"{summary} {issue_id}"
+            if issue_text not in line:
+                line = line.replace(issue_id, issue_text)
     vim.current.line = line
 
     # when previous line is empty, start a new day
@@ -34,7 +34,6 @@ setup(
     license="BSD",
     packages=find_packages("src", exclude=["ez_setup"]),
     package_dir={"": "src"},
-    namespace_packages=["octodon"],
     include_package_data=True,
     zip_safe=False,
     install_requires=[
@@ -43,11 +42,13 @@ setup(
         "github3api",
         "pystache",
         "python-harvest-redux",
+        "requests",
         "setuptools",
     ],
     extras_require={"test": ["mock"]},
     entry_points="""
       [console_scripts]
       octodon=octodon.cli:main
+      octodond=octodon.daemon:main
     """,
 )
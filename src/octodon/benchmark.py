@@ -0,0 +1,633 @@
+from configparser import ConfigParser
+from contextlib import ExitStack
+from contextlib import redirect_stderr
+from contextlib import redirect_stdout
+from datetime import datetime
+from datetime import timedelta
+from io import StringIO
+from octodon.clockwork import ClockWorkTimeLog
+from octodon.jira import Jira
+from octodon.ratelimit import RateLimiter
+from octodon.redmine import Redmine
+from octodon.utils import clean_up_bookings
+from octodon.utils import make_table
+from octodon.utils import read_from_file
+from octodon.utils import write_to_file
+from octodon.version_control import GitLog
+from octodon.version_control import VCSLog
+from tempfile import mkdtemp
+
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import time
+
+# the first day of the generated data
+start_date = datetime(2019, 1, 7)
+
+words = (
+    "add api backup bug cache check client config customer deploy docs email "
+    "export fix form import index list login meeting migrate page plan "
+    "release report review search server setup sync test update upgrade user"
+).split()
+
+benchmarks = []
+
+
+def benchmark(func):
+    """Register a benchmark.
+
+    A benchmark is called with the settings and a scratch directory and returns
+    the size of its input, a function preparing the input and the function
+    to time, which is called with the prepared input. Only the latter is
+    timed, so inputs that are modified can be prepared afresh for every run.
+    Functions passed to ``settings["cleanup"]`` are called once the
+    benchmark is done.
+    """
+    benchmarks.append(func)
+    return func
+
+
+def make_description(rnd, issue_ids):
+    description = " ".join(rnd.choice(words) for i in range(rnd.randint(2, 6)))
+    if rnd.random() < 0.7:
+        description += " " + rnd.choice(issue_ids)
+    if rnd.random() < 0.1:
+        description += " #" + rnd.choice(words)
+    return description
+
+
+def generate_clockwork_log(lines, issue_ids, seed=0):
+    """Yield the lines of a plain text time log with one entry per line.
+
+    Every day has twenty entries of 20 minutes and a line ending the last
+    one.
+    """
+    rnd = random.Random(seed)
+    day = start_date
+    count = 0
+    while count < lines:
+        yield day.strftime("%Y-%m-%d") + "\n"
+        clock = day.replace(hour=8)
+        for i in range(20):
+            yield "{0} {1}\n".format(
+                clock.strftime("%H%M"), make_description(rnd, issue_ids)
+            )
+            clock += timedelta(minutes=20)
+        yield clock.strftime("%H%M") + "\n"
+        count += 22
+        day += timedelta(1)
+
+
+def generate_bookings(count, issue_ids, seed=0):
+    """Return bookings as the time logs create them."""
+    rnd = random.Random(seed)
+    bookings = []
+    for i in range(count):
+        description = make_description(rnd, issue_ids)
+        issue_id = description.split()[-1]
+        bookings.append(
+            {
+                "issue_id": issue_id if issue_id in issue_ids else None,
+                "spent_on": start_date,
+                "time": float(rnd.randint(5, 120)),
+                "comments": "",
+                "project": rnd.choice(["", "cynaptic_3000", "rrzzaa"]),
+                "description": description,
+                "activity": "Development",
+                "category": rnd.choice(["Work", "Work", "Work", "Break"]),
+                "tags": [],
+            }
+        )
+    return bookings
+
+
+def generate_messages(count, issue_ids, seed=0):
+    """Return commit messages referencing redmine and jira tickets."""
+    rnd = random.Random(seed)
+    messages = []
+    for i in range(count):
+        ref = rnd.choice(["refs #{0}", "fixes #{0}", "{0}:", "PLN-{0}"])
+        messages.append(
+            "{0} {1}".format(
+                ref.format(rnd.choice(issue_ids)),
+                " ".join(rnd.choice(words) for i in range(rnd.randint(3, 12))),
+            )
+        )
+    return messages
+
+
+def make_git_repo(path, commits, seed=0):
+    """Create a repository with one commit per hour by two authors."""
+    rnd = random.Random(seed)
+    issue_ids = [str(12345 + i) for i in range(200)]
+    subprocess.check_call(["git", "init", "-q", "-b", "main", path])
+    stream = []
+    timestamp = int(start_date.timestamp())
+    for message in generate_messages(commits, issue_ids, seed=seed):
+        timestamp += 3600
+        author = rnd.choice(["bench", "other"])
+        data = message.encode("utf-8")
+        stream.append(
+            "commit refs/heads/main\n"
+            "author {0} <{0}@example.org> {1} +0000\n"
+            "committer {0} <{0}@example.org> {1} +0000\n"
+            "data {2}\n".format(author, timestamp, len(data)).encode("utf-8")
+            + data
+            + b"\n"
+        )
+    subprocess.run(
+        ["git", "fast-import", "--quiet"],
+        input=b"".join(stream),
+        cwd=path,
+        check=True,
+    )
+    return datetime.fromtimestamp(timestamp)
+
+
+@benchmark
+def get_facts(settings, workdir):
+    lines = list(
+        generate_clockwork_log(int(1000000 * settings["scale"]), ["12345", "12346"])
+    )
+    time_log = ClockWorkTimeLog(ticket_patterns=[Redmine.ticket_pattern])
+    return len(lines), lambda: lines, time_log.get_facts
+
+
+@benchmark
+def aggregate_facts(settings, workdir):
+    lines = list(
+        generate_clockwork_log(int(1000000 * settings["scale"]), ["12345", "12346"])
+    )
+    time_log = ClockWorkTimeLog(ticket_patterns=[Redmine.ticket_pattern])
+    facts = time_log.get_facts(lines)
+    day = facts[len(facts) // 2]["spent_on"]
+
+    def prepare():
+        return [dict(fact) for fact in facts]
+
+    def run(facts):
+        return time_log.aggregate_facts(facts, date=day, loginfo={"12345": ["x"]})
+
+    return len(facts), prepare, run
+
+
+@benchmark
+def clean_up(settings, workdir):
+    count = int(10000 * settings["scale"])
+    bookings = generate_bookings(count, ["12345", "12346"])
+
+    def run(bookings):
+        with redirect_stderr(StringIO()):
+            return clean_up_bookings(bookings)
+
+    return count, lambda: [dict(entry) for entry in bookings], run
+
+
+@benchmark
+def write_session(settings, workdir):
+    count = int(10000 * settings["scale"])
+    bookings = generate_bookings(count, ["12345", "12346"])
+    file_name = os.path.join(workdir, "session.rst")
+
+    def run(bookings):
+        write_to_file(bookings, start_date, [], file_name=file_name)
+
+    return count, lambda: bookings, run
+
+
+@benchmark
+def read_session(settings, workdir):
+    count = int(10000 * settings["scale"])
+    file_name = os.path.join(workdir, "session.rst")
+    write_to_file(
+        generate_bookings(count, ["12345", "12346"]),
+        start_date,
+        [],
+        file_name=file_name,
+    )
+    return count, lambda: file_name, lambda file_name: read_from_file(file_name, [])
+
+
+@benchmark
+def extract_loginfo(settings, workdir):
+    count = int(100000 * settings["scale"])
+    issue_ids = [str(12345 + i) for i in range(200)]
+    messages = generate_messages(count, issue_ids)
+    vcs = VCSLog(patterns=[Redmine.ticket_pattern, Jira.ticket_pattern])
+    return count, lambda: messages, vcs.extract_loginfo
+
+
+@benchmark
+def git_log(settings, workdir):
+    commits = int(5000 * settings["scale"])
+    repo = os.path.join(workdir, "repo")
+    end = make_git_repo(repo, commits)
+    vcs = GitLog(
+        exe="git", author="bench", repos=[repo], patterns=[Redmine.ticket_pattern]
+    )
+
+    def run(end):
+        return vcs.get_loginfo_range(start_date, end)
+
+    return commits, lambda: end + timedelta(1), run
+
+
+def make_harvest(projects, task_mapping={}):
+    from octodon.testing import MockHarvest
+
+    harvest = MockHarvest(task_mapping=task_mapping, default_task="Development")
+    harvest._projects = projects
+    return harvest
+
+
+@benchmark
+def guess_project(settings, workdir):
+    count = int(10000 * settings["scale"])
+    rnd = random.Random(0)
+    codes = ["{0}_{1}".format(rnd.choice(words), i) for i in range(300)]
+    harvest = make_harvest([{"code": code} for code in codes])
+    harvest.project_mapping = dict((code.upper(), code) for code in codes[::10])
+    queries = []
+    for i in range(count):
+        project = rnd.choice(codes).upper()[: rnd.randint(3, 12)]
+        contracts = [rnd.choice(words) for i in range(rnd.randint(0, 2))]
+        queries.append((project, contracts))
+
+    def run(queries):
+        for project, contracts in queries:
+            harvest.guess_project(codes, project=project, contracts=contracts)
+
+    return count, lambda: queries, run
+
+
+@benchmark
+def guess_task(settings, workdir):
+    count = int(10000 * settings["scale"])
+    rnd = random.Random(0)
+    task_mapping = dict(
+        ("{0} {1}".format(rnd.choice(words), i), "Task {0}".format(i))
+        for i in range(300)
+    )
+    issue_ids = ["12345", "12346"]
+    queries = [
+        (rnd.choice(words), make_description(rnd, issue_ids)) for i in range(count)
+    ]
+
+    def prepare():
+        # a new harvest for each run, so guesses aren't remembered across runs
+        return make_harvest([], task_mapping=task_mapping), queries
+
+    def run(args):
+        harvest, queries = args
+        for project, description in queries:
+            harvest.guess_task(project=project, description=description)
+
+    return count, prepare, run
+
+
+def make_octodon(workdir, days, latency):
+    """Set up octodon with mock trackers that take latency seconds per call."""
+    from octodon.cli import Octodon
+    from octodon.redmine import RedmineIssue
+    from octodon.testing import MockHarvest
+    from octodon.testing import MockHarvestConnection
+    from octodon.testing import MockRedmine
+
+    class SlowRedmine(MockRedmine):
+        def get_issues(self, issue_ids):
+            time.sleep(latency)
+            return super(SlowRedmine, self).get_issues(issue_ids)
+
+        def get_issue(self, issue):
+            time.sleep(latency)
+            return super(SlowRedmine, self).get_issue(issue)
+
+        def _get_issue(self, issue):
+            project = MockRedmine.Projects[str(22 + int(issue) % 2)]
+            return RedmineIssue(
+                {
+                    "project": project,
+                    "tracker": {"id": "2", "name": "Feature"},
+                    "subject": "Issue {0}".format(issue),
+                    "custom_fields": {},
+                },
+                redmine=self,
+            )
+
+    class SlowHarvestConnection(MockHarvestConnection):
+        def _post(self, url, data, *args, **kwargs):
+            time.sleep(latency)
+            return super(SlowHarvestConnection, self)._post(url, data)
+
+    class SlowHarvest(MockHarvest):
+        def connection_factory(self, *args, **kwargs):
+            return SlowHarvestConnection(self)
+
+    log_path = os.path.join(workdir, "time_log.txt")
+    if not os.path.exists(log_path):
+        issue_ids = [str(12345 + i) for i in range(50)]
+        with open(log_path, "w") as log_file:
+            log_file.writelines(generate_clockwork_log(days * 22, issue_ids))
+    config = ConfigParser()
+    config.read_string(
+        "[main]\neditor = vim\nsource = plaintext\nvcs =\n"
+        "[plaintext]\nlog_path = {0}\n".format(log_path)
+    )
+    octodon = Octodon(config, start_date, new_session=True)
+    octodon._trackers = [SlowRedmine()]
+    octodon._harvest = SlowHarvest(rate_limiter=RateLimiter(1000000))
+    octodon._activities = []
+    return octodon
+
+
+@benchmark
+def octodon_day(settings, workdir):
+    """Collect, enrich and clean up the bookings of one day."""
+    days = max(int(100 * settings["scale"]), 1)
+
+    def run(octodon):
+        with redirect_stderr(StringIO()):
+            return octodon.bookings
+
+    return (
+        days,
+        lambda: make_octodon(workdir, days, settings["latency"] / 1000.0),
+        run,
+    )
+
+
+@benchmark
+def octodon_book_range(settings, workdir):
+    """Book a range of days to harvest without the editor."""
+    days = max(int(100 * settings["scale"]), 1)
+
+    def run(octodon):
+        with redirect_stdout(StringIO()), redirect_stderr(StringIO()):
+            octodon.book_range(
+                start_date,
+                start_date + timedelta(days),
+                targets=["harvest"],
+                force=True,
+            )
+
+    return (
+        days,
+        lambda: make_octodon(workdir, days, settings["latency"] / 1000.0),
+        run,
+    )
+
+
+@benchmark
+def fake_server_book_range(settings, workdir):
+    """Book a range of days to redmine, jira and harvest over HTTP.
+
+    The trackers are served by the fake tracker server and octodon doesn't
+    throttle its requests, so this measures the throughput of the booking
+    pipeline itself.
+    """
+    from octodon.cli import Octodon
+    from octodon.fakeserver import FakeData
+    from octodon.fakeserver import FakeTrackerServer
+
+    days = max(int(20 * settings["scale"]), 1)
+    server = FakeTrackerServer(
+        data=FakeData(issues=days * 8), latency=settings["latency"] / 1000.0
+    ).start()
+    settings["cleanup"](server.stop)
+    log_path = os.path.join(workdir, "time_log.txt")
+    with open(log_path, "w") as log_file:
+        for day in range(days):
+            log_file.write((start_date + timedelta(day)).strftime("%Y-%m-%d\n"))
+            for hour in range(8):
+                n = day * 8 + hour + 1
+                issue = "PLN-{0}".format(n) if hour % 2 else str(1000 + n)
+                log_file.write(
+                    "{0:02d}00 {1} {2}\n".format(9 + hour, words[hour], issue)
+                )
+            log_file.write("1700\n")
+    # the configuration is set up from scratch, so octodon can't pick up the
+    # user's trackers
+    config = ConfigParser()
+    config.read_string(
+        "[main]\neditor = vim\nsource = plaintext\nvcs =\n"
+        "default-task = Development\n[plaintext]\nlog_path = {0}\n".format(log_path)
+        + server.get_config()
+    )
+    for section in ("redmine", "jira", "harvest"):
+        config.set(section, "rate_limit", "0")
+
+    def run(octodon):
+        with redirect_stdout(StringIO()), redirect_stderr(StringIO()):
+            octodon.book_range(
+                start_date,
+                start_date + timedelta(days),
+                targets=["redmine", "jira", "harvest"],
+                force=True,
+            )
+
+    return days, lambda: Octodon(config, start_date, new_session=True), run
+
+
+default_settings = {"scale": 1.0, "repeat": 3, "latency": 5.0}
+
+
+def run_benchmarks(names=None, settings=default_settings):
+    """Run the benchmarks and return their sizes and timings by name.
+
+    ``settings`` holds the scale of the generated data, the number of runs
+    and the latency of the mock trackers in milliseconds.
+    """
+    results = {}
+    for func in benchmarks:
+        if names and func.__name__ not in names:
+            continue
+        workdir = mkdtemp()
+        data_home = os.environ.get("XDG_DATA_HOME")
+        # keep the caches octodon writes out of the user's data directory
+        os.environ["XDG_DATA_HOME"] = workdir
+        cleanups = ExitStack()
+        try:
+            size, prepare, run = func(
+                dict(settings, cleanup=cleanups.callback), workdir
+            )
+            times = []
+            for i in range(settings["repeat"]):
+                data = prepare()
+                started = time.perf_counter()
+                run(data)
+                times.append(time.perf_counter() - started)
+        finally:
+            cleanups.close()
+            if data_home is None:
+                del os.environ["XDG_DATA_HOME"]
+            else:
+                os.environ["XDG_DATA_HOME"] = data_home
+            shutil.rmtree(workdir)
+        times.sort()
+        results[func.__name__] = {
+            "size": size,
+            "min": times[0],
+            "median": times[len(times) // 2],
+        }
+    return results
+
+
+def get_environment():
+    """Describe the interpreter and machine the benchmarks run on."""
+    return {
+        "interpreter": "{0} {1}".format(
+            platform.python_implementation(), platform.python_version()
+        ),
+        "machine": "{0} {1}, cpus: {2}".format(
+            platform.system(), platform.machine(), os.cpu_count()
+        ),
+    }
+
+
+def baseline_mismatches(saved, settings, environment):
+    """Return what keeps the timings of a saved baseline from being compared.
+
+    The timings are absolute, so they are only comparable for the same
+    scale and latency, on the same interpreter and kind of machine.
+    """
+    mismatches = []
+    for key in ("scale", "latency"):
+        if saved.get(key) != settings[key]:
+            mismatches.append(
+                "{0} {1} instead of {2}".format(key, settings[key], saved.get(key))
+            )
+    for key, value in sorted(environment.items()):
+        if saved.get(key) != value:
+            mismatches.append(
+                "{0} {1} instead of {2}".format(key, value, saved.get(key))
+            )
+    return mismatches
+
+
+def compare_results(results, baseline, threshold=1.25):
+    """Return the names of the benchmarks that got slower than threshold allows.
+
+    The best times are compared, as they are the least affected by noise.
+    """
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous and result["min"] > previous["min"] * threshold:
+            regressions.append(name)
+    return regressions
+
+
+def format_results(results, baseline={}):
+    rows = []
+    for name, result in results.items():
+        row = [
+            name,
+            str(result["size"]),
+            "{0:.1f} ms".format(result["min"] * 1000),
+            "{0:.1f} ms".format(result["median"] * 1000),
+        ]
+        if baseline:
+            previous = baseline.get(name)
+            if previous:
+                row.append("{0:.1f} ms".format(previous["min"] * 1000))
+                row.append(
+                    "{0:+.0f}%".format((result["min"] / previous["min"] - 1) * 100)
+                )
+            else:
+                row.extend(["", ""])
+        rows.append(row)
+    header = ["Benchmark", "Size", "Min", "Median"]
+    if baseline:
+        header.extend(["Baseline", "Change"])
+    return make_table(rows, header=header)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark octodon's parsers and booking pipeline"
+    )
+    parser.add_argument(
+        "names",
+        nargs="*",
+        help="the benchmarks to run, all by default: "
+        + ", ".join(func.__name__ for func in benchmarks),
+    )
+    parser.add_argument(
+        "--scale",
+        type=float,
+        help="factor for the size of the generated data, 1 by default"
+        " (a time log of a million lines)",
+    )
+    parser.add_argument(
+        "--repeat", type=int, help="how often to run each benchmark, 3 by default"
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        help="the latency of the mock trackers in milliseconds, 5 by default",
+    )
+    parser.add_argument(
+        "--save", type=str, metavar="FILE", help="save the results as a baseline"
+    )
+    parser.add_argument(
+        "--compare",
+        type=str,
+        metavar="FILE",
+        help="compare the results to a baseline, using its settings unless"
+        " they are given",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="with --compare, fail if a benchmark takes longer than this"
+        " factor times the baseline",
+    )
+    args = parser.parse_args(argv)
+
+    settings = dict(default_settings)
+    environment = get_environment()
+    baseline = {}
+    mismatches = []
+    if args.compare:
+        with open(args.compare, "r") as baseline_file:
+            saved = json.load(baseline_file)
+        baseline = saved["results"]
+        settings.update((key, saved[key]) for key in settings)
+    for key in settings:
+        if getattr(args, key) is not None:
+            settings[key] = getattr(args, key)
+    if args.compare:
+        mismatches = baseline_mismatches(saved, settings, environment)
+    results = run_benchmarks(args.names, settings)
+    print(format_results(results, baseline))
+    if mismatches:
+        print(
+            "Warning: not checking for regressions, the baseline is not "
+            "comparable: " + "; ".join(mismatches),
+            file=sys.stderr,
+        )
+        baseline = {}
+    if args.save:
+        with open(args.save, "w") as baseline_file:
+            json.dump(
+                dict(settings, results=results, **environment),
+                baseline_file,
+                indent=2,
+                sort_keys=True,
+            )
+            baseline_file.write("\n")
+    regressions = compare_results(results, baseline, threshold=args.threshold)
+    if regressions:
+        print("Slower than the baseline: " + ", ".join(regressions), file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
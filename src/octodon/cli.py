@@ -3,37 +3,74 @@ from cmd import Cmd
 from contextlib import contextmanager
 from datetime import datetime
 from datetime import timedelta
+from functools import wraps
+from octodon.exceptions import DaemonError
+from octodon.exceptions import DaemonUnavailable
+from octodon.timing import timings
+from octodon.tracking import SessionPrefetcher
 from octodon.tracking import Tracking
+from octodon.utils import BOOKED
+from octodon.utils import booking_error
 from octodon.utils import clean_up_bookings
 from octodon.utils import format_spent_time
+from octodon.utils import get_cache_file
 from octodon.utils import get_data_home
 from octodon.utils import get_time_sum
 from octodon.utils import make_row
+from octodon.utils import make_status_table
 from octodon.utils import make_table
 from octodon.utils import read_from_file
 from octodon.utils import write_to_file
-from octodon.version_control import GitLog
-from octodon.version_control import SvnLog
 from six.moves.configparser import ConfigParser
 
 import argparse
 import os
-import pystache
 import re
 import subprocess
 import sys
+import time
+
+
+def startup_step(func):
+    """Record how long the first access to a lazily built attribute takes."""
+
+    @wraps(func)
+    def wrapper(self):
+        times = self.startup_times
+        if times is None or func.__name__ in times:
+            return func(self)
+        times[func.__name__] = None
+        started = time.perf_counter()
+        value = func(self)
+        times[func.__name__] = time.perf_counter() - started
+        return value
+
+    return wrapper
+
+
+# commands that octodond can run on behalf of the command line client
+daemon_commands = [
+    "summary",
+    "total",
+    "balance",
+    "list",
+    "book",
+    "redmine",
+    "jira",
+    "harvest",
+]
 
 
 class Octodon(Cmd):
-    def __init__(self, config, spent_on, new_session=False, *args):
+    booking_targets = ["redmine", "jira", "harvest"]
+    # how many bookings are enriched with tracker information at once
+    export_batch_size = 500
+    startup_times = None
+
+    def __init__(self, config, spent_on, new_session=False, *args, **kwargs):
         Cmd.__init__(self, *args)
         self.config = config
-
-        ticket_patterns = []
-        for tracker in self.trackers:
-            ticket_patterns.append(tracker.ticket_pattern)
-
-        self.time_log = get_time_log(config, ticket_patterns)
+        self.startup_times = kwargs.get("startup_times")
 
         self.editor = config.get("main", "editor")
 
@@ -41,14 +78,6 @@ class Octodon(Cmd):
         if config.has_option("main", "list-item-template"):
             self.list_item_template = config.get("main", "list-item-template")
 
-        self.list_template = None
-        if config.has_option("main", "list-template-file"):
-            list_template_file = os.path.expanduser(
-                config.get("main", "list-template-file")
-            )
-            with open(list_template_file, "r") as tmpl_file:
-                self.list_template = pystache.parse(tmpl_file.read())
-
         self.list_file_name = None
         if config.has_option("main", "list-file"):
             self.list_file_name = os.path.expanduser(config.get("main", "list-file"))
@@ -67,14 +96,47 @@ class Octodon(Cmd):
         self.spent_on = spent_on
 
     @property
+    def list_template(self):
+        list_template = getattr(self, "_list_template", None)
+        if list_template is None and self.config.has_option(
+            "main", "list-template-file"
+        ):
+            import pystache
+
+            list_template_file = os.path.expanduser(
+                self.config.get("main", "list-template-file")
+            )
+            with open(list_template_file, "r") as tmpl_file:
+                self._list_template = list_template = pystache.parse(tmpl_file.read())
+        return list_template
+
+    @property
+    def ticket_patterns(self):
+        ticket_patterns = getattr(self, "_ticket_patterns", None)
+        if ticket_patterns is None:
+            ticket_patterns = [tracker.ticket_pattern for tracker in self.trackers]
+        return ticket_patterns
+
+    @property
+    @startup_step
+    def time_log(self):
+        time_log = getattr(self, "_time_log", None)
+        if time_log is None:
+            self._time_log = time_log = get_time_log(self.config, self.ticket_patterns)
+        return time_log
+
+    @property
+    @startup_step
     def vcs_list(self):
         vcs_list = getattr(self, "_vcs_list", None)
         if vcs_list is None:
+            from octodon.version_control import find_repos
+            from octodon.version_control import GitLog
+            from octodon.version_control import SvnLog
+
             vcs_list = []
             vcs_class = {"git": GitLog, "svn": SvnLog}
-            ticket_patterns = []
-            for tracker in self.trackers:
-                ticket_patterns.append(tracker.ticket_pattern)
+            ticket_patterns = self.ticket_patterns
 
             for vcs in self.config.get("main", "vcs").split("\n"):
                 if not vcs:
@@ -91,10 +153,31 @@ class Octodon(Cmd):
                         for r in self.config.get(vcs, "repos").split("\n")
                         if r.strip()
                     ]
+                if self.config.has_option(vcs, "roots"):
+                    roots = [
+                        r
+                        for r in self.config.get(vcs, "roots").split("\n")
+                        if r.strip()
+                    ]
+                    cache_file = get_cache_file(
+                        "octodon-repos", "\n".join([vcs] + roots)
+                    )
+                    for repo in find_repos(roots, "." + vcs, cache_file=cache_file):
+                        if repo not in repos:
+                            repos.append(repo)
                 if self.config.has_option(vcs, "executable"):
                     exe = self.config.get(vcs, "executable")
                 else:
                     exe = "/usr/bin/env " + vcs
+                workers = self.config.getint(vcs, "workers", fallback=4)
+                options = {}
+                if vcs == "git":
+                    options["cache"] = self.config.getboolean(
+                        vcs, "cache", fallback=True
+                    )
+                    options["cache_days"] = self.config.getint(
+                        vcs, "cache_days", fallback=365
+                    )
                 if vcs in vcs_class:
                     vcs_list.append(
                         vcs_class.get(vcs)(
@@ -102,13 +185,25 @@ class Octodon(Cmd):
                             author=author,
                             repos=repos,
                             patterns=ticket_patterns,
+                            workers=workers,
+                            **options
                         )
                     )
                 else:
                     print("Unrecognized vcs: %s" % vcs, file=sys.stderr)
+            self._vcs_list = vcs_list
         return vcs_list
 
+    def run_credential_command(self, section, command_option, option):
+        """Set an option to the output of the command configured for it."""
+        if self.config.has_option(section, command_option):
+            with timings.span("credentials " + section):
+                cmd = self.config.get(section, command_option)
+                value = subprocess.check_output(cmd.split(" ")).strip().decode("utf-8")
+            self.config.set(section, option, value)
+
     @property
+    @startup_step
     def jira(self):
         jira = getattr(self, "_jira", None)
         if jira is None and self.config.has_section("jira"):
@@ -116,21 +211,19 @@ class Octodon(Cmd):
                 from octodon.jira import Jira
             except ImportError:
                 return None
+            from octodon.ratelimit import get_rate_limiter
 
-            if self.config.has_option("jira", "password_command"):
-                cmd = self.config.get("jira", "password_command")
-                password = (
-                    subprocess.check_output(cmd.split(" ")).strip().decode("utf-8")
-                )
-                self.config.set("jira", "pass", password)
+            self.run_credential_command("jira", "password_command", "pass")
             self._jira = jira = Jira(
                 self.config.get("jira", "url"),
                 self.config.get("jira", "user"),
                 self.config.get("jira", "pass"),
+                rate_limiter=get_rate_limiter(self.config, "jira", Jira.rate_limit),
             )
         return jira
 
     @property
+    @startup_step
     def github(self):
         github = getattr(self, "_github", None)
         if github is None and self.config.has_section("github"):
@@ -138,19 +231,24 @@ class Octodon(Cmd):
                 from octodon.github import Github
             except ImportError:
                 return None
+            from octodon.ratelimit import get_rate_limiter
 
-            if self.config.has_option("github", "token_command"):
-                cmd = self.config.get("github", "token_command")
-                token = subprocess.check_output(cmd.split(" ")).strip().decode("utf-8")
-                self.config.set("github", "token", token)
+            self.run_credential_command("github", "token_command", "token")
             self._github = github = Github(
                 self.config.get("github", "token"),
                 self.config.get("github", "organization"),
                 int(self.config.get("github", "project_num")),
+                rate_limiter=get_rate_limiter(
+                    self.config, "github", Github.rate_limit, Github.rate_limit_burst
+                ),
+                cache_ttl=self.config.getint("github", "cache_ttl", fallback=3600),
+                lookup=self.config.get("github", "lookup", fallback="index"),
+                url=self.config.get("github", "url", fallback=None),
             )
         return github
 
     @property
+    @startup_step
     def redmine(self):
         redmine = getattr(self, "_redmine", None)
         if redmine is None and self.config.has_section("redmine"):
@@ -158,21 +256,24 @@ class Octodon(Cmd):
                 from octodon.redmine import Redmine
             except ImportError:
                 return None
+            from octodon.ratelimit import get_rate_limiter
 
-            if self.config.has_option("redmine", "password_command"):
-                cmd = self.config.get("redmine", "password_command")
-                password = (
-                    subprocess.check_output(cmd.split(" ")).strip().decode("utf-8")
-                )
-                self.config.set("redmine", "pass", password)
+            self.run_credential_command("redmine", "password_command", "pass")
             self._redmine = redmine = Redmine(
                 self.config.get("redmine", "url"),
                 self.config.get("redmine", "user"),
                 self.config.get("redmine", "pass"),
+                rate_limiter=get_rate_limiter(
+                    self.config, "redmine", Redmine.rate_limit
+                ),
+                cache_ttl=self.config.getint("redmine", "cache_ttl", fallback=86400),
+                pool_size=self.config.getint("redmine", "pool_size", fallback=4),
+                timeout=self.config.getfloat("redmine", "timeout", fallback=30),
             )
         return redmine
 
     @property
+    @startup_step
     def trackers(self):
         trackers = getattr(self, "_trackers", None)
         if trackers is None:
@@ -182,6 +283,7 @@ class Octodon(Cmd):
         return trackers or []
 
     @property
+    @startup_step
     def harvest(self):
         harvest = getattr(self, "_harvest", None)
         if harvest is None and self.config.has_section("harvest"):
@@ -189,11 +291,9 @@ class Octodon(Cmd):
                 from octodon.harvest import Harvest
             except ImportError:
                 return None
+            from octodon.ratelimit import get_rate_limiter
 
-            if self.config.has_option("harvest", "token_command"):
-                cmd = self.config.get("harvest", "token_command")
-                token = subprocess.check_output(cmd.split(" ")).strip().decode("utf-8")
-                self.config.set("harvest", "personal_token", token)
+            self.run_credential_command("harvest", "token_command", "personal_token")
 
             if self.config.has_option("main", "project-mapping"):
                 project_mapping = self.config.get("main", "project-mapping")
@@ -220,10 +320,14 @@ class Octodon(Cmd):
                 project_mapping=project_mapping,
                 task_mapping=task_mapping,
                 default_task=self.config.get("main", "default-task"),
+                rate_limiter=get_rate_limiter(
+                    self.config, "harvest", Harvest.rate_limit, Harvest.rate_limit_burst
+                ),
             )
         return harvest
 
     @property
+    @startup_step
     def tracking(self):
         tracking = getattr(self, "_tracking", None)
         if tracking is None:
@@ -234,6 +338,7 @@ class Octodon(Cmd):
         return tracking
 
     @property
+    @startup_step
     def activities(self):
         if getattr(self, "_activities", None) is None:
             self._activities = []
@@ -255,45 +360,229 @@ class Octodon(Cmd):
                 self.spent_on, bookings = self.get_bookings(self.spent_on)
                 bookings = clean_up_bookings(bookings)
 
-            for entry in bookings:
-                if entry["issue_id"] is not None:
-                    entry["issue_title"] = self.tracking.get_issue_title(
-                        entry["issue_id"]
-                    )
-                else:
-                    entry["issue_title"] = ""
+            self.tracking.prefetch(entry["issue_id"] for entry in bookings)
+            self.add_issue_titles(bookings)
             self._bookings = bookings
         return bookings
 
+    def add_issue_titles(self, bookings):
+        for entry in bookings:
+            if entry["issue_id"] is not None:
+                entry["issue_title"] = self.tracking.get_issue_title(entry["issue_id"])
+            else:
+                entry["issue_title"] = ""
+
+    def add_booking_targets(self, bookings):
+        with timings.span("booking targets"):
+            for entry in bookings:
+                project, task = self.tracking.get_booking_target(entry)
+                entry["project"] = project
+                entry["activity"] = task
+
+    def get_loginfo(self, spent_on):
+        loginfo = {}
+        with timings.span("vcs"):
+            for vcs in self.vcs_list:
+                with timings.span(vcs.__class__.__name__):
+                    loginfo = vcs.get_loginfo(date=spent_on, mergewith=loginfo)
+        return loginfo
+
     def clear_bookings(self):
         self.is_new_session = False
         self._bookings = None
 
-    def get_bookings(self, spent_on, search_back=4):
+    def search_back(self, get_bookings, spent_on, search_back=4):
+        """Go back up to search_back days to find a day with bookings."""
         bookings = None
         for i in range(search_back):
-            bookings = self._get_bookings(spent_on - timedelta(i))
+            bookings = get_bookings(spent_on - timedelta(i))
             if bookings:
                 break
         return spent_on - timedelta(i), bookings
 
+    def get_bookings(self, spent_on, search_back=4):
+        return self.search_back(self._get_bookings, spent_on, search_back)
+
     def _get_bookings(self, spent_on):
+        loginfo = self.get_loginfo(spent_on)
+        activities = self.activities
+        with timings.span("time log"):
+            bookings = self.time_log.get_timeinfo(
+                date=spent_on, loginfo=loginfo, activities=activities
+            )
+        self.tracking.prefetch(entry["issue_id"] for entry in bookings)
+        self.add_booking_targets(bookings)
+
+        return bookings
+
+    def get_bookings_range(self, start, end):
+        """Return the bookings of every day in [start, end), by day.
+
+        The repositories are scanned and, if the time log supports it, the
+        time log is parsed once for the whole range, and the issues of all
+        days are looked up together.
+        """
+        return self.enrich_timeinfo(self.read_timeinfo_range(start, end))
+
+    def read_timeinfo_range(self, start, end):
+        """Return the bookings of every day in [start, end) from the time log.
+
+        The bookings have the repositories' comments but no tracker
+        information yet.
+        """
         loginfo = {}
-        for vcs in self.vcs_list:
-            loginfo = vcs.get_loginfo(
-                date=spent_on,
-                mergewith=loginfo,
+        with timings.span("vcs"):
+            for vcs in self.vcs_list:
+                with timings.span(vcs.__class__.__name__):
+                    loginfo = vcs.get_loginfo_range(start, end, mergewith=loginfo)
+
+        activities = self.activities
+        get_timeinfo_range = getattr(self.time_log, "get_timeinfo_range", None)
+        with timings.span("time log"):
+            if get_timeinfo_range is not None:
+                timeinfo = get_timeinfo_range(
+                    start, end, loginfo=loginfo, activities=activities
+                )
+            else:
+                timeinfo = {}
+                for offset in range((end - start).days):
+                    day = start + timedelta(offset)
+                    timeinfo[day.date()] = self.time_log.get_timeinfo(
+                        date=day,
+                        loginfo=loginfo.get(day.date(), {}),
+                        activities=activities,
+                    )
+        return timeinfo
+
+    def enrich_timeinfo(self, timeinfo):
+        """Add the tracker information to bookings by day."""
+        self.tracking.prefetch(
+            entry["issue_id"] for bookings in timeinfo.values() for entry in bookings
+        )
+        days = {}
+        for day, bookings in sorted(timeinfo.items()):
+            self.add_booking_targets(bookings)
+            bookings = clean_up_bookings(bookings)
+            self.add_issue_titles(bookings)
+            days[day] = bookings
+        return days
+
+    def iter_timeinfo_range(self, start, end):
+        """Yield the days in [start, end) with bookings, one at a time."""
+        from octodon.version_control import WindowedLogInfo
+
+        loginfo = WindowedLogInfo(self.vcs_list, end)
+        activities = self.activities
+        iter_timeinfo_range = getattr(self.time_log, "iter_timeinfo_range", None)
+        if iter_timeinfo_range is not None:
+            for day, bookings in iter_timeinfo_range(
+                start, end, loginfo=loginfo, activities=activities
+            ):
+                yield day, bookings
+            return
+        for offset in range((end - start).days):
+            day = start + timedelta(offset)
+            bookings = self.time_log.get_timeinfo(
+                date=day, loginfo=loginfo.get(day.date(), {}), activities=activities
             )
+            if bookings:
+                yield day.date(), bookings
+
+    def iter_bookings_range(self, start, end):
+        """Yield the bookings of [start, end) with their tracker information.
 
-        bookings = self.time_log.get_timeinfo(
-            date=spent_on, loginfo=loginfo, activities=self.activities
+        The days are read as they are needed, and their issues are looked up
+        with one batch request per ``export_batch_size`` bookings, so only
+        one batch is held in memory besides the issues seen so far.
+        """
+        batch = []
+        size = 0
+        for day, bookings in self.iter_timeinfo_range(start, end):
+            batch.append(bookings)
+            size += len(bookings)
+            if size >= self.export_batch_size:
+                for entry in self._enrich_bookings(batch):
+                    yield entry
+                batch = []
+                size = 0
+        for entry in self._enrich_bookings(batch):
+            yield entry
+
+    def _enrich_bookings(self, batch):
+        self.tracking.prefetch(
+            entry["issue_id"] for bookings in batch for entry in bookings
         )
-        for entry in bookings:
-            project, task = self.tracking.get_booking_target(entry)
-            entry["project"] = project
-            entry["activity"] = task
+        for bookings in batch:
+            self.add_booking_targets(bookings)
+            bookings = clean_up_bookings(bookings)
+            self.add_issue_titles(bookings)
+            for entry in bookings:
+                yield entry
 
-        return bookings
+    def export(self, start, end, format="csv", filename="-"):
+        """Write the bookings of [start, end) to filename as they are read."""
+        from octodon.export import writers
+
+        if filename == "-":
+            outfile = sys.stdout
+        else:
+            try:
+                outfile = open(filename, "w")
+            except OSError as e:
+                print("Could not open {0}: {1}".format(filename, e), file=sys.stderr)
+                return
+        try:
+            count = writers[format](
+                self.iter_bookings_range(start, end),
+                outfile,
+                template=self.list_item_template,
+            )
+        finally:
+            if outfile is not sys.stdout:
+                outfile.close()
+        if filename != "-":
+            print(
+                "Exported {0} entries to {1}".format(count, filename), file=sys.stderr
+            )
+
+    def book_range(self, start, end, targets=None, force=False):
+        """Book every day in [start, end) in one batch, without an editor.
+
+        Nothing is booked if an entry lacks an issue or comments, unless
+        force is set.
+        """
+        if targets is None:
+            targets = self.booking_targets
+        days = self.get_bookings_range(start, end)
+        bookings = [entry for day in days for entry in days[day]]
+        for entry in bookings:
+            # the targets expect the date as it is read from the session table
+            entry["spent_on"] = entry["spent_on"].strftime("%Y-%m-%d")
+        if not self.check_issue_and_comment(bookings) and not force:
+            print(
+                "Nothing was booked. Complete the entries in the time log, "
+                "or use --force to book them as they are.",
+                file=sys.stderr,
+            )
+            return
+        results = self.book(targets, bookings=bookings) or {}
+
+        rows = []
+        offset = 0
+        for day, day_bookings in days.items():
+            row = [
+                day.strftime("%Y-%m-%d"),
+                str(len(day_bookings)),
+                format_spent_time(get_time_sum(day_bookings)),
+            ]
+            for target in results:
+                day_results = results[target][offset : offset + len(day_bookings)]
+                row.append(
+                    "{0}/{1}".format(day_results.count(BOOKED), len(day_bookings))
+                )
+            rows.append(row)
+            offset += len(day_bookings)
+        print(make_table(rows, header=["Date", "Entries", "Time"] + list(results)))
 
     def check_issue_and_comment(self, bookings):
         no_issue_or_comment = [
@@ -315,11 +604,23 @@ class Octodon(Cmd):
         total_time = get_time_sum(bookings)
         print("total hours:%s" % format_spent_time(total_time))
 
+    @property
+    def time_entries(self):
+        """The bookings without any tracker information, enough for sums."""
+        if getattr(self, "_bookings", None) is not None:
+            return self._bookings
+        if not self.is_new_session:
+            return read_from_file(self.sessionfile, activities=[])[1]
+        time_log = get_time_log(self.config)
+        return self.search_back(
+            lambda spent_on: time_log.get_timeinfo(date=spent_on), self.spent_on
+        )[1]
+
     def do_summary(self, *args):
-        self.print_summary(self.bookings)
+        self.print_summary(self.time_entries)
 
     def do_total(self, *args):
-        bookings = self.time_log.get_timeinfo(date=self.spent_on)
+        bookings = get_time_log(self.config).get_timeinfo(date=self.spent_on)
         print(format_spent_time(get_time_sum(bookings)))
 
     def do_balance(self, *args):
@@ -366,6 +667,20 @@ class Octodon(Cmd):
         if filename != "-":
             print("Printed to {}".format(filename), file=sys.stderr)
 
+    def do_export(self, arg):
+        """Write the day's bookings as csv, jsonl or with the list item template.
+        Usage: export [csv|jsonl|template] [filename]
+        """
+        from octodon.export import writers
+
+        args = filter(None, arg.split(" "))
+        format = next(args, "csv")
+        filename = os.path.expanduser(next(args, "-"))
+        if format not in writers:
+            print("Unknown format {}".format(format))
+            return
+        self.export(self.spent_on, self.spent_on + timedelta(1), format, filename)
+
     @contextmanager
     def prepare_outfile(self, filename):
         outfile = None
@@ -392,6 +707,8 @@ class Octodon(Cmd):
             )
 
     def get_templated_list(self, bookings):
+        import pystache
+
         renderer = pystache.Renderer()
         return renderer.render(self.list_template, {"bookings": self.bookings})
 
@@ -400,51 +717,72 @@ class Octodon(Cmd):
         self.sessionfile = write_to_file(
             self.bookings, self.spent_on, self.activities, file_name=self.sessionfile
         )
-        retval = subprocess.run([self.editor + " " + self.sessionfile], shell=True)
+        # look up what the edited bookings will need while the user edits
+        prefetcher = SessionPrefetcher(
+            self.tracking, self.sessionfile, self.activities
+        ).start()
+        try:
+            retval = subprocess.run([self.editor + " " + self.sessionfile], shell=True)
+        finally:
+            prefetcher.stop()
         if retval.returncode:
             print("Warning: The editor reported a problem ({})".format(retval))
         self.clear_bookings()
         if not self.check_issue_and_comment(self.bookings):
             self.cmdqueue.clear()
 
-    def do_redmine(self, *args):
-        """Write current bookings to redmine."""
+    def _book_to(self, target, bookings, parent=()):
         try:
-            self.redmine.book_time(self.bookings)
+            with timings.span(target, parent=parent):
+                return getattr(self, target).book_time(bookings)
         except Exception as e:
-            print(
-                "Error while booking - comments too long? Error was: "
-                "%s: %s" % (e.__class__.__name__, e),
-                file=sys.stderr,
+            # the backends report errors per entry; this one happened before
+            # any entry was sent
+            return [booking_error(e)] * len(bookings)
+
+    def book(self, targets, bookings=None):
+        """Write the current bookings to several targets at once.
+
+        Each target books in its own thread; failures of one target don't
+        affect the others. A combined report is printed when all are done,
+        and the per-entry results are returned by target.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        if bookings is None:
+            bookings = self.bookings
+        # construct the backends up front, their properties aren't thread safe
+        targets = [target for target in targets if getattr(self, target)]
+        if not targets:
+            print("No booking targets configured", file=sys.stderr)
+            return
+        with timings.span("book"), ThreadPoolExecutor(
+            max_workers=len(targets)
+        ) as executor:
+            parent = timings.current_path()
+            futures = dict(
+                (target, executor.submit(self._book_to, target, bookings, parent))
+                for target in targets
             )
+        results = dict((target, future.result()) for target, future in futures.items())
+        print(make_status_table(bookings, results))
+        return results
+
+    def do_redmine(self, *args):
+        """Write current bookings to redmine."""
+        self.book(["redmine"])
 
     def do_jira(self, *args):
         """Write current bookings to jira."""
-        try:
-            self.jira.book_time(self.bookings)
-        except Exception as e:
-            print(
-                "Error while booking - " "%s: %s" % (e.__class__.__name__, e),
-                file=sys.stderr,
-            )
+        self.book(["jira"])
 
     def do_harvest(self, *args):
         """Write current bookings to harvest."""
-        try:
-            self.harvest.book_time(self.bookings)
-        except Exception as e:
-            print(
-                "Error while booking - " "%s: %s" % (e.__class__.__name__, e),
-                file=sys.stderr,
-            )
+        self.book(["harvest"])
 
     def do_book(self, *args):
         """Write current bookings to all configured targets."""
-        if self.redmine:
-            self.do_redmine()
-        if self.jira:
-            self.do_jira()
-        self.do_harvest()
+        self.book(self.booking_targets)
 
     def do_flush(self, *args):
         """Executes summary, book, list save in this order"""
@@ -475,7 +813,8 @@ class Octodon(Cmd):
         return True
 
 
-def get_config(cfgfile=None):
+def get_config(cfgfile=None, user_config=True):
+    """Read cfgfile, the defaults and, with user_config, the user's own files."""
     config = ConfigParser()
     cfgfiles = []
     config_home = os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser("~/.config")
@@ -486,8 +825,9 @@ def get_config(cfgfile=None):
     cfgfiles.append(
         os.path.join(os.path.dirname(os.path.abspath(__file__)), "defaults.cfg")
     )
-    cfgfiles.append(os.path.expanduser("~/.octodon.cfg"))
-    cfgfiles.append(os.path.join(config_home, "octodon.cfg"))
+    if user_config:
+        cfgfiles.append(os.path.expanduser("~/.octodon.cfg"))
+        cfgfiles.append(os.path.join(config_home, "octodon.cfg"))
     config.read(cfgfiles)
 
     editor = os.environ.get("EDITOR")
@@ -518,6 +858,66 @@ def get_time_log(config, ticket_patterns=[]):
     return time_log
 
 
+def get_spent_on(date_arg=None):
+    """Return the day given on the command line, by default the last workday."""
+    now = datetime.now()
+    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    if now.hour >= 16:
+        spent_on = today
+    else:
+        spent_on = today - timedelta(1)
+    if date_arg:
+        if date_arg == "today":
+            spent_on = today
+        elif re.match(r"[+-][0-9]*$", date_arg):
+            spent_on = today + timedelta(int(date_arg))
+        elif re.match(r"[0-9]{8}$", date_arg):
+            spent_on = datetime.strptime(date_arg, "%Y%m%d")
+        elif re.match(r"[0-9]{4}-[0-9]{2}-[0-9]{2}$", date_arg):
+            spent_on = datetime.strptime(date_arg, "%Y-%m-%d")
+        else:
+            raise Exception("unrecognized date format: {0}".format(date_arg))
+    return spent_on
+
+
+def run_in_daemon(config, spent_on, command, cfgfile=None):
+    """Let a running octodond execute the command.
+
+    Returns False if no daemon is listening or it declines the command, so
+    the command can be run locally instead.
+    """
+    from octodon.daemon import get_socket_path
+    from octodon.daemon import request
+
+    socket_path = get_socket_path(config)
+    if not os.path.exists(socket_path):
+        return False
+    try:
+        result = request(
+            socket_path,
+            "run",
+            line=command,
+            date=spent_on.strftime("%Y-%m-%d"),
+            config_file=cfgfile and os.path.abspath(cfgfile),
+            cwd=os.getcwd(),
+        )
+    except DaemonUnavailable as du:
+        print("Not using octodond: {0}".format(du), file=sys.stderr)
+        return False
+    except DaemonError as de:
+        # the command may have been carried out, e.g. the time booked, so it
+        # isn't run again
+        print(
+            "octodond failed: {0}; check the result before running the command "
+            "again with --no-daemon".format(de),
+            file=sys.stderr,
+        )
+        return True
+    sys.stdout.write(result["stdout"])
+    sys.stderr.write(result["stderr"])
+    return True
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Extract time tracking data "
@@ -529,6 +929,39 @@ def main():
         help="the date for which to extract tracking data, in format YYYYMMDD"
         " or as an offset in days from today, e.g. -1 for yesterday",
     )
+    parser.add_argument(
+        "--from",
+        dest="from_date",
+        type=str,
+        help="with book, the first day to book without opening an editor; "
+        "with export, the first day to export",
+    )
+    parser.add_argument(
+        "--to",
+        dest="to_date",
+        type=str,
+        help="with book or export, the last day",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="with book --from and --to, book even if entries lack an issue "
+        "id or comments",
+    )
+    parser.add_argument(
+        "--format",
+        choices=["csv", "jsonl", "template"],
+        default="csv",
+        help="with export, write csv, JSON lines or lines formatted with the "
+        "list-item-template",
+    )
+    parser.add_argument(
+        "--output",
+        "-o",
+        type=str,
+        default="-",
+        help="with export, the file to write to instead of standard output",
+    )
     parser.add_argument(
         "--config-file",
         "-c",
@@ -541,6 +974,28 @@ def main():
         action="store_true",
         help="discard any existing session and start a new one",
     )
+    parser.add_argument(
+        "--startup-profile",
+        action="store_true",
+        help="report how long loading the configuration and setting up each "
+        "backend took",
+    )
+    parser.add_argument(
+        "--timings",
+        action="store_true",
+        help="print how long each phase took and which HTTP requests were made",
+    )
+    parser.add_argument(
+        "--timings-json",
+        type=str,
+        metavar="FILE",
+        help="write the timings to FILE as JSON",
+    )
+    parser.add_argument(
+        "--no-daemon",
+        action="store_true",
+        help="run the command here even if octodond is running",
+    )
     parser.add_argument(
         "command",
         metavar="command",
@@ -548,43 +1003,122 @@ def main():
         nargs="?",
         help="command to execute. Start interactive mode if ommitted",
     )
+    parser.add_argument(
+        "configs",
+        metavar="config",
+        type=str,
+        nargs="*",
+        help="with team, the configuration files of the team members",
+    )
 
     args = parser.parse_args()
 
+    startup_times = None
+    if args.startup_profile:
+        startup_times = {}
+    if args.timings or args.timings_json:
+        timings.enabled = True
+    started = time.perf_counter()
     cfgfile = None
     if args.config_file:
         cfgfile = args.config_file
-    config = get_config(cfgfile)
-
-    now = datetime.now()
-    today = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    if now.hour >= 16:
-        spent_on = today
-    else:
-        spent_on = today - timedelta(1)
-    if args.date:
-        if args.date == "today":
-            spent_on = today
-        elif re.match(r"[+-][0-9]*$", args.date):
-            spent_on = today + timedelta(int(args.date))
-        elif re.match(r"[0-9]{8}$", args.date):
-            spent_on = datetime.strptime(args.date, "%Y%m%d")
-        elif re.match(r"[0-9]{4}-[0-9]{2}-[0-9]{2}$", args.date):
-            spent_on = datetime.strptime(args.date, "%Y-%m-%d")
-        else:
-            raise Exception("unrecognized date format: {0}".format(args.date))
+    with timings.span("config"):
+        config = get_config(cfgfile)
+    if startup_times is not None:
+        startup_times["config"] = time.perf_counter() - started
+
+    if args.from_date or args.to_date:
+        if args.command not in ["book", "export", "team"] or not (
+            args.from_date and args.to_date
+        ):
+            parser.error(
+                "--from and --to have to be used together with book, export or team"
+            )
+    if (args.command == "team") != bool(args.configs):
+        parser.error("team takes the configuration files of the team members")
+
+    try:
+        with timings.span(args.command or "edit"):
+            run_command(args, config, startup_times)
+    finally:
+        if startup_times is not None:
+            print_startup_profile(startup_times, time.perf_counter() - started)
+        if timings.enabled:
+            print(timings.format_summary(), file=sys.stderr)
+        if args.timings_json:
+            timings.write_json(args.timings_json)
+
+
+def run_command(args, config, startup_times=None):
+    spent_on = get_spent_on(args.date)
+
+    if args.command == "team":
+        from octodon.team import format_team_report
+        from octodon.team import run_team
+
+        start = end = spent_on
+        if args.from_date:
+            start = get_spent_on(args.from_date)
+            end = get_spent_on(args.to_date)
+        members = run_team(args.configs, start, end + timedelta(1))
+        print(format_team_report(members))
+        return
+
+    if args.command == "export":
+        start = end = spent_on
+        if args.from_date:
+            start = get_spent_on(args.from_date)
+            end = get_spent_on(args.to_date)
+        octodon = Octodon(config, start, new_session=True, startup_times=startup_times)
+        octodon.export(
+            start, end + timedelta(1), args.format, os.path.expanduser(args.output)
+        )
+        return
+
+    if args.from_date:
+        start = get_spent_on(args.from_date)
+        end = get_spent_on(args.to_date) + timedelta(1)
+        octodon = Octodon(config, start, new_session=True, startup_times=startup_times)
+        octodon.book_range(start, end, force=args.force)
+        return
+
+    if (
+        args.command in daemon_commands
+        and not args.no_daemon
+        and startup_times is None
+        and not timings.enabled
+        and run_in_daemon(config, spent_on, args.command, args.config_file)
+    ):
+        return
 
     if args.command == "total":
         time_log = get_time_log(config)
         bookings = ()
         if time_log:
-            bookings = time_log.get_timeinfo(date=spent_on)
+            with timings.span("time log"):
+                bookings = time_log.get_timeinfo(date=spent_on)
         print(format_spent_time(get_time_sum(bookings)))
     elif args.command and args.command != "shell":
-        octodon = Octodon(config, spent_on, new_session=True)
+        octodon = Octodon(
+            config, spent_on, new_session=True, startup_times=startup_times
+        )
         octodon.onecmd(args.command)
     else:
-        octodon = Octodon(config, spent_on, new_session=args.new_session)
+        octodon = Octodon(
+            config,
+            spent_on,
+            new_session=args.new_session,
+            startup_times=startup_times,
+        )
         if args.command != "shell":
             octodon.cmdqueue.extend(["edit"])
         octodon.cmdloop()
+
+
+def print_startup_profile(startup_times, total):
+    rows = [
+        (name, "{0:.1f} ms".format((seconds or 0) * 1000))
+        for name, seconds in startup_times.items()
+    ]
+    rows.append(("total", "{0:.1f} ms".format(total * 1000)))
+    print(make_table(rows, header=["step", "time"]), file=sys.stderr)
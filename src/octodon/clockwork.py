@@ -22,6 +22,69 @@ class ClockWorkTimeLog(object):
         bookings = self.aggregate_facts(facts, date=date, loginfo=loginfo)
         return bookings
 
+    def get_timeinfo_range(self, start, end, loginfo={}, activities=[]):
+        """Return the bookings of every day in [start, end) from one parse.
+
+        ``loginfo`` maps each day to the ticket references of that day.
+        """
+        facts_by_day = {}
+        for fact in self.get_facts(self.get_raw_log()):
+            facts_by_day.setdefault(fact["spent_on"].date(), []).append(fact)
+        timeinfo = {}
+        for offset in range((end - start).days):
+            date = start + timedelta(offset)
+            timeinfo[date.date()] = self.aggregate_facts(
+                facts_by_day.get(date.date(), []),
+                date=date,
+                loginfo=loginfo.get(date.date(), {}),
+            )
+        return timeinfo
+
+    def iter_timeinfo_range(self, start, end, loginfo={}, activities=[]):
+        """Yield the days in [start, end) that have bookings, with their bookings.
+
+        The log is read as a stream and only one day is held in memory at a
+        time, so the days come in the order they appear in the log, with the
+        files of a directory or glob read in the order of their names. A day
+        split across consecutive files is yielded once, but a day that shows
+        up again after another day is yielded again, with a warning.
+        ``loginfo`` is asked for each day's ticket references as it is
+        reached.
+        """
+        day = None
+        last_day = latest_day = None
+        facts = []
+        for fact in self.iter_facts(self.get_raw_log()):
+            fact_day = fact["spent_on"].date()
+            if fact_day != day:
+                if facts:
+                    yield day, self._aggregate_day(day, facts, loginfo)
+                    last_day = day
+                    latest_day = max(day, latest_day or day)
+                day = fact_day
+                facts = []
+                if (
+                    latest_day is not None
+                    and day <= latest_day
+                    and start.date() <= day < end.date()
+                ):
+                    print(
+                        "*** Warning: The time log is not in date order, the "
+                        "bookings of {0} follow those of {1}".format(day, last_day),
+                        file=sys.stderr,
+                    )
+            if start.date() <= fact_day < end.date():
+                facts.append(fact)
+        if facts:
+            yield day, self._aggregate_day(day, facts, loginfo)
+
+    def _aggregate_day(self, day, facts, loginfo):
+        return self.aggregate_facts(
+            facts,
+            date=datetime(day.year, day.month, day.day),
+            loginfo=loginfo.get(day, {}),
+        )
+
     def aggregate_facts(self, facts, date=datetime.now(), loginfo={}):
         bookings = []
         for fact in facts:
@@ -62,13 +125,13 @@ class ClockWorkTimeLog(object):
                 yield line
             log_file.close()
         elif os.path.isdir(log_path):
-            for file_path in os.listdir(log_path):
+            for file_path in sorted(os.listdir(log_path)):
                 log_file = open(os.path.join(log_path, file_path), "r")
                 for line in log_file:
                     yield line
                 log_file.close()
         else:
-            paths = glob(self.log_path)
+            paths = sorted(glob(self.log_path))
             for log_path in paths:
                 for line in self.get_raw_log(log_path):
                     yield line
@@ -100,7 +163,9 @@ class ClockWorkTimeLog(object):
         return fact
 
     def get_facts(self, timesheet):
-        facts = []
+        return list(self.iter_facts(timesheet))
+
+    def iter_facts(self, timesheet):
         current_task = None
         self.current_date = None
         if isinstance(timesheet, str):
@@ -110,7 +175,7 @@ class ClockWorkTimeLog(object):
             time_match = self.time_pattern.match(line)
             if date_match:
                 if current_task and current_task["description"]:
-                    facts.append(self.finalize_task(current_task))
+                    yield self.finalize_task(current_task)
                     current_task = None
 
                 self.current_date = datetime(
@@ -147,13 +212,10 @@ class ClockWorkTimeLog(object):
                         next_task["clock"] = next_task["clock"].replace(
                             day=next_task["clock"].day + 1
                         )
-                    facts.append(
-                        self.finalize_task(current_task, end_time=next_task["clock"])
-                    )
+                    yield self.finalize_task(current_task, end_time=next_task["clock"])
                 current_task = next_task
         if current_task and current_task["description"]:
-            facts.append(self.finalize_task(current_task))
-        return facts
+            yield self.finalize_task(current_task)
 
     def get_time_balance(self):
         daily_time = 7.5
@@ -0,0 +1,242 @@
+from contextlib import redirect_stderr
+from contextlib import redirect_stdout
+from datetime import datetime
+from io import StringIO
+from octodon.cli import daemon_commands
+from octodon.cli import get_config
+from octodon.cli import Octodon
+from octodon.exceptions import DaemonError
+from octodon.exceptions import DaemonUnavailable
+from octodon.utils import get_data_home
+
+import argparse
+import json
+import os
+import socket
+import socketserver
+import sys
+import time
+
+
+def get_socket_path(config=None):
+    """Return the path of the socket octodond listens on.
+
+    It can be set with the *socket* option of the *daemon* section and
+    defaults to ``octodon.sock`` in the runtime or data directory.
+    """
+    if config is not None and config.has_option("daemon", "socket"):
+        return os.path.expanduser(config.get("daemon", "socket"))
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR") or get_data_home()
+    return os.path.join(runtime_dir, "octodon.sock")
+
+
+def request(socket_path, command, timeout=60, **args):
+    """Send a request to octodond and return its result.
+
+    Requests and responses are JSON objects, one per line. Raises
+    DaemonUnavailable if the daemon can't be reached or declines the
+    request, and DaemonError if it fails once the request has been sent.
+    """
+    payload = dict(args, command=command)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+    except OSError as e:
+        sock.close()
+        raise DaemonUnavailable("Could not connect to {0}: {1}".format(socket_path, e))
+    try:
+        with sock, sock.makefile("rwb") as stream:
+            stream.write(json.dumps(payload).encode("utf-8") + b"\n")
+            stream.flush()
+            line = stream.readline()
+    except OSError as e:
+        raise DaemonError("No response from {0}: {1}".format(socket_path, e))
+    if not line:
+        raise DaemonError("No response from {0}".format(socket_path))
+    response = json.loads(line.decode("utf-8"))
+    if not response.get("ok"):
+        if response.get("declined"):
+            raise DaemonUnavailable(response.get("error", "unknown error"))
+        raise DaemonError(response.get("error", "unknown error"))
+    return response.get("result")
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for line in self.rfile:
+            try:
+                response = {"ok": True, "result": self.server.daemon.handle(line)}
+            except DaemonUnavailable as du:
+                response = {"ok": False, "error": str(du), "declined": True}
+            except DaemonError as de:
+                response = {"ok": False, "error": str(de)}
+            except Exception as e:
+                response = {
+                    "ok": False,
+                    "error": "{0}: {1}".format(e.__class__.__name__, e),
+                }
+            self.wfile.write(json.dumps(response).encode("utf-8") + b"\n")
+            self.wfile.flush()
+
+
+class OctodonDaemon(object):
+    """Keep an Octodon session with warm connections and caches around.
+
+    Requests are handled one at a time, so the session doesn't have to be
+    thread safe. The session is started over once it is older than the
+    *cache_ttl* option of the *daemon* section.
+    """
+
+    def __init__(self, config, socket_path, cfgfile=None):
+        self.config = config
+        self.socket_path = socket_path
+        self.cfgfile = cfgfile and os.path.abspath(cfgfile)
+        self.running = False
+        self._octodon = None
+        self._started = None
+
+    @property
+    def octodon(self):
+        cache_ttl = self.config.getint("daemon", "cache_ttl", fallback=600)
+        if self._octodon is not None and time.time() - self._started > cache_ttl:
+            self._octodon = None
+        if self._octodon is None:
+            self._octodon = Octodon(self.config, datetime.now(), new_session=True)
+            self._started = time.time()
+        return self._octodon
+
+    def refresh(self):
+        """Return the session, without the lookups that may have gone stale."""
+        octodon = self.octodon
+        tracking = getattr(octodon, "_tracking", None)
+        if tracking is not None:
+            # the issues may have been created since
+            tracking.forget_misses()
+        redmine = getattr(octodon, "_redmine", None)
+        if redmine is not None:
+            redmine.expire()
+        return octodon
+
+    def handle(self, line):
+        try:
+            message = json.loads(line.decode("utf-8"))
+            command = message.pop("command")
+        except (ValueError, KeyError, AttributeError):
+            raise DaemonError("Invalid request: {0!r}".format(line))
+        handler = getattr(self, "do_" + str(command), None)
+        if handler is None:
+            raise DaemonError("Unknown command: {0}".format(command))
+        return handler(**message)
+
+    def do_ping(self):
+        return "pong"
+
+    def do_run(self, line, date=None, config_file=None, cwd=None):
+        """Run an octodon command for a day and return its output.
+
+        Commands for another configuration file than the daemon's own are
+        declined. The command runs in the client's working directory *cwd*,
+        so relative file names, e.g. of ``list save``, end up where the user
+        expects them. Changing the directory and redirecting stdout and
+        stderr affect the whole process; that is only safe because serve()
+        handles one request at a time.
+        """
+        if line.split(" ")[0] not in daemon_commands:
+            raise DaemonUnavailable(
+                "Command not available in the daemon: {0}".format(line)
+            )
+        if config_file != self.cfgfile:
+            raise DaemonUnavailable(
+                "octodond runs with {0}".format(
+                    self.cfgfile or "the default configuration"
+                )
+            )
+        if cwd is not None and not os.path.isdir(cwd):
+            raise DaemonUnavailable("No such directory: {0}".format(cwd))
+        octodon = self.refresh()
+        if date:
+            octodon.spent_on = datetime.strptime(date, "%Y-%m-%d")
+        # the bookings are read from the time log again for every command,
+        # the backends and their caches are kept
+        octodon.is_new_session = True
+        octodon._bookings = None
+        out = StringIO()
+        err = StringIO()
+        daemon_cwd = os.getcwd()
+        try:
+            if cwd is not None:
+                os.chdir(cwd)
+            with redirect_stdout(out), redirect_stderr(err):
+                octodon.onecmd(line)
+        finally:
+            os.chdir(daemon_cwd)
+        return {"stdout": out.getvalue(), "stderr": err.getvalue()}
+
+    def do_issue_title(self, issue_id):
+        return self.refresh().tracking.get_issue_title(issue_id)
+
+    def do_reload(self):
+        """Drop the session, so configuration and caches are read again."""
+        self.config = get_config(self.cfgfile)
+        self._octodon = None
+        return "reloaded"
+
+    def do_shutdown(self):
+        self.running = False
+        return "bye"
+
+    def serve(self):
+        if os.path.exists(self.socket_path):
+            try:
+                request(self.socket_path, "ping", timeout=1)
+            except DaemonError:
+                # left over from a daemon that didn't shut down cleanly
+                os.remove(self.socket_path)
+            else:
+                raise DaemonError(
+                    "octodond is already listening on {0}".format(self.socket_path)
+                )
+        # only the user may talk to the daemon, it holds their credentials
+        umask = os.umask(0o077)
+        try:
+            server = socketserver.UnixStreamServer(self.socket_path, RequestHandler)
+        finally:
+            os.umask(umask)
+        server.daemon = self
+        self.running = True
+        try:
+            while self.running:
+                server.handle_request()
+        finally:
+            server.server_close()
+            os.remove(self.socket_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Keep octodon's tracker connections and caches warm"
+    )
+    parser.add_argument(
+        "--config-file",
+        "-c",
+        type=str,
+        help="the configuration file to use",
+    )
+    parser.add_argument(
+        "--socket",
+        type=str,
+        help="the socket to listen on",
+    )
+    args = parser.parse_args()
+
+    config = get_config(args.config_file)
+    socket_path = args.socket or get_socket_path(config)
+    daemon = OctodonDaemon(config, socket_path, cfgfile=args.config_file)
+    try:
+        daemon.serve()
+    except DaemonError as de:
+        print(de, file=sys.stderr)
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
@@ -8,3 +8,14 @@ class NotFound(Exception):
 
 class ConnectionError(Exception):
     """Problem while connecting to remote host"""
+
+
+class DaemonError(Exception):
+    """The octodon daemon could not be reached or rejected a request"""
+
+
+class DaemonUnavailable(DaemonError):
+    """The octodon daemon could not be reached or declined a request
+
+    Nothing was carried out, so the request can be handled locally instead.
+    """
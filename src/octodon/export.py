@@ -0,0 +1,71 @@
+import csv
+import json
+import sys
+
+
+export_fields = [
+    "date",
+    "issue_id",
+    "issue_title",
+    "project",
+    "activity",
+    "hours",
+    "description",
+    "comments",
+]
+
+
+def get_export_row(entry):
+    """Return the fields of a booking that are exported, as strings."""
+    row = dict((field, entry.get(field) or "") for field in export_fields)
+    row["date"] = entry["spent_on"].strftime("%Y-%m-%d")
+    row["hours"] = "{0:.2f}".format(entry["time"] / 60.0)
+    return row
+
+
+def write_csv(bookings, outfile, template=None):
+    writer = csv.DictWriter(outfile, fieldnames=export_fields)
+    writer.writeheader()
+    count = 0
+    for entry in bookings:
+        writer.writerow(get_export_row(entry))
+        count += 1
+    return count
+
+
+def write_jsonl(bookings, outfile, template=None):
+    count = 0
+    for entry in bookings:
+        outfile.write(json.dumps(get_export_row(entry)) + "\n")
+        count += 1
+    return count
+
+
+def write_template(bookings, outfile, template="- {comments}"):
+    """Write one line per booking, formatted with the list item template.
+
+    Besides the exported fields, the template can use everything the
+    bookings have, like ``{time}`` in minutes or ``{tags}``.
+    """
+    count = 0
+    for entry in bookings:
+        try:
+            line = template.format(**dict(entry, **get_export_row(entry)))
+        except Exception as e:
+            print(
+                "Error when using template ({})! {}: {}".format(
+                    template, e.__class__.__name__, e
+                ),
+                file=sys.stderr,
+            )
+            return count
+        outfile.write(line + "\n")
+        count += 1
+    return count
+
+
+writers = {
+    "csv": write_csv,
+    "jsonl": write_jsonl,
+    "template": write_template,
+}
@@ -0,0 +1,535 @@
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from octodon.timing import get_endpoint
+from octodon.utils import make_table
+from threading import Lock
+from threading import Thread
+from urllib.parse import parse_qsl
+from urllib.parse import urlsplit
+
+import argparse
+import json
+import math
+import random
+import re
+import time
+
+
+class FakeData(object):
+    """The projects, issues and tasks served by the fake trackers.
+
+    Every project exists in redmine and, with the identifier as code, in
+    harvest, and is the contract of its issues. Issue ``n`` exists as redmine issue ``1000 + n``, jira issue
+    ``PLN-n`` and github issue ``acme/website#n``.
+    """
+
+    def __init__(self, issues=100, projects=10):
+        self.projects = [
+            {
+                "id": i,
+                "identifier": "project-{0}".format(i),
+                "name": "Project {0}".format(i),
+                # contracts name the harvest project to book to
+                "contract": "project-{0}".format(i),
+            }
+            for i in range(1, projects + 1)
+        ]
+        self.issues = {}
+        for n in range(1, issues + 1):
+            self.issues[n] = {
+                "title": "Issue {0}".format(n),
+                "project": self.projects[n % projects],
+            }
+        self.tasks = [
+            {"id": i, "name": name, "billable": name == "Development"}
+            for i, name in enumerate(
+                ["Development", "Meeting", "Project Management", "Admin/Orga"], 1
+            )
+        ]
+        self.activities = [
+            {"id": task["id"], "name": task["name"], "is_default": task["id"] == 1}
+            for task in self.tasks
+        ]
+        self.time_entries = {"harvest": [], "redmine": [], "jira": []}
+
+
+class FakeTrackerServer(ThreadingHTTPServer):
+    """A local stand-in for redmine, jira, github and harvest.
+
+    Each tracker is served below its own path, e.g. ``/redmine``, and only
+    understands the requests octodon sends. ``latency`` is the time in
+    seconds every response is delayed, ``error_rate`` the share of requests
+    failing with 500, ``rate_limit`` the number of requests per second and
+    tracker answered before 429 is returned, and ``page_size`` the maximum
+    number of items on a page of a collection.
+    """
+
+    daemon_threads = True
+    backends = ["redmine", "jira", "github", "harvest"]
+
+    def __init__(
+        self,
+        address=("127.0.0.1", 0),
+        data=None,
+        latency=0.0,
+        error_rate=0.0,
+        rate_limit=None,
+        page_size=100,
+        seed=0,
+    ):
+        ThreadingHTTPServer.__init__(self, address, FakeTrackerHandler)
+        if data is None:
+            data = FakeData()
+        self.data = data
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.page_size = page_size
+        self.requests = {}
+        self._random = random.Random(seed)
+        self._recent = dict((backend, []) for backend in self.backends)
+        self._lock = Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return "http://{0}:{1}".format(host, port)
+
+    def get_config(self):
+        """Return configuration sections for octodon to use this server."""
+        return (
+            "[redmine]\nurl = {0}/redmine\nuser = fake\npass = fake\n\n"
+            "[jira]\nurl = {0}/jira\nuser = fake\npass = fake\n\n"
+            "[github]\nurl = {0}/github\ntoken = fake\norganization = acme\n"
+            "project_num = 1\n\n"
+            "[harvest]\nurl = {0}/harvest/v2\naccount_id = 1\n"
+            "personal_token = fake\n".format(self.url)
+        )
+
+    def start(self):
+        """Serve in a background thread."""
+        self._thread = Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def record(self, backend, method, path):
+        key = (backend, method, get_endpoint(path))
+        with self._lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+
+    def throttle(self, backend):
+        """Return the seconds to wait if backend's rate limit is exceeded."""
+        if not self.rate_limit:
+            return None
+        with self._lock:
+            now = time.monotonic()
+            recent = [t for t in self._recent[backend] if now - t < 1.0]
+            self._recent[backend] = recent
+            if len(recent) >= self.rate_limit:
+                return 1.0 - (now - recent[0])
+            recent.append(now)
+        return None
+
+    def fails(self):
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+    def format_requests(self):
+        rows = [list(key) + [str(self.requests[key])] for key in sorted(self.requests)]
+        return make_table(rows, header=["Backend", "Method", "Endpoint", "Requests"])
+
+
+class FakeTrackerHandler(BaseHTTPRequestHandler):
+    # keep connections alive so connection pooling is exercised
+    protocol_version = "HTTP/1.1"
+
+    routes = [
+        ("GET", "redmine", r"/enumerations/time_entry_activities\.json", "activities"),
+        ("GET", "redmine", r"/projects\.json", "redmine_projects"),
+        ("GET", "redmine", r"/issues\.json", "redmine_issues"),
+        ("GET", "redmine", r"/issues/([0-9]+)\.json", "redmine_issue"),
+        ("POST", "redmine", r"/time_entries\.json", "redmine_time_entry"),
+        ("GET", "jira", r"/rest/auth/1/session", "jira_session"),
+        ("GET", "jira", r"/rest/api/2/serverInfo", "jira_server_info"),
+        ("GET", "jira", r"/rest/api/2/field", "jira_fields"),
+        ("GET", "jira", r"/rest/api/2/search", "jira_search"),
+        ("GET", "jira", r"/rest/api/2/issue/([A-Z]+-[0-9]+)", "jira_issue"),
+        ("POST", "jira", r"/rest/api/2/issue/([A-Z]+-[0-9]+)/worklog", "jira_worklog"),
+        ("POST", "github", r"/graphql", "github_graphql"),
+        ("GET", "harvest", r"/v2/projects", "harvest_projects"),
+        ("GET", "harvest", r"/v2/tasks", "harvest_tasks"),
+        ("POST", "harvest", r"/v2/time_entries", "harvest_time_entry"),
+    ]
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.handle_api()
+
+    def do_POST(self):
+        self.handle_api()
+
+    def handle_api(self):
+        url = urlsplit(self.path)
+        backend, _, path = url.path.lstrip("/").partition("/")
+        path = "/" + path
+        query = dict(parse_qsl(url.query))
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        server = self.server
+        server.record(backend, self.command, path)
+        if server.latency:
+            time.sleep(server.latency)
+
+        if backend not in server.backends:
+            return self.send_json(404, {"error": "unknown tracker"})
+        retry_after = server.throttle(backend)
+        if retry_after is not None:
+            return self.send_json(
+                429,
+                {"message": "rate limit exceeded"},
+                {"Retry-After": str(max(int(math.ceil(retry_after)), 1))},
+            )
+        if server.fails():
+            return self.send_json(500, {"message": "internal server error"})
+
+        for method, route_backend, pattern, name in self.routes:
+            match = re.match(pattern + "$", path)
+            if method == self.command and route_backend == backend and match:
+                try:
+                    data = json.loads(body.decode("utf-8")) if body else {}
+                except ValueError:
+                    return self.send_json(400, {"message": "invalid JSON"})
+                status, result = getattr(self, name)(query, data, *match.groups())
+                return self.send_json(status, result)
+        self.send_json(404, {"message": "not found"})
+
+    def send_json(self, status, data, headers={}):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def get_page(self, items, offset, limit):
+        limit = min(int(limit or self.server.page_size), self.server.page_size)
+        return items[int(offset or 0) :][:limit], limit
+
+    # redmine
+
+    def activities(self, query, data):
+        return 200, {"time_entry_activities": self.server.data.activities}
+
+    def redmine_projects(self, query, data):
+        projects = [
+            {"id": p["id"], "identifier": p["identifier"], "name": p["name"]}
+            for p in self.server.data.projects
+        ]
+        page, limit = self.get_page(projects, query.get("offset"), query.get("limit"))
+        return 200, {
+            "projects": page,
+            "total_count": len(projects),
+            "offset": int(query.get("offset", 0)),
+            "limit": limit,
+        }
+
+    def make_redmine_issue(self, n):
+        issue = self.server.data.issues[n]
+        project = issue["project"]
+        return {
+            "id": 1000 + n,
+            "project": {"id": project["id"], "name": project["name"]},
+            "tracker": {"id": 2, "name": "Feature"},
+            "subject": issue["title"],
+            "custom_fields": [
+                {"id": 1, "name": "Contracts", "value": project["contract"]}
+            ],
+        }
+
+    def redmine_issues(self, query, data):
+        ids = [int(i) - 1000 for i in query.get("issue_id", "").split(",") if i]
+        issues = [
+            self.make_redmine_issue(n) for n in ids if n in self.server.data.issues
+        ]
+        page, limit = self.get_page(issues, query.get("offset"), query.get("limit"))
+        return 200, {
+            "issues": page,
+            "total_count": len(issues),
+            "offset": int(query.get("offset", 0)),
+            "limit": limit,
+        }
+
+    def redmine_issue(self, query, data, issue_id):
+        n = int(issue_id) - 1000
+        if n not in self.server.data.issues:
+            return 404, {"errors": ["not found"]}
+        return 200, {"issue": self.make_redmine_issue(n)}
+
+    def redmine_time_entry(self, query, data):
+        entry = data.get("time_entry", {})
+        if int(entry.get("issue_id", 0)) - 1000 not in self.server.data.issues:
+            return 422, {"errors": ["Issue is invalid"]}
+        with self.server._lock:
+            entries = self.server.data.time_entries["redmine"]
+            entries.append(entry)
+            entry = dict(entry, id=len(entries))
+        return 201, {"time_entry": entry}
+
+    # jira
+
+    def jira_session(self, query, data):
+        return 200, {"name": "fake", "self": self.server.url + "/jira"}
+
+    def jira_server_info(self, query, data):
+        return 200, {
+            "baseUrl": self.server.url + "/jira",
+            "version": "9.4.0",
+            "versionNumbers": [9, 4, 0],
+            "deploymentType": "Server",
+            "buildNumber": 940000,
+            "serverTitle": "Fake Jira",
+        }
+
+    def jira_fields(self, query, data):
+        return 200, [
+            {"id": field_id, "key": field_id, "name": name, "custom": custom}
+            for field_id, name, custom in [
+                ("summary", "Summary", False),
+                ("issuetype", "Issue Type", False),
+                ("project", "Project", False),
+                ("customfield_10902", "Contracts", True),
+            ]
+        ]
+
+    def make_jira_issue(self, n):
+        issue = self.server.data.issues[n]
+        return {
+            "id": str(10000 + n),
+            "key": "PLN-{0}".format(n),
+            "self": "{0}/jira/rest/api/2/issue/{1}".format(self.server.url, 10000 + n),
+            "fields": {
+                "summary": issue["title"],
+                "issuetype": {"name": "Task"},
+                "project": {"key": "PLN"},
+                "customfield_10902": {
+                    "value": "Contracts",
+                    "child": {"value": issue["project"]["contract"]},
+                },
+            },
+        }
+
+    def jira_issue_number(self, key):
+        project, _, number = key.partition("-")
+        if project == "PLN" and int(number) in self.server.data.issues:
+            return int(number)
+        return None
+
+    def jira_search(self, query, data):
+        match = re.match(r"key in \((.*)\)", query.get("jql", ""))
+        keys = match.group(1).split(", ") if match else []
+        numbers = [self.jira_issue_number(key) for key in keys]
+        issues = [self.make_jira_issue(n) for n in numbers if n is not None]
+        start_at = int(query.get("startAt", 0))
+        page, limit = self.get_page(issues, start_at, query.get("maxResults"))
+        return 200, {
+            "startAt": start_at,
+            "maxResults": limit,
+            "total": len(issues),
+            "issues": page,
+        }
+
+    def jira_issue(self, query, data, key):
+        n = self.jira_issue_number(key)
+        if n is None:
+            return 404, {"errorMessages": ["Issue does not exist"], "errors": {}}
+        return 200, self.make_jira_issue(n)
+
+    def jira_worklog(self, query, data, key):
+        if self.jira_issue_number(key) is None:
+            return 404, {"errorMessages": ["Issue does not exist"], "errors": {}}
+        with self.server._lock:
+            entries = self.server.data.time_entries["jira"]
+            entries.append(dict(data, issue=key))
+            worklog = dict(data, id=str(len(entries)))
+        return 201, worklog
+
+    # github
+
+    def github_graphql(self, query, data):
+        graphql = data.get("query", "")
+        variables = data.get("variables") or {}
+        if "projectV2(number" in graphql:
+            return 200, self.github_items(variables)
+        if "repository(owner" in graphql:
+            return 200, self.github_issues(variables)
+        return 200, {"errors": [{"message": "unsupported query"}]}
+
+    def github_items(self, variables):
+        issues = self.server.data.issues
+        numbers = sorted(issues)
+        offset = int(variables.get("items_cursor") or 0)
+        page, limit = self.get_page(numbers, offset, 100)
+        nodes = [
+            {
+                "updatedAt": "2019-11-13T09:00:00Z",
+                "fieldValueByName": {"text": issues[n]["project"]["contract"]},
+                "content": {
+                    "number": n,
+                    "title": issues[n]["title"],
+                    "repository": {"owner": {"login": "acme"}, "name": "website"},
+                },
+            }
+            for n in page
+        ]
+        items = {
+            "nodes": nodes,
+            "pageInfo": {
+                "endCursor": str(offset + len(page)),
+                "hasNextPage": offset + len(page) < len(numbers),
+            },
+        }
+        return {"data": {"organization": {"projectV2": {"items": items}}}}
+
+    def github_issues(self, variables):
+        result = {}
+        errors = []
+        i = 0
+        while "n{0}".format(i) in variables:
+            owner = variables["o{0}".format(i)]
+            name = variables["r{0}".format(i)]
+            n = variables["n{0}".format(i)]
+            issue = None
+            if (owner, name) == ("acme", "website") and n in self.server.data.issues:
+                issue = self.server.data.issues[n]
+            if issue is None:
+                errors.append({"type": "NOT_FOUND", "message": "not found"})
+                result["i{0}".format(i)] = {"issue": None}
+            else:
+                item = {
+                    "project": {"number": 1, "owner": {"login": "acme"}},
+                    "fieldValueByName": {"text": issue["project"]["contract"]},
+                }
+                result["i{0}".format(i)] = {
+                    "issue": {
+                        "title": issue["title"],
+                        "projectItems": {"nodes": [item]},
+                    }
+                }
+            i += 1
+        response = {"data": result}
+        if errors:
+            response["errors"] = errors
+        return response
+
+    # harvest
+
+    def harvest_collection(self, key, items, query):
+        page_number = int(query.get("page", 1))
+        per_page = min(int(query.get("per_page", 100)), self.server.page_size)
+        page = items[(page_number - 1) * per_page :][:per_page]
+        total_pages = max(int(math.ceil(len(items) / float(per_page))), 1)
+        return 200, {
+            key: page,
+            "per_page": per_page,
+            "total_pages": total_pages,
+            "total_entries": len(items),
+            "page": page_number,
+            "next_page": page_number + 1 if page_number < total_pages else None,
+            "previous_page": page_number - 1 if page_number > 1 else None,
+        }
+
+    def harvest_projects(self, query, data):
+        projects = [
+            {
+                "id": 7000 + p["id"],
+                "code": p["identifier"],
+                "name": p["name"],
+                "is_active": True,
+            }
+            for p in self.server.data.projects
+        ]
+        return self.harvest_collection("projects", projects, query)
+
+    def harvest_tasks(self, query, data):
+        return self.harvest_collection("tasks", self.server.data.tasks, query)
+
+    def harvest_time_entry(self, query, data):
+        project_ids = [7000 + p["id"] for p in self.server.data.projects]
+        task_ids = [task["id"] for task in self.server.data.tasks]
+        if data.get("project_id") not in project_ids:
+            return 422, {"message": "Project is invalid"}
+        if data.get("task_id") not in task_ids:
+            return 422, {"message": "Task is invalid"}
+        with self.server._lock:
+            entries = self.server.data.time_entries["harvest"]
+            entries.append(data)
+            entry = dict(data, id=len(entries))
+        return 201, entry
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Serve fake redmine, jira, github and harvest APIs locally"
+    )
+    parser.add_argument("--host", type=str, default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.0,
+        help="the time every response is delayed, in milliseconds",
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="the share of requests failing with 500, e.g. 0.01",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        help="the requests per second and tracker answered before 429",
+    )
+    parser.add_argument(
+        "--page-size",
+        type=int,
+        default=100,
+        help="the maximum number of items per page",
+    )
+    parser.add_argument(
+        "--issues", type=int, default=100, help="the number of issues per tracker"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = FakeTrackerServer(
+        (args.host, args.port),
+        data=FakeData(issues=args.issues),
+        latency=args.latency / 1000.0,
+        error_rate=args.error_rate,
+        rate_limit=args.rate_limit,
+        page_size=args.page_size,
+        seed=args.seed,
+    )
+    print("Serving fake trackers on {0}. Configuration:\n".format(server.url))
+    print(server.get_config())
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(server.format_requests())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,13 @@
+from datetime import datetime
+from datetime import timedelta
 from github3api import GitHubAPI
 from github3api.githubapi import GraphqlError
 from octodon.issue import Issue
+from octodon.ratelimit import RateLimiter
+from octodon.timing import timings
+from octodon.utils import get_cache_file
+from octodon.utils import read_cache
+from octodon.utils import write_cache
 
 import logging
 import re
@@ -33,88 +40,214 @@ class GithubIssue(Issue):
 class Github(object):
     ticket_pattern = re.compile("(([^/ ]+)/([^/]+)#([0-9]+))")
 
-    def __init__(self, token, organization, project_num):
-        self._github = GitHubAPI(bearer_token=token)
-        self.organization = organization
-        self.project_num = project_num
+    rate_limit = 1.0
+    rate_limit_burst = 10
 
-    @property
-    def issues(self):
-        if not hasattr(self, "_issues"):
-            query = """
-                query($organization:String!, $project_num:Int!, $items_cursor:String!) {
-                    organization(login: $organization) {
-                        projectV2(number: $project_num) {
-                            items(first:100, after: $items_cursor) {
-                            nodes {
-                                fieldValueByName(name: "Contracts") {
-                                    ...on ProjectV2ItemFieldTextValue {
-                                        text
-                                    }
-                                }
-                                content {
-                                ...on Issue {
-                                    number
-                                    title
-                                    repository {
-                                        owner {
-                                            login
-                                        }
-                                        name
-                                    }
-                                }
+    items_query = """
+        query(
+            $organization:String!,
+            $project_num:Int!,
+            $items_cursor:String!,
+            $filter:String
+        ) {
+            organization(login: $organization) {
+                projectV2(number: $project_num) {
+                    items(first:100, after: $items_cursor, query: $filter) {
+                    nodes {
+                        updatedAt
+                        fieldValueByName(name: "Contracts") {
+                            ...on ProjectV2ItemFieldTextValue {
+                                text
+                            }
+                        }
+                        content {
+                        ...on Issue {
+                            number
+                            title
+                            repository {
+                                owner {
+                                    login
                                 }
+                                name
                             }
-                            pageInfo {
-                              endCursor
-                              hasNextPage
+                        }
+                        }
+                    }
+                    pageInfo {
+                      endCursor
+                      hasNextPage
+                    }
+                    }
+                }
+            }
+        }
+    """
+
+    issue_fragment = """
+        ALIAS: repository(owner: $oINDEX, name: $rINDEX) {
+            issue(number: $nINDEX) {
+                title
+                projectItems(first: 20) {
+                    nodes {
+                        project {
+                            number
+                            owner {
+                                ...on Organization {
+                                    login
+                                }
                             }
+                        }
+                        fieldValueByName(name: "Contracts") {
+                            ...on ProjectV2ItemFieldTextValue {
+                                text
                             }
                         }
                     }
                 }
-            """
-            items_cursor = ""
-            hasNextPage = True
+            }
+        }
+    """
+    # keeps a single targeted query well below GraphQL's node and cost limits
+    max_aliases = 50
+    # the index is rebuilt from scratch once every this many cache_ttl, so
+    # cards removed from the board are dropped
+    full_sync_factor = 24
+
+    def __init__(
+        self,
+        token,
+        organization,
+        project_num,
+        rate_limiter=None,
+        cache_ttl=3600,
+        lookup="index",
+        url=None,
+    ):
+        self._github = GitHubAPI(bearer_token=token)
+        # the API of GitHub Enterprise or a local stand-in instead of github.com
+        self.graphql_url = url and url.rstrip("/") + "/graphql"
+        self.organization = organization
+        self.project_num = project_num
+        self.lookup = lookup
+        if rate_limiter is None:
+            rate_limiter = RateLimiter(self.rate_limit, burst=self.rate_limit_burst)
+        self.rate_limiter = rate_limiter
+        timings.install(self._github.session, "github")
+        self.rate_limiter.install(self._github.session)
+        self.cache_ttl = cache_ttl
+        self.full_sync_ttl = cache_ttl * self.full_sync_factor
+        self.index_file = get_cache_file(
+            "octodon-github-issues", "{0}/{1}".format(organization, project_num)
+        )
+        self._issues = None
+        self._synced_at = None
+        self._full_synced_at = None
+        self._synced = False
+
+    @staticmethod
+    def make_key(org, repo, number):
+        return "{0}/{1}#{2}".format(org, repo, int(number))
+
+    @property
+    def issues(self):
+        """Index of the project's issues, keyed by ``org/repo#number``.
+
+        The index is kept on disk. It is brought up to date incrementally
+        once it is older than ``cache_ttl`` seconds, and rebuilt once its last
+        full sync is older than ``full_sync_ttl`` seconds.
+        """
+        if self._issues is None:
+            index = read_cache(self.index_file) or {}
+            self._issues = index.get("issues", {})
+            self._synced_at = index.get("synced_at")
+            self._full_synced_at = index.get("full_synced_at")
+            max_age = timedelta(seconds=self.cache_ttl)
+            if self._synced_at is None or datetime.now() - self._synced_at > max_age:
+                self.sync()
+        return self._issues
+
+    def sync(self):
+        """Fetch the items updated since the last sync into the index.
+
+        Without a recent full sync all items are fetched instead, and they
+        replace the index once they have all been read. Only one sync is
+        attempted per session, even if it fails.
+        """
+        if self._issues is None:
             self._issues = {}
-            while hasNextPage:
-                try:
-                    result = self._github.graphql(
-                        query,
-                        {
-                            "organization": self.organization,
-                            "project_num": self.project_num,
-                            "items_cursor": items_cursor,
-                        },
-                    )
-                except GraphqlError as e:
-                    logger.error(str(e))
-                    return self._issues
-                nodes = result["data"]["organization"]["projectV2"]["items"]["nodes"]
-                for node in nodes:
-                    contract = (node.get("fieldValueByName") or {}).get("text")
-                    if not node.get("content"):
-                        # probably a draft card
-                        continue
-                    repo = node["content"].get("repository")
-                    if not repo:
-                        continue
-                    owner = repo["owner"]["login"]
-                    name = repo["name"]
-                    number = node["content"]["number"]
-                    title = node["content"]["title"]
-                    self._issues.setdefault(owner, {}).setdefault(name, {})[number] = {
-                        "contract": contract,
-                        "title": title,
-                    }
-                hasNextPage = result["data"]["organization"]["projectV2"]["items"][
-                    "pageInfo"
-                ]["hasNextPage"]
-                items_cursor = result["data"]["organization"]["projectV2"]["items"][
-                    "pageInfo"
-                ]["endCursor"]
+        # unknown issues don't trigger another sync, even while offline
+        self._synced = True
+        started = datetime.now()
+        full = self._full_synced_at is None or started - self._full_synced_at > (
+            timedelta(seconds=self.full_sync_ttl)
+        )
+        item_filter = None
+        issues = self._issues
+        if full:
+            issues = {}
+        else:
+            # the filter only has day granularity; overlap by a day to be safe
+            item_filter = "updated:>={0}".format(
+                (self._synced_at - timedelta(1)).strftime("%Y-%m-%d")
+            )
+        items_cursor = ""
+        hasNextPage = True
+        while hasNextPage:
+            try:
+                self.rate_limiter.acquire()
+                result = self._graphql(
+                    self.items_query,
+                    {
+                        "organization": self.organization,
+                        "project_num": self.project_num,
+                        "items_cursor": items_cursor,
+                        "filter": item_filter,
+                    },
+                )
+            except GraphqlError as e:
+                logger.error(str(e))
+                return self._issues
+            items = result["data"]["organization"]["projectV2"]["items"]
+            for node in items["nodes"]:
+                contract = (node.get("fieldValueByName") or {}).get("text")
+                if not node.get("content"):
+                    # probably a draft card
+                    continue
+                repo = node["content"].get("repository")
+                if not repo:
+                    continue
+                key = self.make_key(
+                    repo["owner"]["login"], repo["name"], node["content"]["number"]
+                )
+                issues[key] = {
+                    "contract": contract,
+                    "title": node["content"]["title"],
+                }
+            hasNextPage = items["pageInfo"]["hasNextPage"]
+            items_cursor = items["pageInfo"]["endCursor"]
+        self._issues = issues
+        self._synced_at = started
+        if full:
+            self._full_synced_at = started
+        write_cache(
+            self.index_file,
+            {
+                "synced_at": self._synced_at,
+                "full_synced_at": self._full_synced_at,
+                "issues": self._issues,
+            },
+        )
         return self._issues
 
+    def _graphql(self, query, variables):
+        if self.graphql_url is None:
+            return self._github.graphql(query, variables)
+        result = self._github.post(
+            self.graphql_url, json={"query": query, "variables": variables}
+        )
+        GitHubAPI.raise_if_error(result)
+        return result
+
     def get_project_id(self, organization, project_num):
         query = """
             query($org:String!, $project_num:Int!) {
@@ -129,15 +262,106 @@ class Github(object):
             "organization": self.organization,
             "project_num": self.project_num,
         }
-        result = self._github.graphql(query, variables)
+        self.rate_limiter.acquire()
+        result = self._graphql(query, variables)
         return result["organization"]["projectNext"]["id"]
 
+    def get_issues(self, issue_nos):
+        """Look up several issues, returning a dict of the ones found."""
+        if self.lookup == "targeted":
+            return self._get_issues_targeted(issue_nos)
+        issues = {}
+        for issue_no in issue_nos:
+            issue = issue_no and self._get_issue_from_index(issue_no)
+            if issue is not None:
+                issues[issue_no] = issue
+        return issues
+
     def get_issue(self, issue_no):
+        if self.lookup == "targeted":
+            return self._get_issues_targeted([issue_no]).get(issue_no)
+        return self._get_issue_from_index(issue_no)
+
+    def _get_issue_from_index(self, issue_no):
         match = self.ticket_pattern.match(issue_no)
         if not match:
             return None
-        org, repo, number = match.groups()[1:4]
-        try:
-            return GithubIssue(self.issues[org][repo][int(number)])
-        except KeyError:
+        key = self.make_key(*match.groups()[1:4])
+        issue = self.issues.get(key)
+        if issue is None and not self._synced:
+            # the issue may have been added to the project since the last sync
+            issue = self.sync().get(key)
+        if issue is None:
             return None
+        return GithubIssue(issue)
+
+    def _make_targeted_query(self, refs):
+        params = []
+        fields = []
+        variables = {}
+        for i, (org, repo, number) in enumerate(refs):
+            params.append("$o{0}:String!, $r{0}:String!, $n{0}:Int!".format(i))
+            fields.append(
+                self.issue_fragment.replace("ALIAS", "i{0}".format(i)).replace(
+                    "INDEX", str(i)
+                )
+            )
+            variables.update(
+                {
+                    "o{0}".format(i): org,
+                    "r{0}".format(i): repo,
+                    "n{0}".format(i): int(number),
+                }
+            )
+        query = "query({0}) {{\n{1}\n}}".format(", ".join(params), "\n".join(fields))
+        return query, variables
+
+    def _get_issues_targeted(self, issue_nos):
+        """Resolve issues with aliased GraphQL queries, chunk by chunk.
+
+        Only the referenced issues are requested, together with the value of
+        the Contracts field on this project's board.
+        """
+        refs = {}
+        for issue_no in issue_nos:
+            match = issue_no and self.ticket_pattern.match(issue_no)
+            if match:
+                refs.setdefault(tuple(match.groups()[1:4]), []).append(issue_no)
+        refs_list = sorted(refs)
+        issues = {}
+        for start in range(0, len(refs_list), self.max_aliases):
+            chunk = refs_list[start : start + self.max_aliases]
+            query, variables = self._make_targeted_query(chunk)
+            try:
+                self.rate_limiter.acquire()
+                result = self._github.post(
+                    self.graphql_url or "/graphql",
+                    json={"query": query, "variables": variables},
+                )
+            except Exception as e:
+                logger.error("{0}: {1}".format(e.__class__.__name__, e))
+                continue
+            for error in result.get("errors") or []:
+                if error.get("type") != "NOT_FOUND":
+                    logger.error(error.get("message", ""))
+            data = result.get("data") or {}
+            for i, ref in enumerate(chunk):
+                repository = data.get("i{0}".format(i)) or {}
+                issue = repository.get("issue")
+                if not issue:
+                    continue
+                contract = None
+                for item in issue["projectItems"]["nodes"]:
+                    project = item.get("project") or {}
+                    owner = project.get("owner") or {}
+                    if (
+                        project.get("number") == self.project_num
+                        and owner.get("login") == self.organization
+                    ):
+                        contract = (item.get("fieldValueByName") or {}).get("text")
+                        break
+                for issue_no in refs[ref]:
+                    issues[issue_no] = GithubIssue(
+                        {"title": issue["title"], "contract": contract}
+                    )
+        return issues
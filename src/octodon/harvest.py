@@ -1,14 +1,27 @@
+from collections import OrderedDict
 from harvest import Harvest as HarvestConnection
+from harvest import HarvestError
 from octodon.exceptions import NotFound
+from octodon.matching import KeywordMatcher
+from octodon.ratelimit import RateLimiter
+from octodon.timing import timings
+from octodon.utils import BOOKED
+from octodon.utils import booking_error
 from octodon.utils import get_data_home
 
+import json
 import os
 import pickle
+import requests
 import sys
 
 
 class Harvest(object):
     connection_factory = HarvestConnection
+    # Harvest allows 100 requests per 15 seconds; burst and refill together
+    # must stay within that window.
+    rate_limit = 80 / 15.0
+    rate_limit_burst = 20
 
     def __init__(
         self,
@@ -18,18 +31,66 @@ class Harvest(object):
         project_mapping={},
         task_mapping={},
         default_task=None,
+        rate_limiter=None,
     ):
         self.harvest = self.connection_factory(
             url, account_id=account_id, personal_token=personal_token
         )
+        if rate_limiter is None:
+            rate_limiter = RateLimiter(self.rate_limit, burst=self.rate_limit_burst)
+        self.rate_limiter = rate_limiter
         self.project_mapping = project_mapping
         self.task_mapping = task_mapping
+        self._task_matcher = None
+        self._task_matcher_for = None
+        self._guessed_tasks = {}
         self._projects = []
         self._issue_to_project = {}
         self.project_history_file = os.path.join(
             get_data_home(), "octodon-projects.pickle"
         )
         self.default_task = default_task
+        self._account_requests(account_id, personal_token)
+
+    def _account_requests(self, account_id, personal_token):
+        """Send the requests of the harvest connection through a session.
+
+        The harvest library calls ``requests.request`` for every request, so
+        its ``_request`` is replaced by one that uses a session with the
+        timings and rate limiter hooks, like the other backends. Responses
+        rejected with 429 or 503 are sent again once Retry-After allows it.
+        """
+        if getattr(self.harvest, "_request", None) is None:
+            return
+        self.session = requests.Session()
+        self.session.headers.update(
+            {
+                "Content-Type": "application/json",
+                "Accept": "application/json",
+                "Authorization": "Bearer {0}".format(personal_token),
+                "Harvest-Account-Id": str(account_id),
+            }
+        )
+        timings.install(self.session, "harvest")
+        self.rate_limiter.install(self.session)
+
+        def request(method="GET", path="/", data=None):
+            try:
+                response = self.session.request(
+                    method,
+                    self.harvest.uri + path,
+                    data=None if data is None else json.dumps(data),
+                )
+            except requests.RequestException as e:
+                raise HarvestError(e)
+            if method == "DELETE":
+                return response
+            try:
+                return response.json(object_pairs_hook=OrderedDict)
+            except ValueError:
+                return response
+
+        self.harvest._request = request
 
     def get_issue(self, issue_id):
         raise NotFound()
@@ -38,10 +99,14 @@ class Harvest(object):
         projects_lookup = dict(
             [(project["code"], project) for project in self.projects]
         )
+        tasks_lookup = dict([(task["name"], task) for task in self.tasks])
+        results = []
         for entry in bookings:
-            project = projects_lookup[entry["project"]]
-            project_id = project and project["id"] or -1
-            tasks_lookup = dict([(task["name"], task) for task in self.tasks])
+            project = projects_lookup.get(entry["project"])
+            if project is None:
+                results.append("unknown project {0}".format(entry["project"]))
+                continue
+            project_id = project["id"]
             task = tasks_lookup.get(entry["activity"])
             task_id = task and task["id"] or -1
 
@@ -50,34 +115,69 @@ class Harvest(object):
                 issue_desc = "[#{0}] {1}: ".format(
                     str(entry["issue_id"]), entry["issue_title"]
                 )
-            res = self.harvest._post(
-                "/time_entries",
-                {
-                    "notes": "{0}{1}".format(issue_desc, entry["comments"]),
-                    "project_id": project_id,
-                    "hours": str(entry["time"] / 60.0),
-                    "task_id": task_id,
-                    "spent_date": entry["spent_on"],
-                },
-            )
+            self.rate_limiter.acquire()
+            try:
+                res = self.harvest._post(
+                    "/time_entries",
+                    {
+                        "notes": "{0}{1}".format(issue_desc, entry["comments"]),
+                        "project_id": project_id,
+                        "hours": str(entry["time"] / 60.0),
+                        "task_id": task_id,
+                        "spent_date": entry["spent_on"],
+                    },
+                )
+            except HarvestError as e:
+                # keep the results of the entries booked so far
+                results.append(booking_error(e))
+                continue
+            if not isinstance(res, dict):
+                # the client returns the response if it isn't JSON
+                results.append(
+                    "Unexpected response: {0}".format(getattr(res, "status_code", res))
+                )
+                continue
             if "message" in res:
-                print(
-                    "{} ({}, {})".format(res["message"], project["name"], task["name"])
+                results.append(
+                    "{} ({}, {})".format(
+                        res["message"], project["name"], task and task["name"]
+                    )
                 )
+                continue
+            results.append(BOOKED)
 
             self.remember_project(entry["issue_id"], project["code"])
+        return results
 
     @property
     def activities(self):
         return self.tasks
 
+    def _get_collection(self, path, key):
+        """Fetch all pages of a collection."""
+        items = []
+        page = 1
+        while page:
+            self.rate_limiter.acquire()
+            harvest_data = self.harvest._get("{0}?page={1}".format(path, page))
+            if key not in harvest_data:
+                raise ValueError(harvest_data.get("message", "no " + key))
+            items.extend(harvest_data[key])
+            page = harvest_data.get("next_page")
+        return items
+
+    def prefetch(self):
+        """Load the projects and tasks, leaving failures to their first use."""
+        if not self._projects:
+            self._projects = self._get_collection("/projects", "projects")
+        if not hasattr(self, "_tasks"):
+            self._tasks = self._get_collection("/tasks", "tasks")
+
     @property
     def projects(self):
         if not self._projects:
-            harvest_data = {}
             try:
-                harvest_data = self.harvest.projects()
-                self._projects = harvest_data["projects"]
+                self._projects = self._get_collection("/projects", "projects")
             except Exception as e:
                 print(
                     "Could not get harvest projects: {0}: {1}".format(
@@ -85,18 +185,14 @@ class Harvest(object):
                     ),
                     file=sys.stderr,
                 )
-                if "message" in harvest_data:
-                    print(harvest_data["message"], file=sys.stderr)
                 self._projects = []
         return self._projects
 
     @property
     def tasks(self):
         if not hasattr(self, "_tasks"):
-            harvest_data = {}
             try:
-                harvest_data = self.harvest.tasks()
-                self._tasks = harvest_data["tasks"]
+                self._tasks = self._get_collection("/tasks", "tasks")
             except Exception as e:
                 print(
                     "Could not get harvest tasks: {0}: {1}".format(
@@ -104,8 +200,6 @@ class Harvest(object):
                     ),
                     file=sys.stderr,
                 )
-                if "message" in harvest_data:
-                    print(harvest_data["message"], file=sys.stderr)
                 self._tasks = []
         return self._tasks
 
@@ -158,10 +252,30 @@ class Harvest(object):
                 harvest_project = part_matches[0]
         return harvest_project
 
+    @property
+    def task_matcher(self):
+        """The task mapping's keywords compiled for matching, in their order.
+
+        Replacing the task mapping compiles it again and forgets the guesses.
+        """
+        if (
+            self._task_matcher is None
+            or self._task_matcher_for is not self.task_mapping
+        ):
+            self._task_matcher = KeywordMatcher(self.task_mapping)
+            self._task_matcher_for = self.task_mapping
+            self._guessed_tasks = {}
+        return self._task_matcher
+
     def guess_task(self, project=None, description=""):
-        task = self.default_task
-        for key, value in self.task_mapping.items():
-            if key.lower() in description.lower() or key.lower() in project.lower():
-                task = value
-                break
+        matcher = self.task_matcher
+        key = (project, description)
+        if key not in self._guessed_tasks:
+            index = matcher.first_match(description, project)
+            self._guessed_tasks[key] = (
+                None if index is None else self.task_mapping[matcher.keywords[index]]
+            )
+        task = self._guessed_tasks[key]
+        if task is None:
+            task = self.default_task
         return task
@@ -3,12 +3,18 @@ from datetime import datetime
 from jira import JIRA
 from jira import JIRAError
 
+
 # from octodon.exceptions import ConnectionError
 from octodon.exceptions import NotFound
 from octodon.issue import Issue
+from octodon.ratelimit import RateLimiter
+from octodon.timing import timings
+from octodon.utils import BOOKED
+from octodon.utils import booking_error
+from octodon.utils import SKIPPED
+from requests.exceptions import RequestException
 
 import re
-import sys
 
 
 class JiraIssue(Issue):
@@ -33,42 +39,110 @@ class JiraIssue(Issue):
 
 class Jira(object):
     ticket_pattern = re.compile("#?([A-Z]+-[0-9]+)")
+    # the only fields JiraIssue ever reads
+    issue_fields = ["summary", "issuetype", "project", "customfield_10902"]
+    # Jira returns at most 100 issues per search; the JQL is sent in the URL
+    max_search_results = 100
+    max_jql_length = 2000
+
+    rate_limit = 10.0
 
-    def __init__(self, url, user, password):
+    def __init__(self, url, user, password, rate_limiter=None):
         self.url = url
         self.user = user
         self.password = password
+        if rate_limiter is None:
+            rate_limiter = RateLimiter(self.rate_limit)
+        self.rate_limiter = rate_limiter
 
     @property
     def jira(self):
         conn = getattr(self, "_connection", None)
         if conn is None:
             self._connection = conn = JIRA(self.url, auth=(self.user, self.password))
+            # the accounting hook has to see a response before it is retried
+            timings.install(conn._session, "jira")
+            self.rate_limiter.install(conn._session)
         return conn
 
     def get_issue(self, issue_id):
         if not self.ticket_pattern.match(issue_id):
             return None
         try:
-            return JiraIssue(self.jira.issue(issue_id))
+            self.rate_limiter.acquire()
+            return JiraIssue(
+                self.jira.issue(issue_id, fields=",".join(self.issue_fields))
+            )
         except JIRAError as je:
             raise NotFound(status_code=je.status_code, text=je.text)
 
+    def _chunk_keys(self, keys):
+        chunk = []
+        length = 0
+        for key in keys:
+            if chunk and (
+                len(chunk) >= self.max_search_results
+                or length + len(key) + 2 > self.max_jql_length
+            ):
+                yield chunk
+                chunk = []
+                length = 0
+            chunk.append(key)
+            length += len(key) + 2
+        if chunk:
+            yield chunk
+
+    def get_issues(self, keys):
+        """Look up several issues at once.
+
+        Sends one ``key in (...)`` search per chunk of keys, restricted to the
+        fields JiraIssue needs. Returns a dict mapping each key that was found
+        to its JiraIssue. The search returns moved issues under their new key,
+        so the keys it didn't return are looked up one by one, which follows
+        the move.
+        """
+        keys = sorted(
+            set(
+                self.ticket_pattern.match(key).group(1)
+                for key in keys
+                if key and self.ticket_pattern.match(key)
+            )
+        )
+        issues = {}
+        for chunk in self._chunk_keys(keys):
+            jql = "key in ({0})".format(", ".join(chunk))
+            try:
+                self.rate_limiter.acquire()
+                # the server may return fewer issues per page than asked
+                # for; without a limit the client follows the pages
+                results = self.jira.search_issues(
+                    jql,
+                    maxResults=False,
+                    validate_query=False,
+                    fields=self.issue_fields,
+                )
+            except JIRAError as je:
+                raise NotFound(status_code=je.status_code, text=je.text)
+            for issue in results:
+                issues[issue.key] = JiraIssue(issue)
+        for key in keys:
+            if key not in issues:
+                try:
+                    issues[key] = self.get_issue(key)
+                except NotFound:
+                    pass
+        return issues
+
     def book_time(self, bookings):
+        results = []
         for entry in bookings:
-            if not self.ticket_pattern.match(entry["issue_id"]):
+            if not entry["issue_id"] or not self.ticket_pattern.match(
+                entry["issue_id"]
+            ):
+                results.append(SKIPPED)
                 continue
-            rm_entry = entry.copy()
-
-            rm_entry["hours"] = rm_entry["time"] / 60.0
-            del rm_entry["time"]
-
-            if "description" in rm_entry:
-                del rm_entry["description"]
-            if "activity" in rm_entry:
-                del rm_entry["activity"]
-
             try:
+                self.rate_limiter.acquire()
                 self.jira.add_worklog(
                     issue=entry["issue_id"],
                     timeSpent=entry["time"],
@@ -76,9 +150,11 @@ class Jira(object):
                     comment=entry["comments"],
                 )
             except JIRAError as je:
-                print(
-                    "{0}: {1} ({2})".format(
-                        je.status_code, je.text, rm_entry["comments"]
-                    ),
-                    file=sys.stderr,
-                )
+                results.append("{0}: {1}".format(je.status_code, je.text))
+                continue
+            except RequestException as e:
+                # keep the results of the entries booked so far
+                results.append(booking_error(e))
+                continue
+            results.append(BOOKED)
+        return results
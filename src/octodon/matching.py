@@ -0,0 +1,70 @@
+from collections import deque
+
+
+class KeywordMatcher(object):
+    """Find which of many keywords occur in a text in a single pass.
+
+    The keywords are compiled into an Aho-Corasick automaton. Matching is
+    case insensitive and returns the position of the first keyword in the
+    given order that occurs anywhere in the texts, so earlier keywords take
+    precedence like they would when testing them one after the other.
+    """
+
+    def __init__(self, keywords):
+        self.keywords = list(keywords)
+        # each state has its transitions, a failure link and the smallest
+        # index of a keyword ending in it or in a state its failure links
+        # lead to
+        self.goto = [{}]
+        self.fail = [0]
+        self.best = [None]
+        for index, keyword in enumerate(self.keywords):
+            state = 0
+            for char in keyword.lower():
+                next_state = self.goto[state].get(char)
+                if next_state is None:
+                    next_state = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.best.append(None)
+                    self.goto[state][char] = next_state
+                state = next_state
+            if self.best[state] is None:
+                self.best[state] = index
+        self._link()
+
+    def _link(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self.goto[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback and char not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.goto[fallback].get(char, 0)
+                inherited = self.best[self.fail[next_state]]
+                if inherited is not None and (
+                    self.best[next_state] is None or inherited < self.best[next_state]
+                ):
+                    self.best[next_state] = inherited
+
+    def first_match(self, *texts):
+        """Return the index of the first keyword found in texts, or None."""
+        goto = self.goto
+        fail = self.fail
+        best_of = self.best
+        # an empty keyword matches any text
+        best = best_of[0]
+        for text in texts:
+            state = 0
+            for char in (text or "").lower():
+                while state and char not in goto[state]:
+                    state = fail[state]
+                state = goto[state].get(char, 0)
+                found = best_of[state]
+                if found is not None and (best is None or found < best):
+                    if found == 0:
+                        return found
+                    best = found
+        return best
@@ -0,0 +1,157 @@
+from email.utils import parsedate_to_datetime
+from threading import Lock
+
+import time
+
+
+RETRY_STATUS_CODES = (429, 503)
+
+
+def parse_retry_after(value, now=None):
+    """Return the number of seconds a Retry-After header asks us to wait.
+
+    The header may hold either a delay in seconds or an HTTP date.
+    """
+    if value is None:
+        return None
+    value = value.strip()
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if now is None:
+        now = time.time()
+    return max(retry_at.timestamp() - now, 0.0)
+
+
+def parse_rate_limit_reset(headers, now=None):
+    """Return the seconds until an exhausted rate limit window resets.
+
+    Understands the ``X-RateLimit-*`` headers used by GitHub (reset as an
+    epoch timestamp) as well as the ``RateLimit-*`` draft headers (reset as a
+    delay in seconds). Returns None as long as there are requests left.
+    """
+    for prefix in ("X-RateLimit-", "RateLimit-"):
+        remaining = headers.get(prefix + "Remaining")
+        reset = headers.get(prefix + "Reset")
+        if remaining is None or reset is None:
+            continue
+        try:
+            if int(float(remaining)) > 0:
+                return None
+            reset = float(reset)
+        except ValueError:
+            return parse_retry_after(reset, now=now)
+        if now is None:
+            now = time.time()
+        # Anything larger than a day can only be an absolute timestamp
+        if reset > 86400:
+            return max(reset - now, 0.0)
+        return max(reset, 0.0)
+    return None
+
+
+class RateLimiter(object):
+    """Token bucket shared by all requests to one backend.
+
+    ``rate`` is the number of requests per second that may be sent on
+    average, ``burst`` the number of requests that may be sent at once after
+    an idle period. The limiter is thread safe, so concurrent code paths
+    using the same backend are throttled together.
+    """
+
+    def __init__(
+        self, rate, burst=None, max_retries=3, clock=time.monotonic, sleep=time.sleep
+    ):
+        self.rate = float(rate)
+        self.burst = float(burst or max(self.rate, 1.0))
+        self.max_retries = max_retries
+        self.clock = clock
+        self.sleep = sleep
+        self._tokens = self.burst
+        self._updated = clock()
+        self._blocked_until = 0.0
+        self._lock = Lock()
+
+    def _reserve(self):
+        """Take a token and return how long the caller has to wait for it."""
+        with self._lock:
+            now = self.clock()
+            if self.rate > 0:
+                self._tokens = min(
+                    self.burst, self._tokens + (now - self._updated) * self.rate
+                )
+            self._updated = now
+            self._tokens -= 1.0
+            wait = 0.0
+            if self._tokens < 0 and self.rate > 0:
+                wait = -self._tokens / self.rate
+            return max(wait, self._blocked_until - now)
+
+    def acquire(self):
+        """Block until the next request may be sent."""
+        wait = self._reserve()
+        if wait > 0:
+            self.sleep(wait)
+
+    def defer(self, seconds):
+        """Hold back every request for the next ``seconds`` seconds."""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, self.clock() + seconds)
+            self._tokens = min(self._tokens, 0.0)
+
+    def update(self, status_code, headers):
+        """Adjust the bucket to the rate limit information of a response.
+
+        Returns the number of seconds that were imposed by the server, or
+        None if the response carried no such instruction.
+        """
+        delay = None
+        if status_code in RETRY_STATUS_CODES:
+            delay = parse_retry_after(headers.get("Retry-After"))
+        if delay is None:
+            delay = parse_rate_limit_reset(headers)
+        if delay is None and status_code == 429:
+            delay = 1.0 / self.rate if self.rate > 0 else 1.0
+        if delay is not None:
+            self.defer(delay)
+        return delay
+
+    def install(self, session):
+        """Make a requests session honour the server's rate limit headers.
+
+        Responses that were rejected with 429 or 503 are sent again once the
+        server allows it, up to ``max_retries`` times.
+        """
+
+        def throttle(response, *args, **kwargs):
+            delay = self.update(response.status_code, response.headers)
+            if response.status_code not in RETRY_STATUS_CODES or delay is None:
+                return response
+            request = response.request
+            attempt = getattr(request, "octodon_attempt", 0)
+            if attempt >= self.max_retries:
+                return response
+            request.octodon_attempt = attempt + 1
+            self.acquire()
+            return session.send(request, **kwargs)
+
+        session.hooks.setdefault("response", []).append(throttle)
+        return session
+
+
+def get_rate_limiter(config, section, rate, burst=None):
+    """Create the rate limiter for a backend section of the configuration.
+
+    ``rate`` and ``burst`` are the backend's defaults, which can be
+    overridden with the ``rate_limit`` and ``rate_limit_burst`` options.
+    """
+    if config.has_option(section, "rate_limit"):
+        rate = config.getfloat(section, "rate_limit")
+    if config.has_option(section, "rate_limit_burst"):
+        burst = config.getfloat(section, "rate_limit_burst")
+    return RateLimiter(rate, burst=burst)
@@ -1,17 +1,77 @@
 from octodon.exceptions import NotFound
 from octodon.issue import Issue
+from octodon.ratelimit import RateLimiter
+from octodon.timing import timings
+from octodon.utils import BOOKED
+from octodon.utils import booking_error
+from octodon.utils import get_cache_file
 from octodon.utils import get_default_activity
+from octodon.utils import read_cache
+from octodon.utils import SKIPPED
+from octodon.utils import write_cache
 from pyactiveresource import connection
 from pyactiveresource.activeresource import ActiveResource
+from requests.adapters import HTTPAdapter
 
 import re
+import requests
 import sys
 
 
+class PooledResponse(object):
+    """A requests response in the shape of the urllib response that
+    pyactiveresource expects.
+    """
+
+    def __init__(self, response):
+        self.code = response.status_code
+        self.msg = response.reason
+        self.headers = response.headers
+        self.url = response.url
+        self.body = response.content
+
+    def read(self):
+        return self.body
+
+    def close(self):
+        pass
+
+
+class PooledConnection(connection.Connection):
+    """pyactiveresource connection that keeps its HTTP connections alive.
+
+    Requests go through a requests session, so the TCP and TLS handshakes
+    are only paid once per pooled connection instead of once per request.
+    """
+
+    def __init__(self, site, user=None, password=None, timeout=None, pool_size=4):
+        super(PooledConnection, self).__init__(
+            site, user=user, password=password, timeout=timeout
+        )
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def _urlopen(self, request):
+        try:
+            response = self.session.request(
+                request.get_method(),
+                request.full_url,
+                headers=dict(request.header_items()),
+                data=request.data,
+                timeout=self.timeout,
+                allow_redirects=False,
+            )
+        except requests.RequestException as err:
+            raise connection.Error(err, request.full_url)
+        return PooledResponse(response)
+
+
 class RedmineIssue(Issue):
-    def __init__(self, issue, Projects=None):
+    def __init__(self, issue, redmine=None):
         self.issue = issue
-        self.Projects = Projects
+        self.redmine = redmine
 
     def get_tracker(self):
         return self.issue["tracker"]["name"]
@@ -21,7 +81,7 @@ class RedmineIssue(Issue):
 
     def get_project(self):
         project_id = self.issue["project"]["id"]
-        return self.Projects.get(project_id, {}).get("identifier")
+        return self.redmine.get_project_identifier(project_id)
 
     def get_contracts(self):
         return (
@@ -33,13 +93,45 @@ class RedmineIssue(Issue):
 
 class Redmine(object):
     ticket_pattern = re.compile("#?([0-9]+)")
+    # Redmine caps the page size of collection requests at 100
+    page_size = 100
+
+    rate_limit = 10.0
+
+    def __init__(
+        self,
+        url,
+        user,
+        password,
+        rate_limiter=None,
+        cache_ttl=86400,
+        pool_size=4,
+        timeout=30,
+    ):
+        if rate_limiter is None:
+            rate_limiter = RateLimiter(self.rate_limit)
+        self.rate_limiter = rate_limiter
+        self.cache_ttl = cache_ttl
+        self.projects_cache_file = get_cache_file("octodon-redmine-projects", url)
+        self.activities_cache_file = get_cache_file("octodon-redmine-activities", url)
+        self._projects = None
+        self._projects_loaded = False
+        self._activities = None
+
+        self.connection = PooledConnection(
+            url, user=user, password=password, timeout=timeout, pool_size=pool_size
+        )
+        timings.install(self.connection.session, "redmine")
+        self.rate_limiter.install(self.connection.session)
 
-    def __init__(self, url, user, password):
         class RedmineResource(ActiveResource):
             _site = url
             _user = user
             _password = password
 
+        # set after the class is created, the metaclass resets it otherwise
+        RedmineResource._connection = self.connection
+
         class TimeEntry(RedmineResource):
             pass
 
@@ -57,32 +149,125 @@ class Redmine(object):
         self.Issue = Issue
         self.Projects = Projects
 
-        try:
-            self.activities = self.Enumerations.get("time_entry_activities")
-        except connection.Error:
-            print("Could not get redmine activities: Connection error", file=sys.stderr)
-            self.activities = []
+    @property
+    def activities(self):
+        """The time entry activities, cached on disk like the projects."""
+        if self._activities is None and self.activities_cache_file:
+            self._activities = read_cache(self.activities_cache_file, self.cache_ttl)
+        if self._activities is None:
+            try:
+                self.rate_limiter.acquire()
+                self._activities = self.Enumerations.get("time_entry_activities")
+            except connection.Error:
+                print(
+                    "Could not get redmine activities: Connection error",
+                    file=sys.stderr,
+                )
+                self._activities = []
+            else:
+                if self.activities_cache_file:
+                    write_cache(self.activities_cache_file, self._activities)
+        return self._activities
+
+    @property
+    def projects(self):
+        """Map of project ids to project identifiers.
+
+        The catalog is cached on disk and reloaded once it is older than
+        ``cache_ttl`` seconds.
+        """
+        if self._projects is None and self.projects_cache_file:
+            self._projects = read_cache(self.projects_cache_file, self.cache_ttl)
+        if self._projects is None:
+            self._projects = self.load_projects()
+        return self._projects
+
+    def expire(self):
+        """Drop the catalogs kept in memory, so the cache files are read again.
+
+        Catalogs whose cache file expired or couldn't be written are fetched
+        from the server on their next use.
+        """
+        self._projects = None
+        self._projects_loaded = False
+        self._activities = None
+
+    def load_projects(self):
+        """Fetch the project catalog from the server and cache it."""
+        projects = dict(
+            (project["id"], project["identifier"])
+            for project in self._get_collection(self.Projects, "projects")
+        )
+        self._projects_loaded = True
+        if self.projects_cache_file:
+            write_cache(self.projects_cache_file, projects)
+        return projects
+
+    def get_project_identifier(self, project_id):
+        if project_id not in self.projects and not self._projects_loaded:
+            # the project may be newer than the cached catalog
+            self._projects = self.load_projects()
+        return self.projects.get(project_id)
 
     def get_issue(self, issue_id):
         try:
-            return RedmineIssue(self.Issue.get(int(issue_id)), Projects=self.Projects)
+            self.rate_limiter.acquire()
+            return RedmineIssue(self.Issue.get(int(issue_id)), redmine=self)
         except (connection.ResourceNotFound, connection.Error):
             raise NotFound()
 
+    def _get_collection(self, resource, key, **query):
+        """Iterate over all items of a paginated collection."""
+        offset = 0
+        while True:
+            query.update(offset=offset, limit=self.page_size)
+            path = resource._collection_path(None, query)
+            self.rate_limiter.acquire()
+            data = resource.connection.get_formatted(path, resource.headers)
+            items = data.get(key) or []
+            for item in items:
+                yield item
+            offset += len(items)
+            if not items or offset >= int(data.get("total_count", 0)):
+                break
+
+    def get_issues(self, issue_ids):
+        """Look up several issues with one request per page of ids.
+
+        Returns a dict mapping each id that was found to its RedmineIssue.
+        """
+        ids = sorted(
+            set(
+                issue_id.lstrip("#")
+                for issue_id in issue_ids
+                if issue_id and issue_id.lstrip("#").isdigit()
+            ),
+            key=int,
+        )
+        issues = {}
+        for i in range(0, len(ids), self.page_size):
+            chunk = ids[i : i + self.page_size]
+            try:
+                for issue in self._get_collection(
+                    self.Issue, "issues", issue_id=",".join(chunk), status_id="*"
+                ):
+                    issues[str(issue["id"])] = RedmineIssue(issue, redmine=self)
+            except (connection.ResourceNotFound, connection.Error):
+                raise NotFound()
+        return issues
+
     def book_time(self, bookings):
         default_activity = get_default_activity(self.activities)
+        activities_dict = dict([(act["name"], act) for act in self.activities])
+        results = []
         for entry in bookings:
-            if not self.ticket_pattern.match(entry["issue_id"]):
-                continue
-            if entry["issue_id"] is None:
-                print(
-                    "No valid issue id, skipping entry (%s)" % entry["description"],
-                    file=sys.stderr,
-                )
+            if not entry["issue_id"] or not self.ticket_pattern.match(
+                entry["issue_id"]
+            ):
+                results.append(SKIPPED)
                 continue
             rm_entry = entry.copy()
 
-            activities_dict = dict([(act["name"], act) for act in self.activities])
             act = activities_dict.get(entry["activity"])
             rm_entry["activity_id"] = act and act["id"] or default_activity["id"]
             rm_entry["hours"] = rm_entry["time"] / 60.0
@@ -94,12 +279,20 @@ class Redmine(object):
                 del rm_entry["activity"]
 
             rm_time_entry = self.TimeEntry(rm_entry)
-            success = rm_time_entry.save()
+            self.rate_limiter.acquire()
+            try:
+                success = rm_time_entry.save()
+            except connection.Error as e:
+                # keep the results of the entries booked so far
+                results.append(booking_error(e))
+                continue
             if not success:
-                for field, msgs in rm_time_entry.errors.errors.items():
-                    print(
-                        "{0}: {1} ({2})".format(
-                            field, ",".join(msgs), rm_entry["comments"]
-                        ),
-                        file=sys.stderr,
+                results.append(
+                    "; ".join(
+                        "{0}: {1}".format(field, ",".join(msgs))
+                        for field, msgs in rm_time_entry.errors.errors.items()
                     )
+                )
+                continue
+            results.append(BOOKED)
+        return results
@@ -0,0 +1,213 @@
+from concurrent.futures import ProcessPoolExecutor
+from octodon.cli import get_config
+from octodon.cli import Octodon
+from octodon.timing import timings
+from octodon.tracking import Tracking
+from octodon.utils import format_spent_time
+from octodon.utils import get_time_sum
+from octodon.utils import make_table
+
+import os
+import sys
+import threading
+
+
+def read_member_timeinfo(config_file, start, end, ticket_patterns, activities):
+    """Read a member's time log and repositories, in a worker process.
+
+    The ticket patterns and activities come from the parent, so no tracker
+    is contacted here.
+    """
+    octodon = Octodon(
+        get_config(config_file, user_config=False), start, new_session=True
+    )
+    octodon._ticket_patterns = ticket_patterns
+    octodon._activities = activities
+    return octodon.read_timeinfo_range(start, end)
+
+
+class TeamMember(object):
+    def __init__(self, config_file, start):
+        self.config_file = config_file
+        self.config = get_config(config_file, user_config=False)
+        self.name = self.config.get(
+            "main",
+            "name",
+            fallback=os.path.splitext(os.path.basename(config_file))[0],
+        )
+        self.octodon = Octodon(self.config, start, new_session=True)
+        self.days = {}
+
+
+class SharedCatalogs(object):
+    """The trackers and catalogs of the team, set up once per server.
+
+    Members whose configuration points to the same server with the same
+    account share one tracker, and the issues looked up are cached for the
+    whole team. Each member keeps their own harvest, as the project and task
+    mappings are personal, but the harvest projects and tasks are only
+    fetched once per account.
+    """
+
+    tracker_options = {
+        "jira": ["url", "user"],
+        "redmine": ["url", "user"],
+        "github": ["url", "organization", "project_num", "token", "token_command"],
+    }
+
+    def __init__(self):
+        self.trackers = {}
+        self.harvests = {}
+        self.tracking = Tracking()
+
+    def setup(self, octodon):
+        """Let octodon use the shared trackers and catalogs."""
+        config = octodon.config
+        for name, options in self.tracker_options.items():
+            if not config.has_section(name):
+                continue
+            key = (name,) + tuple(
+                config.get(name, option, fallback="") for option in options
+            )
+            if key not in self.trackers:
+                self.trackers[key] = getattr(octodon, name)
+            setattr(octodon, "_" + name, self.trackers[key])
+
+        harvest = octodon.harvest
+        if harvest is not None:
+            key = (config.get("harvest", "url"), config.get("harvest", "account_id"))
+            source = self.harvests.setdefault(key, harvest)
+            if source is not harvest:
+                # the tasks are needed right away for the activities
+                harvest._tasks = source.tasks
+
+        tracking = octodon.tracking
+        tracking._issues = self.tracking._issues
+        tracking._prefetched = self.tracking._prefetched
+        tracking._lock = self.tracking._lock
+
+    def share_harvest_projects(self, octodon):
+        harvest = octodon.harvest
+        if harvest is None:
+            return
+        config = octodon.config
+        source = self.harvests[
+            (config.get("harvest", "url"), config.get("harvest", "account_id"))
+        ]
+        if source is not harvest:
+            harvest._projects = source.projects
+
+    def prefetch(self, issue_ids):
+        """Look up the issues of all members with one batch per tracker."""
+        self.tracking.trackers = list(filter(None, self.trackers.values()))
+        self.tracking.prefetch(issue_ids)
+
+
+def run_team(config_files, start, end, processes=None):
+    """Collect the bookings of [start, end) for each member of the team.
+
+    The time logs and repositories are read in parallel worker processes,
+    while the parent sets up the trackers and fetches the shared catalogs.
+    Returns the members with their bookings by day.
+    """
+    catalogs = SharedCatalogs()
+    with timings.span("setup"):
+        members = [TeamMember(config_file, start) for config_file in config_files]
+        for member in members:
+            catalogs.setup(member.octodon)
+
+    with timings.span("time logs"), ProcessPoolExecutor(
+        max_workers=processes or min(len(members), os.cpu_count() or 1)
+    ) as executor:
+        futures = [
+            executor.submit(
+                read_member_timeinfo,
+                member.config_file,
+                start,
+                end,
+                member.octodon.ticket_patterns,
+                member.octodon.activities,
+            )
+            for member in members
+        ]
+        # meanwhile fetch the harvest projects, which are only needed later;
+        # the workers are started by now, so they aren't forked mid request
+        harvests = list(catalogs.harvests.values())
+        warm_up = threading.Thread(
+            target=lambda: [harvest.projects for harvest in harvests], daemon=True
+        )
+        warm_up.start()
+        for member, future in zip(members, futures):
+            try:
+                member.days = future.result()
+            except Exception as e:
+                print(
+                    "Could not read the time log of {0}: {1}: {2}".format(
+                        member.name, e.__class__.__name__, e
+                    ),
+                    file=sys.stderr,
+                )
+    warm_up.join()
+
+    with timings.span("issues"):
+        catalogs.prefetch(
+            entry["issue_id"]
+            for member in members
+            for bookings in member.days.values()
+            for entry in bookings
+        )
+    with timings.span("booking targets"):
+        for member in members:
+            catalogs.share_harvest_projects(member.octodon)
+            member.days = member.octodon.enrich_timeinfo(member.days)
+    return members
+
+
+def format_team_report(members):
+    """Return a summary per member and one per project for the whole team."""
+    rows = []
+    projects = {}
+    team_bookings = []
+    for member in members:
+        bookings = [entry for day in member.days.values() for entry in day]
+        team_bookings.extend(bookings)
+        rows.append(
+            [
+                member.name,
+                str(len([day for day in member.days.values() if day])),
+                str(len(bookings)),
+                str(len([entry for entry in bookings if not entry["issue_id"]])),
+                format_spent_time(get_time_sum(bookings)),
+            ]
+        )
+        for entry in bookings:
+            project = projects.setdefault(
+                entry["project"] or "-", {"members": set(), "bookings": []}
+            )
+            project["members"].add(member.name)
+            project["bookings"].append(entry)
+    rows.append(
+        [
+            "Team",
+            "",
+            str(len(team_bookings)),
+            str(len([entry for entry in team_bookings if not entry["issue_id"]])),
+            format_spent_time(get_time_sum(team_bookings)),
+        ]
+    )
+    members_table = make_table(
+        rows, header=["Member", "Days", "Entries", "No issue", "Time"]
+    )
+    project_rows = [
+        [
+            name,
+            str(len(project["members"])),
+            str(len(project["bookings"])),
+            format_spent_time(get_time_sum(project["bookings"])),
+        ]
+        for name, project in sorted(projects.items())
+    ]
+    projects_table = make_table(
+        project_rows, header=["Project", "Members", "Entries", "Time"]
+    )
+    return members_table + "\n" + projects_table
@@ -0,0 +1,132 @@
+from octodon.exceptions import NotFound
+from octodon.harvest import Harvest
+from octodon.redmine import Redmine
+from octodon.redmine import RedmineIssue
+
+
+class MockHarvestConnection(object):
+    def __init__(self, target):
+        self.target = target
+
+    def add(self, entry):
+        self.target.entries.append(entry)
+
+    def _post(self, url, data, *args, **kwargs):
+        self.target.entries.append(data)
+        return {}
+
+
+class MockHarvest(Harvest):
+    def __init__(self, *args, **kwargs):
+        self.entries = []
+        super(MockHarvest, self).__init__(None, None, None, *args, **kwargs)
+
+    def connection_factory(self, *args, **kwargs):
+        return MockHarvestConnection(self)
+
+    @property
+    def projects(self):
+        return self.get_day()["projects"]
+
+    @property
+    def tasks(self):
+        return [
+            {"billable": False, "id": 3982276, "name": "Admin/Orga"},
+            {"billable": True, "id": 3982288, "name": "Development"},
+        ]
+
+    def get_day(self):
+        return {
+            "day_entries": [],
+            "for_day": "2012-01-01",
+            "projects": [
+                {
+                    "billable": True,
+                    "client": "Cynaptic AG",
+                    "client_currency": "Euro - EUR",
+                    "client_currency_symbol": "\u20ac",
+                    "client_id": 3317082,
+                    "code": "cynaptic_3000",
+                    "id": 7585112,
+                    "name": "Cynaptic 3000",
+                    "tasks": [
+                        {"billable": False, "id": 3982276, "name": "Admin/Orga"},
+                        {"billable": True, "id": 3982288, "name": "Development"},
+                    ],
+                },
+                {
+                    "billable": True,
+                    "client": "RRZZAA",
+                    "client_currency": "Euro - EUR",
+                    "client_currency_symbol": "\u20ac",
+                    "client_id": 3317083,
+                    "code": "rrzzaa",
+                    "id": 7585113,
+                    "name": "RRZZAA",
+                    "tasks": [
+                        {"billable": False, "id": 3982276, "name": "Admin/Orga"},
+                        {"billable": True, "id": 3982288, "name": "Development"},
+                    ],
+                },
+            ],
+        }
+
+
+class MockRedmine(Redmine):
+    Projects = {
+        "22": {"id": "22", "name": "Cynaptic", "identifier": "cynaptic_3000"},
+        "23": {"id": "23", "name": "RRZZAA", "identifier": "rrzzaa"},
+    }
+
+    def __init__(self, *args):
+        self.requests = []
+        self.project_requests = 0
+        self.projects_cache_file = None
+        self.activities_cache_file = None
+        self.cache_ttl = None
+        self._projects = None
+        self._projects_loaded = False
+        self._activities = None
+
+    def _get_collection(self, resource, key, **query):
+        self.project_requests += 1
+        return self.Projects.values()
+
+    def get_issues(self, issue_ids):
+        self.requests.append(list(issue_ids))
+        issues = {}
+        for issue_id in issue_ids:
+            try:
+                issues[issue_id] = self._get_issue(issue_id)
+            except NotFound:
+                pass
+        return issues
+
+    def get_issue(self, issue):
+        self.requests.append(issue)
+        return self._get_issue(issue)
+
+    def _get_issue(self, issue):
+        issues = {
+            "12345": {
+                "project": MockRedmine.Projects["22"],
+                "tracker": {"id": "3", "name": "Support"},
+                "subject": "Create user list",
+                "custom_fields": {},
+            },
+            "12346": {
+                "project": MockRedmine.Projects["23"],
+                "tracker": {"id": "2", "name": "Feature"},
+                "subject": "External API improvement",
+                "custom_fields": {},
+            },
+            "12347": {
+                "project": {"id": "24", "name": "Frolick"},
+                "tracker": {"id": "1", "name": "Support"},
+                "subject": "Strategy Meeting",
+                "custom_fields": {},
+            },
+        }
+        if issue not in issues:
+            raise NotFound()
+        return RedmineIssue(issues[issue], redmine=self)
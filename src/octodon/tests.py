@@ -1,24 +1,73 @@
+from configparser import ConfigParser
+from contextlib import redirect_stderr
+from contextlib import redirect_stdout
 from datetime import date
 from datetime import datetime
+from github3api.githubapi import GraphqlError
+from harvest import HarvestError
+from http.server import BaseHTTPRequestHandler
+from jira import JIRAError
+from http.server import ThreadingHTTPServer
+from io import BytesIO
+from io import StringIO
+from octodon.benchmark import baseline_mismatches
+from octodon.benchmark import compare_results
+from octodon.benchmark import format_results
+from octodon.benchmark import run_benchmarks
+from octodon.cli import Octodon
+from octodon.cli import run_in_daemon
 from octodon.clockwork import ClockWorkTimeLog
+from octodon.daemon import OctodonDaemon
+from octodon.daemon import request
+from octodon.exceptions import DaemonError
+from octodon.exceptions import DaemonUnavailable
 from octodon.exceptions import NotFound
+from octodon.fakeserver import FakeData
+from octodon.fakeserver import FakeTrackerServer
 from octodon.github import Github
 from octodon.harvest import Harvest
 from octodon.jira import Jira
+from octodon.matching import KeywordMatcher
+from octodon.ratelimit import parse_rate_limit_reset
+from octodon.ratelimit import parse_retry_after
+from octodon.ratelimit import RateLimiter
 from octodon.redmine import Redmine
-from octodon.redmine import RedmineIssue
+from octodon.team import format_team_report
+from octodon.team import run_team
+from octodon.team import SharedCatalogs
+from octodon.team import TeamMember
+from octodon.testing import MockHarvest
+from octodon.testing import MockRedmine
+from octodon.timing import get_endpoint
+from octodon.timing import Timings
+from octodon.tracking import SessionPrefetcher
 from octodon.tracking import Tracking
+from octodon.utils import BOOKED
 from octodon.utils import clean_up_bookings
 from octodon.utils import format_spent_time
 from octodon.utils import read_from_file
+from octodon.utils import write_cache
 from octodon.utils import write_to_file
+from octodon.version_control import find_repos
+from octodon.version_control import GitLog
+from octodon.version_control import SvnLog
+from octodon.version_control import WindowedLogInfo
 from octodon.version_control import VCSLog
+from pyactiveresource import connection
 from tempfile import mkdtemp
 from tempfile import mkstemp
+from unittest.mock import Mock
 from unittest.mock import patch
 
+import json
 import os
+import random
 import re
+import shutil
+import subprocess
+import sys
+import threading
+import time
 import unittest
 
 
@@ -27,112 +76,57 @@ CACHEFILE = os.path.join(
 )
 
 
-class MockHarvestConnection(object):
-    def __init__(self, target):
-        self.target = target
-
-    def add(self, entry):
-        self.target.entries.append(entry)
-
-    def _post(self, url, data, *args, **kwargs):
-        self.target.entries.append(data)
-        return {}
-
-
-class MockHarvest(Harvest):
-    def __init__(self, *args, **kwargs):
-        self.entries = []
-        super(MockHarvest, self).__init__(None, None, None, *args, **kwargs)
-
-    def connection_factory(self, *args, **kwargs):
-        return MockHarvestConnection(self)
-
-    @property
-    def projects(self):
-        return self.get_day()["projects"]
-
-    @property
-    def tasks(self):
-        return [
-            {"billable": False, "id": 3982276, "name": "Admin/Orga"},
-            {"billable": True, "id": 3982288, "name": "Development"},
-        ]
-
-    def get_day(self):
-        return {
-            "day_entries": [],
-            "for_day": "2012-01-01",
-            "projects": [
-                {
-                    "billable": True,
-                    "client": "Cynaptic AG",
-                    "client_currency": "Euro - EUR",
-                    "client_currency_symbol": "\u20ac",
-                    "client_id": 3317082,
-                    "code": "cynaptic_3000",
-                    "id": 7585112,
-                    "name": "Cynaptic 3000",
-                    "tasks": [
-                        {"billable": False, "id": 3982276, "name": "Admin/Orga"},
-                        {"billable": True, "id": 3982288, "name": "Development"},
-                    ],
-                },
-                {
-                    "billable": True,
-                    "client": "RRZZAA",
-                    "client_currency": "Euro - EUR",
-                    "client_currency_symbol": "\u20ac",
-                    "client_id": 3317083,
-                    "code": "rrzzaa",
-                    "id": 7585113,
-                    "name": "RRZZAA",
-                    "tasks": [
-                        {"billable": False, "id": 3982276, "name": "Admin/Orga"},
-                        {"billable": True, "id": 3982288, "name": "Development"},
-                    ],
-                },
-            ],
-        }
-
-
-class MockRedmine(Redmine):
-    Projects = {
-        "22": {"id": "22", "name": "Cynaptic", "identifier": "cynaptic_3000"},
-        "23": {"id": "23", "name": "RRZZAA", "identifier": "rrzzaa"},
-    }
-
+class MockJira(Jira):
     def __init__(self, *args):
         pass
 
-    def get_issue(self, issue):
-        issues = {
-            "12345": {
-                "project": MockRedmine.Projects["22"],
-                "tracker": {"id": "3", "name": "Support"},
-                "subject": "Create user list",
-                "custom_fields": {},
-            },
-            "12346": {
-                "project": MockRedmine.Projects["23"],
-                "tracker": {"id": "2", "name": "Feature"},
-                "subject": "External API improvement",
-                "custom_fields": {},
-            },
-            "12347": {
-                "project": {"id": "24", "name": "Frolick"},
-                "tracker": {"id": "1", "name": "Support"},
-                "subject": "Strategy Meeting",
-                "custom_fields": {},
-            },
-        }
-        if issue not in issues:
-            raise NotFound()
-        return RedmineIssue(issues[issue], Projects=self.Projects)
 
-
-class MockJira(Jira):
-    def __init__(self, *args):
-        pass
+class MockJiraConnection(object):
+    def __init__(self, issues, page_size=None, moved={}):
+        self.issues = issues
+        self.searches = []
+        self.lookups = []
+        self.worklogs = []
+        # like a server capping the page size; only a search without a limit
+        # follows the pages
+        self.page_size = page_size
+        # old keys of issues moved to another project
+        self.moved = moved
+
+    def issue(self, key, fields="*all"):
+        self.lookups.append(key)
+        key = self.moved.get(key, key)
+        if key not in self.issues:
+            raise JIRAError(status_code=404, text="Issue Does Not Exist")
+        return self.issues[key]
+
+    def search_issues(self, jql, maxResults=50, validate_query=True, fields="*all"):
+        self.searches.append((jql, fields))
+        keys = re.match(r"key in \((.*)\)", jql).group(1).split(", ")
+        keys = [self.moved.get(key, key) for key in keys]
+        issues = [self.issues[key] for key in keys if key in self.issues]
+        if maxResults is False:
+            return issues
+        return issues[: min(maxResults, self.page_size or maxResults)]
+
+    def add_worklog(self, **kwargs):
+        self.worklogs.append(kwargs)
+
+
+def make_jira_issue(key, summary, project):
+    class Resource(object):
+        def __init__(self, **kwargs):
+            self.__dict__.update(kwargs)
+
+    return Resource(
+        key=key,
+        fields=Resource(
+            summary=summary,
+            issuetype=Resource(name="Task"),
+            project=Resource(key=project),
+            customfield_10902=None,
+        ),
+    )
 
 
 class TestOctodon(unittest.TestCase):
@@ -177,6 +171,61 @@ class TestOctodon(unittest.TestCase):
         self.assertEqual(harvest.entries[0]["task_id"], 3982288)
         self.assertEqual(harvest.entries[0]["project_id"], 7585112)
 
+    def test_book_harvest_partial_failure(self):
+        harvest = MockHarvest()
+        Tracking(
+            trackers=[MockRedmine()], harvest=harvest, project_history_file=CACHEFILE
+        )
+        posted = []
+
+        def post(url, data):
+            if posted:
+                raise HarvestError("Connection reset")
+            posted.append(data)
+            return {}
+
+        booking = {
+            "project": "cynaptic_3000",
+            "activity": "Development",
+            "comments": "Extended API",
+            "time": 345.0,
+            "spent_on": "2012-01-01",
+            "issue_id": "12345",
+            "issue_title": "ReST API",
+        }
+        with patch.object(harvest.harvest, "_post", side_effect=post):
+            results = harvest.book_time([booking, booking])
+        self.assertEqual(results[0], BOOKED)
+        self.assertEqual(
+            results[1], "Error while booking - HarvestError: Connection reset"
+        )
+        self.assertEqual(len(posted), 1)
+
+    def test_harvest_pages(self):
+        pages = {
+            "/projects?page=1": {"projects": [{"id": 1}], "next_page": 2},
+            "/projects?page=2": {"projects": [{"id": 2}], "next_page": None},
+            "/tasks?page=1": {"message": "Forbidden"},
+        }
+
+        class PagedConnection(object):
+            def __init__(self, *args, **kwargs):
+                pass
+
+            def _get(self, path):
+                return pages[path]
+
+        class PagedHarvest(Harvest):
+            connection_factory = PagedConnection
+
+        harvest = PagedHarvest(
+            "https://example.org", "1", "t", rate_limiter=RateLimiter(0)
+        )
+        self.assertEqual([project["id"] for project in harvest.projects], [1, 2])
+        with redirect_stderr(StringIO()) as err:
+            self.assertEqual(harvest.tasks, [])
+        self.assertIn("Forbidden", err.getvalue())
+
     def test_get_booking_target(self):
         project_mapping = {"cynaptic_3000": "Cynaptic 3000"}
         task_mapping = {"meeting": "Meeting"}
@@ -219,6 +268,97 @@ class TestOctodon(unittest.TestCase):
         project, task = tracking.get_booking_target(self._make_booking("55555"))
         self.assertEqual(project, "")
 
+    def test_prefetch(self):
+        redmine = MockRedmine()
+        jira = MockJira()
+        tracking = Tracking(
+            trackers=[jira, redmine],
+            harvest=MockHarvest(),
+            project_history_file=CACHEFILE,
+        )
+        tracking.prefetch(["12346", "12345", None, "12345", "55555"])
+        self.assertEqual(redmine.requests, [["12345", "12346", "55555"]])
+        self.assertEqual(tracking.get_issue_title("12345"), "Create user list")
+        project, task = tracking.get_booking_target(self._make_booking("12346"))
+        self.assertEqual(project, "rrzzaa")
+        self.assertEqual(tracking.get_issue_title("55555"), "")
+        self.assertEqual(redmine.requests, [["12345", "12346", "55555"]])
+
+        # ids that weren't prefetched are still looked up one by one
+        self.assertEqual(tracking.get_issue_title("12347"), "Strategy Meeting")
+        self.assertEqual(redmine.requests[-1], "12347")
+
+    def test_issue_without_title(self):
+        untitled = Mock(spec=["get_issue"])
+        untitled.get_issue.return_value.get_title.return_value = ""
+        tracking = Tracking(
+            trackers=[untitled, MockRedmine()], project_history_file=CACHEFILE
+        )
+        # the next tracker is asked if the first one has no title
+        self.assertEqual(tracking.get_issue_title("12345"), "Create user list")
+        self.assertEqual(tracking.get_issue_title("12345"), "Create user list")
+        self.assertEqual(untitled.get_issue.call_count, 1)
+        with redirect_stderr(StringIO()):
+            self.assertEqual(tracking.get_issue_title("99"), "")
+        self.assertIsNotNone(tracking.get_issue("99"))
+
+    def test_retry_after_connection_error(self):
+        redmine = MockRedmine()
+        tracking = Tracking(
+            trackers=[redmine], harvest=None, project_history_file=CACHEFILE
+        )
+        with patch.object(
+            redmine, "_get_issue", side_effect=ConnectionError("refused")
+        ), redirect_stderr(StringIO()):
+            self.assertEqual(tracking.get_issue("12345"), None)
+        # the transport error isn't remembered, a confirmed miss is
+        self.assertEqual(tracking.get_issue_title("12345"), "Create user list")
+        with redirect_stderr(StringIO()):
+            self.assertEqual(tracking.get_issue("99"), None)
+            self.assertEqual(tracking.get_issue("99"), None)
+        self.assertEqual(redmine.requests, ["12345", "12345", "99"])
+
+    def test_session_prefetcher(self):
+        redmine = MockRedmine()
+        tracking = Tracking(
+            trackers=[redmine], harvest=None, project_history_file=CACHEFILE
+        )
+        tracking.prefetch(["12345"])
+        tmp = mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp)
+        sessionfile = os.path.join(tmp, "session")
+        booking = {
+            "project": "",
+            "activity": "Development",
+            "comments": "Extended API",
+            "description": "Extended API",
+            "time": 345.0,
+            "spent_on": "2012-01-01",
+            "issue_id": "12345",
+        }
+        activities = [{"id": 1, "name": "Development"}]
+        write_to_file([booking], datetime(2012, 1, 1), activities, sessionfile)
+        prefetcher = SessionPrefetcher(tracking, sessionfile, activities)
+        prefetcher.poll_interval = 0.01
+        prefetcher.start()
+        # the user adds a booking and saves
+        write_to_file(
+            [booking, dict(booking, issue_id="12347")],
+            datetime(2012, 1, 1),
+            activities,
+            sessionfile,
+        )
+        os.utime(sessionfile, (time.time() + 1, time.time() + 1))
+        for i in range(200):
+            if ["12347"] in redmine.requests:
+                break
+            time.sleep(0.01)
+        prefetcher.stop()
+        self.assertEqual(redmine.requests, [["12345"], ["12347"]])
+        self.assertEqual(redmine.project_requests, 1)
+        self.assertEqual(tracking.get_issue_title("12347"), "Strategy Meeting")
+        self.assertEqual(len(redmine.requests), 2)
+
     def test_remember_harvest_target(self):
         harvest = MockHarvest()
         bookings = [
@@ -397,6 +537,1146 @@ class TestOctodon(unittest.TestCase):
         )
 
 
+class TimeLogTestCase(unittest.TestCase):
+    """Runs each test in a temporary data home, with a plain text time log."""
+
+    def setUp(self):
+        self.tmp = mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp)
+        patcher = patch.dict(os.environ, {"XDG_DATA_HOME": self.tmp})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def write_time_log(self, log, name="time_log"):
+        log_path = os.path.join(self.tmp, name + ".txt")
+        with open(log_path, "w") as log_file:
+            log_file.write(log)
+        return log_path
+
+    def make_config(self, log, main="", sections="", name="time_log"):
+        """Return a configuration that reads log and no repositories."""
+        config = ConfigParser()
+        config.read_string(
+            "[main]\neditor = vim\nsource = plaintext\nvcs =\n{0}\n"
+            "[plaintext]\nlog_path = {1}\n{2}".format(
+                main, self.write_time_log(log, name), sections
+            )
+        )
+        return config
+
+
+class TestStartup(TimeLogTestCase):
+    def setUp(self):
+        super(TestStartup, self).setUp()
+        self.config = self.make_config(
+            "2019-11-14\n0900 Setup PLN-158\n1030\n",
+            sections="[jira]\nurl = http://localhost:1\nuser = me\n"
+            "password_command = false\n",
+        )
+        self.config.set("main", "vcs", "git")
+
+    def test_summary_without_backends(self):
+        octodon = Octodon(
+            self.config, datetime(2019, 11, 14), new_session=True, startup_times={}
+        )
+        out = StringIO()
+        with redirect_stdout(out):
+            octodon.onecmd("summary")
+            octodon.onecmd("total")
+        self.assertEqual(out.getvalue(), "total hours: 1:30\n 1:30\n")
+        self.assertIsNone(getattr(octodon, "_jira", None))
+        self.assertIsNone(getattr(octodon, "_vcs_list", None))
+        self.assertEqual(octodon.startup_times, {})
+
+    def test_startup_times(self):
+        self.config.remove_section("jira")
+        octodon = Octodon(
+            self.config, datetime(2019, 11, 14), new_session=True, startup_times={}
+        )
+        octodon.time_log
+        self.assertEqual(
+            list(octodon.startup_times),
+            ["time_log", "trackers", "jira", "redmine", "github"],
+        )
+        self.assertTrue(all(t >= 0 for t in octodon.startup_times.values()))
+
+    def test_lazy_imports(self):
+        modules = subprocess.check_output(
+            [
+                sys.executable,
+                "-c",
+                "import sys, octodon.cli; print(' '.join(sorted(sys.modules)))",
+            ],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        ).decode("utf-8")
+        self.assertNotIn("octodon.version_control", modules.split())
+        self.assertNotIn("octodon.redmine", modules.split())
+
+
+class TestTimings(unittest.TestCase):
+    def test_get_endpoint(self):
+        self.assertEqual(
+            get_endpoint("https://example.org/issues/12345.json?key=1"),
+            "/issues/{id}.json",
+        )
+        self.assertEqual(
+            get_endpoint("https://example.org/rest/api/2/issue/PLN-159/worklog"),
+            "/rest/api/2/issue/{id}/worklog",
+        )
+
+    def test_spans(self):
+        clock = FakeClock()
+        timings = Timings(clock=clock)
+        with timings.span("ignored"):
+            pass
+        timings.enabled = True
+        with timings.span("book"):
+            clock.now += 1
+            for i in range(2):
+                with timings.span("time log"):
+                    clock.now += 0.5
+            parent = timings.current_path()
+
+        def book():
+            with timings.span("harvest", parent=parent):
+                clock.now += 2
+
+        thread = threading.Thread(target=book)
+        thread.start()
+        thread.join()
+        self.assertEqual(
+            timings.spans,
+            {
+                ("book",): [1, 2.0],
+                ("book", "time log"): [2, 1.0],
+                ("book", "harvest"): [1, 2.0],
+            },
+        )
+        self.assertEqual(
+            timings.format_summary().split("\n")[3:8:2],
+            [
+                "| book       | 1     | 2000.0 ms |",
+                "|   harvest  | 1     | 2000.0 ms |",
+                "|   time log | 2     | 1000.0 ms |",
+            ],
+        )
+
+    def test_http_calls(self):
+        from requests import Session
+
+        timings = Timings()
+        timings.enabled = True
+        session = timings.install(Session(), "redmine")
+        hook = session.hooks["response"][0]
+        for status_code in (200, 404):
+            response = Mock(status_code=status_code)
+            response.request.method = "GET"
+            response.request.url = "https://example.org/issues/12345.json"
+            response.elapsed.total_seconds.return_value = 0.25
+            self.assertIs(hook(response), response)
+
+        json_file = os.path.join(mkdtemp(), "timings.json")
+        self.addCleanup(shutil.rmtree, os.path.dirname(json_file))
+        timings.write_json(json_file)
+        with open(json_file) as timings_file:
+            self.assertEqual(
+                json.load(timings_file),
+                {
+                    "spans": [],
+                    "http": [
+                        {
+                            "backend": "redmine",
+                            "method": "GET",
+                            "endpoint": "/issues/{id}.json",
+                            "count": 2,
+                            "seconds": 0.5,
+                            "errors": 1,
+                        }
+                    ],
+                },
+            )
+
+
+class TestBenchmark(unittest.TestCase):
+    def test_run_benchmarks(self):
+        settings = {"scale": 0.001, "repeat": 2, "latency": 0.0}
+        results = run_benchmarks(["get_facts", "octodon_day"], settings)
+        self.assertEqual(list(results), ["get_facts", "octodon_day"])
+        self.assertEqual(results["get_facts"]["size"], 1012)
+        self.assertLessEqual(
+            results["octodon_day"]["min"], results["octodon_day"]["median"]
+        )
+
+    def test_compare_results(self):
+        baseline = {
+            "get_facts": {"size": 1000, "min": 1.0, "median": 1.2},
+            "clean_up": {"size": 1000, "min": 1.0, "median": 1.2},
+        }
+        results = {
+            "get_facts": {"size": 1000, "min": 1.2, "median": 1.3},
+            "clean_up": {"size": 1000, "min": 1.3, "median": 1.3},
+            "git_log": {"size": 1000, "min": 1.3, "median": 1.3},
+        }
+        self.assertEqual(compare_results(results, baseline), ["clean_up"])
+        self.assertIn("| +30%   |", format_results(results, baseline))
+
+    def test_baseline_mismatches(self):
+        environment = {"interpreter": "CPython 3.11.7", "machine": "Linux x86_64"}
+        settings = {"scale": 1.0, "repeat": 3, "latency": 5.0}
+        saved = dict(settings, results={}, **environment)
+        self.assertEqual(baseline_mismatches(saved, settings, environment), [])
+        settings["repeat"] = 5
+        self.assertEqual(baseline_mismatches(saved, settings, environment), [])
+        settings["scale"] = 0.1
+        self.assertEqual(
+            baseline_mismatches(saved, settings, environment),
+            ["scale 0.1 instead of 1.0"],
+        )
+        del saved["machine"]
+        self.assertEqual(
+            baseline_mismatches(saved, settings, environment),
+            ["scale 0.1 instead of 1.0", "machine Linux x86_64 instead of None"],
+        )
+
+
+class TestFakeServer(TimeLogTestCase):
+    def setUp(self):
+        super(TestFakeServer, self).setUp()
+        self.server = FakeTrackerServer(data=FakeData(issues=10), page_size=3)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+    def requests_to(self, backend):
+        return dict(
+            ((method, endpoint), count)
+            for (name, method, endpoint), count in self.server.requests.items()
+            if name == backend
+        )
+
+    def test_redmine(self):
+        redmine = Redmine(self.server.url + "/redmine", "fake", "fake")
+        issues = redmine.get_issues([str(1000 + n) for n in range(1, 8)] + ["99"])
+        self.assertEqual(len(issues), 7)
+        self.assertEqual(issues["1002"].get_title(), "Issue 2")
+        self.assertEqual(issues["1002"].get_project(), "project-3")
+        self.assertEqual(self.requests_to("redmine")[("GET", "/issues.json")], 3)
+        booking = {
+            "issue_id": "1002",
+            "spent_on": "2019-11-13",
+            "time": 60.0,
+            "comments": "Review",
+            "description": "Review",
+            "activity": "Meeting",
+        }
+        results = redmine.book_time([booking, dict(booking, issue_id="99")])
+        self.assertEqual(results[0], "booked")
+        self.assertIn("Issue is invalid", results[1])
+        self.assertEqual(self.server.data.time_entries["redmine"][0]["activity_id"], 2)
+
+    def test_jira(self):
+        jira = Jira(self.server.url + "/jira", "fake", "fake")
+        issues = jira.get_issues(["PLN-{0}".format(n) for n in range(1, 8)])
+        self.assertEqual(len(issues), 7)
+        self.assertEqual(issues["PLN-7"].get_contracts(), ["project-8"])
+        # the client follows the pages of the search
+        self.assertEqual(self.requests_to("jira")[("GET", "/rest/api/2/search")], 3)
+
+    def test_github(self):
+        github = Github("fake", "acme", 1, url=self.server.url + "/github")
+        self.assertEqual(github.get_issue("acme/website#10").get_title(), "Issue 10")
+        self.assertEqual(self.requests_to("github")[("POST", "/graphql")], 4)
+        github.lookup = "targeted"
+        issues = github.get_issues(["acme/website#3", "acme/api#3"])
+        self.assertEqual(list(issues), ["acme/website#3"])
+        self.assertEqual(issues["acme/website#3"].get_contracts(), ["project-4"])
+
+    def test_harvest(self):
+        harvest = Harvest(self.server.url + "/harvest/v2", "1", "fake")
+        harvest.prefetch()
+        self.assertEqual(len(harvest.projects), 10)
+        self.assertEqual(len(harvest.tasks), 4)
+        self.assertEqual(self.requests_to("harvest")[("GET", "/v2/projects")], 4)
+
+    def test_harvest_retry_after(self):
+        harvest = Harvest(
+            self.server.url + "/harvest/v2", "1", "fake", rate_limiter=RateLimiter(0)
+        )
+        self.server.rate_limit = 3
+        # the fourth page is rejected with 429 and sent again after a second
+        self.assertEqual(len(harvest.projects), 10)
+        self.assertEqual(self.requests_to("harvest")[("GET", "/v2/projects")], 5)
+        self.assertGreater(harvest.rate_limiter._blocked_until, 0)
+
+    def test_errors(self):
+        import requests
+
+        self.server.rate_limit = 2
+        url = self.server.url + "/redmine/projects.json"
+        responses = [requests.get(url) for i in range(3)]
+        self.assertEqual([r.status_code for r in responses], [200, 200, 429])
+        self.assertEqual(responses[2].headers["Retry-After"], "1")
+        self.server.rate_limit = None
+        self.server.error_rate = 1.0
+        self.assertEqual(requests.get(url).status_code, 500)
+
+    def test_book_range(self):
+        config = self.make_config(
+            "2019-11-13\n0900 Review 1002\n1000 Planning PLN-3\n1100\n",
+            main="default-task = Development",
+            sections=self.server.get_config(),
+        )
+        octodon = Octodon(config, datetime(2019, 11, 13), new_session=True)
+        out = StringIO()
+        with redirect_stdout(out), redirect_stderr(StringIO()):
+            octodon.book_range(
+                datetime(2019, 11, 13),
+                datetime(2019, 11, 14),
+                targets=["redmine", "jira", "harvest"],
+                force=True,
+            )
+        self.assertIn(
+            "| 2019-11-13 | 2       |  2:00 | 1/2     | 1/2  | 2/2     |",
+            out.getvalue(),
+        )
+        entries = self.server.data.time_entries
+        self.assertEqual(entries["redmine"][0]["spent_on"], "2019-11-13")
+        self.assertEqual(entries["jira"][0]["issue"], "PLN-3")
+        self.assertEqual(
+            sorted(entry["project_id"] for entry in entries["harvest"]), [7003, 7004]
+        )
+
+
+class TestTeam(TimeLogTestCase):
+    def setUp(self):
+        super(TestTeam, self).setUp()
+        self.server = FakeTrackerServer(data=FakeData(issues=10))
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+    def make_member(self, name, log, options="", sections=None):
+        config = self.make_config(
+            log,
+            main="default-task = Development\n" + options,
+            sections=self.server.get_config() if sections is None else sections,
+            name=name,
+        )
+        config_file = os.path.join(self.tmp, name + ".cfg")
+        with open(config_file, "w") as config_fp:
+            config.write(config_fp)
+        return config_file
+
+    def test_run_team(self):
+        config_files = [
+            self.make_member(
+                "alice",
+                "2019-11-13\n0900 Review 1002\n1000 Planning PLN-3\n1100\n",
+                "task-mapping = Planning Meeting",
+            ),
+            self.make_member(
+                "bob", "2019-11-13\n0900 Fixes 1002\n1030 Tests 1004\n1100\n"
+            ),
+            self.make_member(
+                "carol", "2019-11-14\n0900 Support 1005\n0930\n", "name = Carol"
+            ),
+        ]
+        with redirect_stderr(StringIO()):
+            members = run_team(
+                config_files, datetime(2019, 11, 13), datetime(2019, 11, 15)
+            )
+        self.assertEqual([member.name for member in members], ["alice", "bob", "Carol"])
+        alice = members[0].days[date(2019, 11, 13)]
+        self.assertEqual(alice[1]["issue_title"], "Issue 3")
+        self.assertEqual(alice[1]["activity"], "Meeting")
+        self.assertEqual(members[1].days[date(2019, 11, 13)][0]["project"], "project-3")
+        self.assertEqual(members[2].days[date(2019, 11, 13)], [])
+        # the catalogs and issues are fetched once for the whole team
+        requests = self.server.requests
+        self.assertEqual(requests[("redmine", "GET", "/issues.json")], 1)
+        self.assertEqual(requests[("jira", "GET", "/rest/api/2/search")], 1)
+        self.assertEqual(requests[("harvest", "GET", "/v2/projects")], 1)
+        self.assertEqual(requests[("harvest", "GET", "/v2/tasks")], 1)
+
+        report = format_team_report(members)
+        self.assertIn("| alice  | 1    | 2       | 0        |  2:00 |", report)
+        self.assertIn("| Carol  | 1    | 1       | 0        |  0:30 |", report)
+        self.assertIn("| Team   |      | 5       | 0        |  4:30 |", report)
+        self.assertIn("| project-3 | 2       | 2       |  2:30 |", report)
+
+    def test_tracker_accounts(self):
+        catalogs = SharedCatalogs()
+        sections = self.server.get_config()
+        for name, user in [("alice", "fake"), ("bob", "fake"), ("carol", "carol")]:
+            config_file = self.make_member(
+                name,
+                "",
+                sections=sections.replace("user = fake", "user = " + user, 1),
+            )
+            catalogs.setup(TeamMember(config_file, datetime(2019, 11, 13)).octodon)
+        # carol uses another redmine account
+        redmines = [key for key in catalogs.trackers if key[0] == "redmine"]
+        self.assertEqual(len(redmines), 2)
+        self.assertEqual(len(catalogs.trackers), 4)
+
+
+class TestBookRange(TimeLogTestCase):
+    def setUp(self):
+        super(TestBookRange, self).setUp()
+        config = self.make_config(
+            "2019-11-13\n0900 Create list 12345\n1000\n"
+            "2019-11-14\n0900 Improve API 12346\n1100\n"
+        )
+        self.octodon = Octodon(config, datetime(2019, 11, 13), new_session=True)
+        self.redmine = MockRedmine()
+        self.harvest = MockHarvest()
+        self.octodon._trackers = [self.redmine]
+        self.octodon._harvest = self.harvest
+        self.octodon._activities = []
+
+    def test_book_range_to_trackers(self):
+        self.write_time_log(
+            "2019-11-13\n0900 Create list 12345\n1000 Planning PLN-159\n1100\n"
+        )
+        jira = MockJira()
+        jira.rate_limiter = RateLimiter(0)
+        jira._connection = MockJiraConnection(
+            {"PLN-159": make_jira_issue("PLN-159", "Framework Meeting", "PLN")}
+        )
+        harvest = Harvest(
+            "https://harvest.invalid/v2", "1", "t", rate_limiter=RateLimiter(0)
+        )
+        harvest._projects = [{"id": 1, "code": "cynaptic_3000", "name": "Cynaptic"}]
+        harvest._tasks = []
+        self.octodon._trackers = [jira, self.redmine]
+        self.octodon._jira = jira
+        self.octodon._harvest = harvest
+        response = Mock()
+        response.json.return_value = {}
+        with patch.object(
+            harvest.session, "request", return_value=response
+        ) as post, redirect_stdout(StringIO()), redirect_stderr(StringIO()):
+            self.octodon.book_range(
+                datetime(2019, 11, 13),
+                datetime(2019, 11, 14),
+                targets=["jira", "harvest"],
+                force=True,
+            )
+        self.assertEqual(len(jira.jira.worklogs), 1)
+        self.assertEqual(jira.jira.worklogs[0]["started"], datetime(2019, 11, 13))
+        self.assertEqual(post.call_count, 1)
+        self.assertEqual(
+            json.loads(post.call_args[1]["data"])["spent_date"], "2019-11-13"
+        )
+
+    def test_get_bookings_range(self):
+        days = self.octodon.get_bookings_range(
+            datetime(2019, 11, 13), datetime(2019, 11, 16)
+        )
+        self.assertEqual(
+            list(days), [date(2019, 11, 13), date(2019, 11, 14), date(2019, 11, 15)]
+        )
+        self.assertEqual(days[date(2019, 11, 13)][0]["issue_id"], "12345")
+        self.assertEqual(days[date(2019, 11, 13)][0]["project"], "cynaptic_3000")
+        self.assertEqual(days[date(2019, 11, 14)][0]["time"], 120.0)
+        self.assertEqual(
+            days[date(2019, 11, 14)][0]["issue_title"], "External API improvement"
+        )
+        self.assertEqual(days[date(2019, 11, 15)], [])
+        # the issues of all days are looked up with one request
+        self.assertEqual(self.redmine.requests, [["12345", "12346"]])
+
+    def test_book_range(self):
+        out = StringIO()
+        with redirect_stdout(out), redirect_stderr(StringIO()):
+            self.octodon.book_range(
+                datetime(2019, 11, 13),
+                datetime(2019, 11, 16),
+                targets=["harvest"],
+                force=True,
+            )
+        self.assertEqual(len(self.harvest.entries), 2)
+        self.assertIn("| 2019-11-13 | 1       |  1:00 | 1/1     |", out.getvalue())
+        self.assertIn("| 2019-11-14 | 1       |  2:00 | 1/1     |", out.getvalue())
+        self.assertIn("| 2019-11-15 | 0       |  0:00 | 0/0     |", out.getvalue())
+
+    def test_book_range_incomplete(self):
+        # without a repository, the entries have no comments
+        err = StringIO()
+        with redirect_stdout(StringIO()), redirect_stderr(err):
+            self.octodon.book_range(
+                datetime(2019, 11, 13), datetime(2019, 11, 16), targets=["harvest"]
+            )
+        self.assertIn("Nothing was booked", err.getvalue())
+        self.assertEqual(self.harvest.entries, [])
+        with redirect_stdout(StringIO()), redirect_stderr(StringIO()):
+            self.octodon.book_range(
+                datetime(2019, 11, 13),
+                datetime(2019, 11, 16),
+                targets=["harvest"],
+                force=True,
+            )
+        self.assertEqual(len(self.harvest.entries), 2)
+
+    def test_iter_bookings_range(self):
+        self.octodon.export_batch_size = 1
+        bookings = self.octodon.iter_bookings_range(
+            datetime(2019, 11, 13), datetime(2019, 11, 16)
+        )
+        entry = next(bookings)
+        self.assertEqual(entry["issue_title"], "Create user list")
+        # the second day isn't looked up before it's needed
+        self.assertEqual(self.redmine.requests, [["12345"]])
+        entry = next(bookings)
+        self.assertEqual(entry["project"], "rrzzaa")
+        self.assertEqual(list(bookings), [])
+        self.assertEqual(self.redmine.requests, [["12345"], ["12346"]])
+
+    def test_export(self):
+        out = StringIO()
+        with redirect_stdout(out):
+            self.octodon.export(datetime(2019, 11, 13), datetime(2019, 11, 16))
+        self.assertEqual(
+            out.getvalue().splitlines(),
+            [
+                "date,issue_id,issue_title,project,activity,hours,description,"
+                "comments",
+                "2019-11-13,12345,Create user list,cynaptic_3000,,1.00,Create list,",
+                "2019-11-14,12346,External API improvement,rrzzaa,,2.00,Improve API,",
+            ],
+        )
+        out = StringIO()
+        with redirect_stdout(out):
+            self.octodon.export(
+                datetime(2019, 11, 14), datetime(2019, 11, 15), format="jsonl"
+            )
+        row = json.loads(out.getvalue())
+        self.assertEqual(row["issue_id"], "12346")
+        self.assertEqual(row["hours"], "2.00")
+        self.octodon.list_item_template = "{date} {hours}h #{issue_id} {issue_title}"
+        path = os.path.join(self.tmp, "export.txt")
+        with redirect_stderr(StringIO()):
+            self.octodon.export(
+                datetime(2019, 11, 13), datetime(2019, 11, 16), "template", path
+            )
+        with open(path) as export_file:
+            self.assertEqual(
+                export_file.read(),
+                "2019-11-13 1.00h #12345 Create user list\n"
+                "2019-11-14 2.00h #12346 External API improvement\n",
+            )
+
+    def test_export_errors(self):
+        err = StringIO()
+        with redirect_stderr(err):
+            self.octodon.export(
+                datetime(2019, 11, 13),
+                datetime(2019, 11, 16),
+                filename=os.path.join(self.tmp, "missing", "export.csv"),
+            )
+        self.assertIn("Could not open", err.getvalue())
+        # errors while exporting aren't mistaken for the file not opening
+        path = os.path.join(self.tmp, "export.csv")
+        with patch.object(
+            self.octodon,
+            "iter_bookings_range",
+            side_effect=ConnectionError("Network is unreachable"),
+        ), redirect_stderr(StringIO()) as err:
+            self.assertRaises(
+                ConnectionError,
+                self.octodon.export,
+                datetime(2019, 11, 13),
+                datetime(2019, 11, 16),
+                filename=path,
+            )
+        self.assertNotIn("Could not open", err.getvalue())
+
+    def test_windowed_loginfo(self):
+        class MockVCS(object):
+            requests = []
+
+            def get_loginfo_range(self, start, end, mergewith={}):
+                self.requests.append((start.date(), end.date()))
+                loginfo = dict(mergewith)
+                loginfo[start.date()] = {"12345": ["Fixed"]}
+                return loginfo
+
+        vcs = MockVCS()
+        loginfo = WindowedLogInfo([vcs], datetime(2019, 11, 20), window=5)
+        self.assertEqual(loginfo.get(date(2019, 11, 13)), {"12345": ["Fixed"]})
+        self.assertEqual(loginfo.get(date(2019, 11, 14), {}), {})
+        self.assertEqual(loginfo.get(date(2019, 11, 18)), {"12345": ["Fixed"]})
+        self.assertIsNone(loginfo.get(date(2019, 11, 20)))
+        self.assertEqual(
+            vcs.requests,
+            [
+                (date(2019, 11, 13), date(2019, 11, 18)),
+                (date(2019, 11, 18), date(2019, 11, 20)),
+            ],
+        )
+
+
+class TestDaemon(TimeLogTestCase):
+    def setUp(self):
+        super(TestDaemon, self).setUp()
+        config = self.make_config("2019-11-14\n0900 Setup PLN-158\n1030\n")
+        self.socket_path = os.path.join(self.tmp, "octodon.sock")
+        self.daemon = OctodonDaemon(config, self.socket_path)
+        thread = threading.Thread(target=self.daemon.serve, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join)
+        for i in range(100):
+            if os.path.exists(self.socket_path):
+                break
+            time.sleep(0.01)
+
+    def tearDown(self):
+        request(self.socket_path, "shutdown")
+
+    def test_requests(self):
+        self.assertEqual(request(self.socket_path, "ping"), "pong")
+        result = request(self.socket_path, "run", line="summary", date="2019-11-14")
+        self.assertEqual(result["stdout"], "total hours: 1:30\n")
+        result = request(self.socket_path, "run", line="total", date="2019-11-15")
+        self.assertEqual(result["stdout"], " 0:00\n")
+        tracker = Mock(spec=["get_issue"])
+        tracker.get_issue.return_value.get_title.return_value = "Create user list"
+        self.daemon.octodon._tracking = Tracking(trackers=[tracker])
+        self.assertEqual(
+            request(self.socket_path, "issue_title", issue_id="PLN-158"),
+            "Create user list",
+        )
+
+    def test_errors(self):
+        with self.assertRaisesRegex(DaemonError, "Unknown command"):
+            request(self.socket_path, "frobnicate")
+        with self.assertRaisesRegex(DaemonError, "not available"):
+            request(self.socket_path, "run", line="edit")
+        with self.assertRaisesRegex(DaemonError, "TypeError"):
+            request(self.socket_path, "run", lines="summary")
+
+    def test_run_in_daemon(self):
+        config = ConfigParser()
+        config.read_string("[daemon]\nsocket = {0}\n".format(self.socket_path))
+        out = StringIO()
+        with redirect_stdout(out):
+            self.assertTrue(run_in_daemon(config, datetime(2019, 11, 14), "summary"))
+        self.assertEqual(out.getvalue(), "total hours: 1:30\n")
+        config.set("daemon", "socket", os.path.join(self.tmp, "missing.sock"))
+        self.assertFalse(run_in_daemon(config, datetime(2019, 11, 14), "summary"))
+
+    def test_run_in_daemon_declined(self):
+        config = ConfigParser()
+        config.read_string("[daemon]\nsocket = {0}\n".format(self.socket_path))
+        err = StringIO()
+        with redirect_stderr(err):
+            self.assertFalse(
+                run_in_daemon(
+                    config, datetime(2019, 11, 14), "summary", cfgfile="other.cfg"
+                )
+            )
+        self.assertIn("octodond runs with the default configuration", err.getvalue())
+        with self.assertRaises(DaemonUnavailable):
+            request(self.socket_path, "run", line="edit")
+
+    def test_run_in_daemon_failed(self):
+        config = ConfigParser()
+        config.read_string("[daemon]\nsocket = {0}\n".format(self.socket_path))
+        err = StringIO()
+        # once the command is sent it is not run again locally
+        with patch.object(
+            self.daemon, "do_run", side_effect=ConnectionError("timed out")
+        ), redirect_stderr(err):
+            self.assertTrue(run_in_daemon(config, datetime(2019, 11, 14), "book"))
+        self.assertIn("octodond failed: ConnectionError: timed out", err.getvalue())
+
+    def test_run_in_cwd(self):
+        config = ConfigParser()
+        config.read_string("[daemon]\nsocket = {0}\n".format(self.socket_path))
+        with patch.object(
+            self.daemon, "do_run", return_value={"stdout": "", "stderr": ""}
+        ) as do_run:
+            run_in_daemon(config, datetime(2019, 11, 14), "list save notes.txt")
+        self.assertEqual(do_run.call_args[1]["cwd"], os.getcwd())
+
+        client_cwd = os.path.join(self.tmp, "client")
+        os.mkdir(client_cwd)
+        cwd = os.getcwd()
+        # no trackers to find the projects in
+        with patch.object(self.daemon.octodon, "add_booking_targets"):
+            result = request(
+                self.socket_path,
+                "run",
+                line="list save notes.txt",
+                date="2019-11-14",
+                cwd=client_cwd,
+            )
+        self.assertEqual(os.getcwd(), cwd)
+        self.assertIn("Printed to notes.txt", result["stderr"])
+        self.assertTrue(os.path.exists(os.path.join(client_cwd, "notes.txt")))
+        self.assertFalse(os.path.exists(os.path.join(cwd, "notes.txt")))
+        with self.assertRaisesRegex(DaemonUnavailable, "No such directory"):
+            request(
+                self.socket_path,
+                "run",
+                line="summary",
+                cwd=os.path.join(self.tmp, "missing"),
+            )
+
+    def test_refresh(self):
+        tracker = Mock(spec=["get_issue"])
+        tracker.get_issue.side_effect = [NotFound(404), Mock(get_title=lambda: "New")]
+        self.daemon.octodon._tracking = Tracking(trackers=[tracker])
+        with redirect_stderr(StringIO()):
+            self.assertEqual(
+                request(self.socket_path, "issue_title", issue_id="PLN-160"), ""
+            )
+        # the issue was created in the meantime
+        self.assertEqual(
+            request(self.socket_path, "issue_title", issue_id="PLN-160"), "New"
+        )
+        octodon = self.daemon.octodon
+        self.daemon.config.read_string("[daemon]\ncache_ttl = 0\n")
+        time.sleep(0.01)
+        self.assertIsNot(self.daemon.octodon, octodon)
+
+
+class FailingBackend(object):
+    def book_time(self, bookings):
+        raise ConnectionError("Connection refused")
+
+
+class TestBook(unittest.TestCase):
+    def make_octodon(self):
+        config = ConfigParser()
+        config.read_string("[main]\neditor = vim\n")
+        octodon = Octodon(config, datetime(2012, 1, 1), new_session=True)
+        octodon._bookings = [
+            {
+                "project": "cynaptic_3000",
+                "activity": "Development",
+                "comments": "Extended API",
+                "description": "Extended API",
+                "time": 345.0,
+                "spent_on": "2012-01-01",
+                "issue_id": "12345",
+                "issue_title": "ReST API",
+            },
+            {
+                "project": "unknown",
+                "activity": "Development",
+                "comments": "Daily standup",
+                "description": "Daily standup",
+                "time": 15.0,
+                "spent_on": "2012-01-01",
+                "issue_id": None,
+                "issue_title": "",
+            },
+        ]
+        return octodon
+
+    def test_book_isolates_targets(self):
+        octodon = self.make_octodon()
+        octodon._harvest = MockHarvest()
+        octodon._jira = FailingBackend()
+        out = StringIO()
+        with redirect_stdout(out):
+            octodon.do_book()
+        self.assertEqual(len(octodon.harvest.entries), 1)
+        report = out.getvalue()
+        self.assertIn("booked", report)
+        self.assertIn("unknown project unknown", report)
+        self.assertIn(
+            "Error while booking - ConnectionError: Connection refused", report
+        )
+
+    def test_book_single_target(self):
+        octodon = self.make_octodon()
+        octodon._harvest = MockHarvest()
+        octodon._jira = FailingBackend()
+        out = StringIO()
+        with redirect_stdout(out):
+            octodon.do_harvest()
+        self.assertNotIn("jira", out.getvalue())
+        self.assertIn("harvest", out.getvalue())
+
+
+class TestRedmine(unittest.TestCase):
+    def test_project_catalog(self):
+        redmine = MockRedmine()
+        redmine.projects_cache_file = mkstemp(suffix=".pickle")[1]
+        self.assertEqual(redmine.get_issue("12345").get_project(), "cynaptic_3000")
+        self.assertEqual(redmine.get_issue("12346").get_project(), "rrzzaa")
+        self.assertEqual(redmine.project_requests, 1)
+
+        # a second instance reads the catalog from disk
+        cached = MockRedmine()
+        cached.projects_cache_file = redmine.projects_cache_file
+        cached.cache_ttl = 60
+        self.assertEqual(cached.get_issue("12346").get_project(), "rrzzaa")
+        self.assertEqual(cached.project_requests, 0)
+
+        # unknown projects reload the catalog once
+        self.assertEqual(cached.get_issue("12347").get_project(), None)
+        self.assertEqual(cached.get_issue("12347").get_project(), None)
+        self.assertEqual(cached.project_requests, 1)
+        os.remove(redmine.projects_cache_file)
+
+    def test_stale_project_catalog(self):
+        redmine = MockRedmine()
+        redmine.projects_cache_file = mkstemp(suffix=".pickle")[1]
+        write_cache(redmine.projects_cache_file, {"22": "old_identifier"})
+        os.utime(redmine.projects_cache_file, (0, 0))
+        redmine.cache_ttl = 60
+        self.assertEqual(redmine.get_issue("12345").get_project(), "cynaptic_3000")
+        os.remove(redmine.projects_cache_file)
+
+    def test_book_partial_failure(self):
+        with patch.dict(os.environ, {"XDG_DATA_HOME": mkdtemp()}):
+            redmine = Redmine("http://localhost:1/redmine", "me", "secret")
+        redmine._activities = [{"id": 9, "name": "Development", "is_default": True}]
+        booking = {
+            "issue_id": "12345",
+            "spent_on": "2019-11-13",
+            "time": 60.0,
+            "comments": "Review",
+            "description": "Review",
+            "activity": "Development",
+        }
+        with patch.object(
+            redmine.TimeEntry,
+            "save",
+            side_effect=[True, connection.Error("Connection reset")],
+        ):
+            results = redmine.book_time([booking, booking])
+        self.assertEqual(results[0], BOOKED)
+        self.assertEqual(results[1], "Error while booking - Error: Connection reset")
+
+    def test_lazy_activities(self):
+        data_home = mkdtemp()
+        with patch.dict(os.environ, {"XDG_DATA_HOME": data_home}):
+            redmine = Redmine("http://localhost:1/redmine", "me", "secret")
+            activities = [{"id": 9, "name": "Development", "is_default": True}]
+            write_cache(redmine.activities_cache_file, activities)
+            with patch.object(redmine.Enumerations, "get") as get:
+                self.assertEqual(redmine.activities, activities)
+                self.assertFalse(get.called)
+
+            os.utime(redmine.activities_cache_file, (0, 0))
+            redmine = Redmine("http://localhost:1/redmine", "me", "secret")
+            with patch.object(redmine.Enumerations, "get") as get:
+                get.return_value = activities[:]
+                self.assertEqual(redmine.activities, activities)
+                self.assertEqual(redmine.activities, activities)
+                self.assertEqual(get.call_count, 1)
+
+    def test_pooled_connection(self):
+        client_ports = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                client_ports.append(self.client_address[1])
+                if self.path.startswith("/redmine/issues/12345.json"):
+                    status = 200
+                    body = json.dumps(
+                        {
+                            "issue": {
+                                "id": 12345,
+                                "subject": "Create user list",
+                                "project": {"id": 22},
+                                "tracker": {"name": "Support"},
+                            }
+                        }
+                    ).encode("utf-8")
+                else:
+                    status = 404
+                    body = b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        with patch.dict(os.environ, {"XDG_DATA_HOME": mkdtemp()}):
+            redmine = Redmine(
+                "http://127.0.0.1:{0}/redmine".format(server.server_port),
+                "me",
+                "secret",
+            )
+        for i in range(3):
+            self.assertEqual(redmine.get_issue("12345").get_title(), "Create user list")
+        self.assertRaises(NotFound, redmine.get_issue, "12346")
+        self.assertEqual(len(client_ports), 4)
+        self.assertEqual(len(set(client_ports)), 1)
+
+
+class MockGraphql(object):
+    def __init__(self, pages):
+        self.pages = pages
+        self.requests = []
+
+    def __call__(self, query, variables):
+        self.requests.append(variables)
+        page = self.pages[len(self.requests) - 1]
+        return {
+            "data": {
+                "organization": {
+                    "projectV2": {
+                        "items": {
+                            "nodes": [
+                                {
+                                    "fieldValueByName": {"text": contract},
+                                    "content": {
+                                        "number": number,
+                                        "title": title,
+                                        "repository": {
+                                            "owner": {"login": "acme"},
+                                            "name": repo,
+                                        },
+                                    },
+                                }
+                                for repo, number, title, contract in page
+                            ],
+                            "pageInfo": {
+                                "endCursor": str(len(self.requests)),
+                                "hasNextPage": len(self.requests) < len(self.pages),
+                            },
+                        }
+                    }
+                }
+            }
+        }
+
+
+class TestGithub(unittest.TestCase):
+    def setUp(self):
+        patcher = patch.dict(os.environ, {"XDG_DATA_HOME": mkdtemp()})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def make_github(self, pages):
+        github = Github("token", "acme", 1, rate_limiter=RateLimiter(0))
+        github._github.graphql = MockGraphql(pages)
+        return github
+
+    def test_persistent_index(self):
+        github = self.make_github(
+            [
+                [("website", 12, "Fix login", "ACME-2024")],
+                [("api", 3, "Rate limits", None)],
+            ]
+        )
+        self.assertEqual(github.get_issue("acme/website#12").get_title(), "Fix login")
+        self.assertEqual(github.get_issue("acme/api#3").get_contracts(), [])
+        self.assertEqual(len(github._github.graphql.requests), 2)
+        self.assertEqual(github._github.graphql.requests[0]["filter"], None)
+
+        # a fresh index on disk answers without any request
+        github = self.make_github([])
+        self.assertEqual(
+            github.get_issue("acme/website#12").get_contracts(), ["ACME-2024"]
+        )
+        self.assertEqual(github._github.graphql.requests, [])
+
+    def test_incremental_sync(self):
+        github = self.make_github([[("website", 12, "Fix login", None)]])
+        github.issues
+        github = self.make_github([[("website", 12, "Fix all logins", None)]])
+        github.cache_ttl = 0
+        github.full_sync_ttl = 3600
+        self.assertEqual(
+            github.get_issue("acme/website#12").get_title(), "Fix all logins"
+        )
+        requests = github._github.graphql.requests
+        self.assertEqual(len(requests), 1)
+        self.assertTrue(requests[0]["filter"].startswith("updated:>="))
+
+    def test_sync_on_miss(self):
+        github = self.make_github([[("website", 12, "Fix login", None)]])
+        github.issues
+        github = self.make_github([[("website", 13, "New issue", None)]])
+        self.assertEqual(github.get_issue("acme/website#13").get_title(), "New issue")
+        self.assertEqual(github.get_issue("acme/website#14"), None)
+        self.assertEqual(len(github._github.graphql.requests), 1)
+
+    def test_full_sync(self):
+        github = self.make_github(
+            [[("website", 12, "Fix login", "ACME-2024"), ("api", 3, "Limits", None)]]
+        )
+        github.issues
+        # the card of acme/api#3 was removed from the board
+        github = self.make_github([[("website", 12, "Fix login", "ACME-2024")]])
+        github.cache_ttl = 0
+        github.full_sync_ttl = 0
+        self.assertEqual(github.get_issue("acme/api#3"), None)
+        self.assertEqual(github._github.graphql.requests[0]["filter"], None)
+        self.assertEqual(list(github.issues), ["acme/website#12"])
+
+    def test_sync_failure(self):
+        github = self.make_github([])
+        github._github.graphql = Mock(side_effect=GraphqlError("rate limited"))
+        with patch("octodon.github.logger"):
+            self.assertEqual(github.get_issue("acme/website#12"), None)
+            self.assertEqual(github.get_issue("acme/website#13"), None)
+        # the failed sync isn't repeated for every unknown issue
+        self.assertEqual(github._github.graphql.call_count, 1)
+
+    def test_targeted_lookup(self):
+        github = Github(
+            "token", "acme", 1, rate_limiter=RateLimiter(0), lookup="targeted"
+        )
+        github.max_aliases = 2
+        requests = []
+
+        def post(endpoint, json=None):
+            requests.append(json)
+            variables = json["variables"]
+            data = {}
+            for i in range(len(variables) // 3):
+                number = variables["n{0}".format(i)]
+                if number == 404:
+                    data["i{0}".format(i)] = {"issue": None}
+                    continue
+                data["i{0}".format(i)] = {
+                    "issue": {
+                        "title": "Issue {0}".format(number),
+                        "projectItems": {
+                            "nodes": [
+                                {
+                                    "project": {
+                                        "number": 2,
+                                        "owner": {"login": "acme"},
+                                    },
+                                    "fieldValueByName": {"text": "OTHER"},
+                                },
+                                {
+                                    "project": {
+                                        "number": 1,
+                                        "owner": {"login": "acme"},
+                                    },
+                                    "fieldValueByName": {"text": "ACME-2024"},
+                                },
+                            ]
+                        },
+                    }
+                }
+            return {"data": data}
+
+        github._github.post = post
+        issues = github.get_issues(
+            ["acme/website#12", "acme/api#404", "acme/website#12", "PLN-159"]
+        )
+        self.assertEqual(list(issues), ["acme/website#12"])
+        self.assertEqual(issues["acme/website#12"].get_title(), "Issue 12")
+        self.assertEqual(issues["acme/website#12"].get_contracts(), ["ACME-2024"])
+        self.assertEqual(len(requests), 1)
+        self.assertIn("i1: repository(owner: $o1, name: $r1)", requests[0]["query"])
+
+        github.get_issues(["acme/a#1", "acme/b#2", "acme/c#3"])
+        self.assertEqual(len(requests), 3)
+
+
+class TestJira(unittest.TestCase):
+    def test_get_issues(self):
+        jira = MockJira()
+        jira.rate_limiter = RateLimiter(0)
+        jira._connection = MockJiraConnection(
+            {
+                "CGUI-417": make_jira_issue("CGUI-417", "Improve usability", "CGUI"),
+                "PLN-159": make_jira_issue("PLN-159", "Framework Meeting", "PLN"),
+            }
+        )
+        issues = jira.get_issues(["CGUI-417", "#PLN-159", "PLN-160", "12345", None])
+        self.assertEqual(sorted(issues), ["CGUI-417", "PLN-159"])
+        self.assertEqual(issues["PLN-159"].get_title(), "Framework Meeting")
+        self.assertEqual(issues["CGUI-417"].get_project(), "CGUI")
+        self.assertEqual(len(jira.jira.searches), 1)
+        self.assertEqual(jira.jira.searches[0][1], Jira.issue_fields)
+        # the key that wasn't found is looked up on its own
+        self.assertEqual(jira.jira.lookups, ["PLN-160"])
+
+    def test_get_issues_moved(self):
+        jira = MockJira()
+        jira.rate_limiter = RateLimiter(0)
+        jira._connection = MockJiraConnection(
+            {"OPS-12": make_jira_issue("OPS-12", "Framework Meeting", "OPS")},
+            moved={"PLN-159": "OPS-12"},
+        )
+        tracking = Tracking(trackers=[jira], project_history_file=CACHEFILE)
+        tracking.prefetch(["PLN-159"])
+        self.assertEqual(tracking.get_issue_title("PLN-159"), "Framework Meeting")
+        self.assertEqual(jira.jira.lookups, ["PLN-159"])
+
+    def test_get_issues_chunked(self):
+        jira = MockJira()
+        jira.rate_limiter = RateLimiter(0)
+        jira.max_search_results = 2
+        jira._connection = MockJiraConnection({})
+        jira.get_issues(["A-1", "A-2", "A-3", "A-4", "A-5"])
+        self.assertEqual(
+            [jql for jql, fields in jira.jira.searches],
+            ["key in (A-1, A-2)", "key in (A-3, A-4)", "key in (A-5)"],
+        )
+
+    def test_get_issues_paged(self):
+        jira = MockJira()
+        jira.rate_limiter = RateLimiter(0)
+        jira._connection = MockJiraConnection(
+            dict(
+                (key, make_jira_issue(key, "Issue " + key, "A"))
+                for key in ["A-1", "A-2", "A-3"]
+            ),
+            page_size=2,
+        )
+        issues = jira.get_issues(["A-1", "A-2", "A-3"])
+        self.assertEqual(sorted(issues), ["A-1", "A-2", "A-3"])
+
+
+class TestKeywordMatcher(unittest.TestCase):
+    def test_first_match(self):
+        matcher = KeywordMatcher(["Review", "view", "meeting", "he", "she", "hers"])
+        self.assertEqual(matcher.first_match("a review"), 0)
+        self.assertEqual(matcher.first_match("interview"), 1)
+        self.assertEqual(matcher.first_match("ushers"), 3)
+        self.assertEqual(matcher.first_match("ush", "ers Meeting"), 2)
+        self.assertIsNone(matcher.first_match("coding", None))
+
+    def test_guess_task(self):
+        rnd = random.Random(0)
+        words = ["plan", "review", "meet", "mail", "call", "fix", "sync", "deploy"]
+        task_mapping = dict(
+            ("{0}{1}".format(rnd.choice(words), i % 7), "Task {0}".format(i))
+            for i in range(50)
+        )
+        harvest = MockHarvest(task_mapping=task_mapping, default_task="Development")
+
+        def guess_task(project, description):
+            for key, value in task_mapping.items():
+                if key.lower() in description.lower() or key.lower() in project.lower():
+                    return value
+            return "Development"
+
+        for i in range(200):
+            project = rnd.choice(words) + str(rnd.randint(0, 9))
+            description = " ".join(
+                rnd.choice(words).upper() + str(rnd.randint(0, 9)) for j in range(3)
+            )
+            self.assertEqual(
+                harvest.guess_task(project=project, description=description),
+                guess_task(project, description),
+            )
+        self.assertEqual(harvest.guess_task("other", "nothing"), "Development")
+        harvest.task_mapping = {"nothing": "Admin/Orga"}
+        self.assertEqual(harvest.guess_task("other", "nothing"), "Admin/Orga")
+
+
 class TestVCSLog(unittest.TestCase):
     def test_one_ticket(self):
         vcslog = VCSLog(patterns=[re.compile("#?([A-Z]+-[0-9]+)")])
@@ -428,6 +1708,427 @@ Date:   Thu Apr 15 16:14:48 2020 +0200
         )
 
 
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestRateLimiter(unittest.TestCase):
+    def test_burst_then_throttle(self):
+        clock = FakeClock()
+        limiter = RateLimiter(2.0, burst=3, clock=clock, sleep=clock.sleep)
+        for i in range(5):
+            limiter.acquire()
+        self.assertEqual(clock.sleeps, [0.5, 0.5])
+
+    def test_refill(self):
+        clock = FakeClock()
+        limiter = RateLimiter(1.0, burst=1, clock=clock, sleep=clock.sleep)
+        limiter.acquire()
+        clock.now += 5.0
+        limiter.acquire()
+        self.assertEqual(clock.sleeps, [])
+
+    def test_retry_after(self):
+        clock = FakeClock()
+        limiter = RateLimiter(10.0, clock=clock, sleep=clock.sleep)
+        self.assertEqual(limiter.update(429, {"Retry-After": "7"}), 7.0)
+        limiter.acquire()
+        self.assertEqual(clock.sleeps, [7.0])
+
+    def test_exhausted_rate_limit_headers(self):
+        headers = {"X-RateLimit-Remaining": "0", "X-RateLimit-Reset": "1000030"}
+        self.assertEqual(parse_rate_limit_reset(headers, now=1000000), 30.0)
+        headers = {"RateLimit-Remaining": "0", "RateLimit-Reset": "12"}
+        self.assertEqual(parse_rate_limit_reset(headers), 12.0)
+        headers = {"X-RateLimit-Remaining": "17", "X-RateLimit-Reset": "1000030"}
+        self.assertEqual(parse_rate_limit_reset(headers), None)
+
+    def test_parse_retry_after_date(self):
+        self.assertEqual(
+            parse_retry_after("Thu, 01 Jan 1970 00:01:40 GMT", now=40.0), 60.0
+        )
+        self.assertEqual(parse_retry_after("soon"), None)
+
+
+def make_git_repo(commits):
+    """Create a repository with commits given as (author, date, message)."""
+    repo = mkdtemp()
+    subprocess.check_call(["git", "init", "-q", "-b", "main", repo])
+    for author, commit_date, message in commits:
+        env = dict(
+            os.environ,
+            GIT_AUTHOR_NAME=author,
+            GIT_AUTHOR_EMAIL="{0}@example.org".format(author),
+            GIT_AUTHOR_DATE=commit_date,
+            GIT_COMMITTER_NAME=author,
+            GIT_COMMITTER_EMAIL="{0}@example.org".format(author),
+            GIT_COMMITTER_DATE=commit_date,
+        )
+        subprocess.check_call(
+            ["git", "commit", "-q", "--allow-empty", "-m", message], cwd=repo, env=env
+        )
+    return repo
+
+
+class SlowStream(BytesIO):
+    def read1(self, size=-1):
+        return self.read(3)
+
+
+class TestFindRepos(unittest.TestCase):
+    def setUp(self):
+        self.root = mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        for path in [
+            "project/.git",
+            "customer/one/.git",
+            "customer/one/node_modules/dep/.git",
+            "customer/two/.svn",
+            "customer/.venv/src/dep/.git",
+            "tools/env2/src/dep/.git",
+            "docs",
+        ]:
+            os.makedirs(os.path.join(self.root, path))
+        with open(os.path.join(self.root, "tools/env2/pyvenv.cfg"), "w"):
+            pass
+
+    def test_find_repos(self):
+        self.assertEqual(
+            find_repos([self.root], ".git"),
+            [
+                os.path.join(self.root, "customer/one"),
+                os.path.join(self.root, "project"),
+            ],
+        )
+        self.assertEqual(
+            find_repos([self.root], ".svn"), [os.path.join(self.root, "customer/two")]
+        )
+
+    def test_cache(self):
+        cache_dir = mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        cache_file = os.path.join(cache_dir, "repos.pickle")
+        repos = find_repos([self.root], ".git", cache_file=cache_file)
+        with patch("os.scandir") as scandir:
+            self.assertEqual(
+                find_repos([self.root], ".git", cache_file=cache_file), repos
+            )
+        self.assertFalse(scandir.called)
+
+        os.makedirs(os.path.join(self.root, "docs/.git"))
+        with patch("os.scandir", wraps=os.scandir) as scandir:
+            self.assertEqual(
+                find_repos([self.root], ".git", cache_file=cache_file),
+                [
+                    os.path.join(self.root, "customer/one"),
+                    os.path.join(self.root, "docs"),
+                    os.path.join(self.root, "project"),
+                ],
+            )
+        self.assertEqual(scandir.call_count, 1)
+
+
+class TestSvnLog(unittest.TestCase):
+    output = b"""<?xml version="1.0" encoding="UTF-8"?>
+<log>
+<logentry revision="1">
+<author>jane</author>
+<date>2019-11-12T12:00:00.000000Z</date>
+<msg>Before the range PLN-157</msg>
+</logentry>
+<logentry revision="2">
+<author>jane</author>
+<date>2019-11-13T12:00:00.000000Z</date>
+<msg>Setup
+
+Refs PLN-158</msg>
+</logentry>
+<logentry revision="3">
+<author>john</author>
+<date>2019-11-14T11:00:00.000000Z</date>
+<msg>Fix permissions PLN-159</msg>
+</logentry>
+<logentry revision="4">
+<author>jane</author>
+<date>2019-11-14T12:00:00.000000Z</date>
+<msg>Update translations PLN-160</msg>
+</logentry>
+</log>
+"""
+
+    def setUp(self):
+        self.repo = mkdtemp()
+        self.addCleanup(shutil.rmtree, self.repo)
+        patcher = patch("subprocess.Popen")
+        self.popen = patcher.start()
+        self.addCleanup(patcher.stop)
+        self.popen.return_value.stdout = BytesIO(self.output)
+        self.popen.return_value.wait.return_value = 0
+
+    def test_get_loginfo_range(self):
+        svnlog = SvnLog(
+            exe="svn", author="jane", repos=[self.repo], patterns=[Jira.ticket_pattern]
+        )
+        loginfo = svnlog.get_loginfo_range(
+            datetime(2019, 11, 13), datetime(2019, 11, 15)
+        )
+        self.assertEqual(
+            loginfo,
+            {
+                date(2019, 11, 13): {"PLN-158": ["Setup"]},
+                date(2019, 11, 14): {"PLN-160": ["Update translations"]},
+            },
+        )
+        command = self.popen.call_args[0][0]
+        self.assertEqual(command[:3], ["svn", "log", "--xml"])
+        self.assertNotIn("--search=jane", command)
+
+    def test_get_loginfo_all_authors(self):
+        svnlog = SvnLog(exe="svn", repos=[self.repo], patterns=[Jira.ticket_pattern])
+        loginfo = svnlog.get_loginfo(date=datetime(2019, 11, 14))
+        self.assertEqual(
+            loginfo,
+            {"PLN-159": ["Fix permissions"], "PLN-160": ["Update translations"]},
+        )
+
+
+@unittest.skipUnless(shutil.which("svnadmin"), "svn is not installed")
+class TestSvnRepository(unittest.TestCase):
+    def test_get_loginfo(self):
+        repo = mkdtemp()
+        self.addCleanup(shutil.rmtree, repo)
+        server = os.path.join(repo, "server")
+        checkout = os.path.join(repo, "checkout")
+        subprocess.check_call(["svnadmin", "create", server])
+        subprocess.check_call(["svn", "checkout", "-q", "file://" + server, checkout])
+        for number, message in enumerate(["First part\n\nPLN-159", "Other PLN-160"]):
+            file_name = os.path.join(checkout, "file{0}.txt".format(number))
+            with open(file_name, "w") as text_file:
+                text_file.write(message)
+            subprocess.check_call(["svn", "add", "-q", file_name])
+            subprocess.check_call(
+                ["svn", "commit", "-q", "--username", "jane", "-m", message],
+                cwd=checkout,
+            )
+        svnlog = SvnLog(
+            exe="svn", author="jane", repos=[checkout], patterns=[Jira.ticket_pattern]
+        )
+        today = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.assertEqual(
+            svnlog.get_loginfo(date=today),
+            {"PLN-159": ["First part"], "PLN-160": ["Other"]},
+        )
+
+
+@unittest.skipUnless(shutil.which("git"), "git is not installed")
+class TestGitLog(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.repo = make_git_repo(
+            [
+                ("jane", "2019-11-13T17:00:00", "Setup. Refs PLN-158"),
+                (
+                    "jane",
+                    "2019-11-14T09:00:00",
+                    "Extended creation script\n\nWith a second paragraph. Refs PLN-159",
+                ),
+                ("john", "2019-11-14T10:00:00", "Fix permissions PLN-159"),
+                ("jane", "2019-11-14T11:00:00", "Update translations PLN-160"),
+            ]
+        )
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        shutil.rmtree(self.repo)
+
+    def test_get_loginfo(self):
+        gitlog = GitLog(
+            exe="git", author="jane", repos=[self.repo], patterns=[Jira.ticket_pattern]
+        )
+        self.assertEqual(
+            gitlog.get_loginfo(date=datetime(2019, 11, 14)),
+            {
+                "PLN-159": ["Extended creation script  With a second paragraph"],
+                "PLN-160": ["Update translations"],
+            },
+        )
+
+    def test_get_loginfo_all_authors(self):
+        gitlog = GitLog(exe="git", repos=[self.repo], patterns=[Jira.ticket_pattern])
+        loginfo = gitlog.get_loginfo(date=datetime(2019, 11, 14))
+        self.assertEqual(len(loginfo["PLN-159"]), 2)
+
+    def test_multiple_repos(self):
+        other_repo = make_git_repo(
+            [("jane", "2019-11-14T08:00:00", "Prepare release PLN-159")]
+        )
+        self.addCleanup(shutil.rmtree, other_repo)
+        missing_repo = os.path.join(other_repo, "missing")
+        gitlog = GitLog(
+            exe="git",
+            author="jane",
+            repos=[other_repo, missing_repo, self.repo],
+            patterns=[Jira.ticket_pattern],
+            workers=3,
+        )
+        mergewith = {"PLN-159": ["Planning"]}
+        loginfo = gitlog.get_loginfo(date=datetime(2019, 11, 14), mergewith=mergewith)
+        self.assertEqual(
+            loginfo["PLN-159"],
+            [
+                "Planning",
+                "Prepare release",
+                "Extended creation script  With a second paragraph",
+            ],
+        )
+        self.assertEqual(mergewith, {"PLN-159": ["Planning"]})
+        self.assertEqual(os.getcwd(), self.cwd)
+
+    def test_commit_cache(self):
+        with patch.dict(os.environ, {"XDG_DATA_HOME": mkdtemp()}):
+            gitlog = GitLog(
+                exe="git",
+                author="jane",
+                repos=[self.repo],
+                patterns=[Jira.ticket_pattern],
+                cache=True,
+                cache_days=20000,
+            )
+            loginfo = gitlog.get_loginfo(date=datetime(2019, 11, 14))
+            self.assertEqual(
+                loginfo["PLN-159"],
+                ["Extended creation script  With a second paragraph"],
+            )
+            self.assertEqual(loginfo["PLN-160"], ["Update translations"])
+
+            # a fresh instance reads the cache from disk and doesn't run git
+            gitlog = GitLog(
+                exe="git",
+                author="jane",
+                repos=[self.repo],
+                patterns=[Jira.ticket_pattern],
+                cache=True,
+                cache_days=20000,
+            )
+            with patch("subprocess.Popen") as popen:
+                self.assertEqual(
+                    gitlog.get_loginfo(date=datetime(2019, 11, 14)), loginfo
+                )
+            self.assertFalse(popen.called)
+
+            # only the new commit is read once the branch has moved
+            subprocess.check_call(
+                ["git", "commit", "-q", "--allow-empty", "-m", "Docs PLN-161"],
+                cwd=self.repo,
+                env=dict(
+                    os.environ,
+                    GIT_AUTHOR_NAME="jane",
+                    GIT_AUTHOR_EMAIL="jane@example.org",
+                    GIT_COMMITTER_NAME="jane",
+                    GIT_COMMITTER_EMAIL="jane@example.org",
+                    GIT_COMMITTER_DATE="2019-11-14T12:00:00",
+                ),
+            )
+            with patch.object(
+                gitlog, "parse_commits", wraps=gitlog.parse_commits
+            ) as parse_commits:
+                loginfo = gitlog.get_loginfo(date=datetime(2019, 11, 14))
+            self.assertEqual(parse_commits.call_count, 1)
+            self.assertEqual(loginfo["PLN-161"], ["Docs"])
+            self.assertEqual(len(gitlog._commits[self.repo]["commits"]), 5)
+
+    def test_commit_cache_rewritten_history(self):
+        env = dict(
+            os.environ,
+            GIT_AUTHOR_NAME="jane",
+            GIT_AUTHOR_EMAIL="jane@example.org",
+            GIT_COMMITTER_NAME="jane",
+            GIT_COMMITTER_EMAIL="jane@example.org",
+            GIT_COMMITTER_DATE="2019-11-14T12:00:00",
+        )
+        with patch.dict(os.environ, {"XDG_DATA_HOME": mkdtemp()}):
+            gitlog = GitLog(
+                exe="git",
+                author="jane",
+                repos=[self.repo],
+                patterns=[Jira.ticket_pattern],
+                cache=True,
+                cache_days=20000,
+            )
+            gitlog.get_loginfo(date=datetime(2019, 11, 14))
+            # the last commit is amended with another ticket number
+            subprocess.check_call(
+                [
+                    "git",
+                    "commit",
+                    "-q",
+                    "--allow-empty",
+                    "--amend",
+                    "-m",
+                    "Update translations PLN-162",
+                ],
+                cwd=self.repo,
+                env=env,
+            )
+            loginfo = gitlog.get_loginfo(date=datetime(2019, 11, 14))
+            self.assertNotIn("PLN-160", loginfo)
+            self.assertEqual(loginfo["PLN-162"], ["Update translations"])
+            self.assertEqual(len(gitlog._commits[self.repo]["commits"]), 4)
+
+    def test_get_loginfo_range(self):
+        gitlog = GitLog(
+            exe="git", author="jane", repos=[self.repo], patterns=[Jira.ticket_pattern]
+        )
+        mergewith = {date(2019, 11, 13): {"PLN-157": ["Planning"]}}
+        with patch("subprocess.Popen", wraps=subprocess.Popen) as popen:
+            loginfo = gitlog.get_loginfo_range(
+                datetime(2019, 11, 12), datetime(2019, 11, 15), mergewith=mergewith
+            )
+        self.assertEqual(popen.call_count, 1)
+        self.assertEqual(
+            loginfo,
+            {
+                date(2019, 11, 12): {},
+                date(2019, 11, 13): {"PLN-157": ["Planning"], "PLN-158": ["Setup"]},
+                date(2019, 11, 14): {
+                    "PLN-159": ["Extended creation script  With a second paragraph"],
+                    "PLN-160": ["Update translations"],
+                },
+            },
+        )
+
+    def test_get_loginfo_range_cached(self):
+        with patch.dict(os.environ, {"XDG_DATA_HOME": mkdtemp()}):
+            gitlog = GitLog(
+                exe="git",
+                repos=[self.repo],
+                patterns=[Jira.ticket_pattern],
+                cache=True,
+                cache_days=20000,
+            )
+            loginfo = gitlog.get_loginfo_range(
+                datetime(2019, 11, 13), datetime(2019, 11, 15)
+            )
+        self.assertEqual(loginfo[date(2019, 11, 13)], {"PLN-158": ["Setup"]})
+        self.assertEqual(len(loginfo[date(2019, 11, 14)]["PLN-159"]), 2)
+
+    def test_streamed_parsing(self):
+        gitlog = GitLog()
+        stream = SlowStream(b"first\nmessage\0second\0\0third")
+        self.assertEqual(
+            list(gitlog.parse_log(stream)), ["first message", "second", "third"]
+        )
+
+
 class TestClockWork(unittest.TestCase):
     def test_single_entry(self):
         clockwork = ClockWorkTimeLog(ticket_patterns=[Jira.ticket_pattern])
@@ -669,10 +2370,53 @@ class TestClockWork(unittest.TestCase):
             ticket_patterns=[Jira.ticket_pattern], log_path=tmp_path
         )
         raw_log = "".join(clockwork.get_raw_log())
-        if raw_log.startswith(log_data_1):
-            self.assertEqual(raw_log, "".join((log_data_1, log_data_2)))
-        else:
-            self.assertEqual(raw_log, "".join((log_data_2, log_data_1)))
+        self.assertEqual(raw_log, "".join((log_data_1, log_data_2)))
+
+    def test_iter_timeinfo_range_directory(self):
+        tmp_path = mkdtemp()
+        # written out of order, and 2019-11-15 is split across two files
+        for name, log_data in [
+            ("log2.txt", "0800 Fix login\n0845\n2019-11-16:\n0900 Review\n0915\n"),
+            ("log1.txt", "2019-11-15:\n0850 Framework Meeting PLN-159\n0930\n"),
+        ]:
+            with open(os.path.join(tmp_path, name), "w") as log_file:
+                log_file.write(log_data)
+        clockwork = ClockWorkTimeLog(
+            ticket_patterns=[Jira.ticket_pattern], log_path=tmp_path
+        )
+        days = list(
+            clockwork.iter_timeinfo_range(datetime(2019, 11, 1), datetime(2019, 12, 1))
+        )
+        self.assertEqual(
+            [(day, [b["time"] for b in bookings]) for day, bookings in days],
+            [(date(2019, 11, 15), [40.0, 45.0]), (date(2019, 11, 16), [15.0])],
+        )
+
+    def test_iter_timeinfo_range_unordered(self):
+        tmp_fd, tmp_path = mkstemp(suffix=".tmp")
+        with os.fdopen(tmp_fd, "w") as tmp_file:
+            tmp_file.write(
+                "2019-11-16:\n0800 Fix login\n0845\n"
+                "2019-11-15:\n0850 Framework Meeting PLN-159\n0930\n"
+                "2019-11-16:\n0900 Review\n0915\n"
+            )
+        clockwork = ClockWorkTimeLog(
+            ticket_patterns=[Jira.ticket_pattern], log_path=tmp_path
+        )
+        err = StringIO()
+        with redirect_stderr(err):
+            days = list(
+                clockwork.iter_timeinfo_range(
+                    datetime(2019, 11, 1), datetime(2019, 12, 1)
+                )
+            )
+        # the days are yielded as they appear, only one is held at a time
+        self.assertEqual(
+            [day for day, bookings in days],
+            [date(2019, 11, 16), date(2019, 11, 15), date(2019, 11, 16)],
+        )
+        self.assertIn("of 2019-11-15 follow those of 2019-11-16", err.getvalue())
+        self.assertIn("of 2019-11-16 follow those of 2019-11-15", err.getvalue())
 
     def test_get_raw_log_glob(self):
         tmp_path = mkdtemp()
@@ -0,0 +1,155 @@
+from contextlib import contextmanager
+from octodon.utils import make_table
+from threading import local
+from threading import Lock
+from urllib.parse import urlsplit
+
+import json
+import re
+import time
+
+
+# path segments that identify a single resource, e.g. 123, 123.json, PLN-12
+resource_id_pattern = re.compile(r"^([0-9]+|[A-Z][A-Z0-9]*-[0-9]+)(\.[a-z]+)?$")
+
+
+def get_endpoint(url):
+    """Return the path of a URL with resource ids replaced by placeholders."""
+    segments = urlsplit(url).path.split("/")
+    for i, segment in enumerate(segments):
+        # keep API versions such as /rest/api/2/
+        if i and segments[i - 1] == "api":
+            continue
+        segments[i] = resource_id_pattern.sub(r"{id}\2", segment)
+    return "/".join(segments)
+
+
+class Timings(object):
+    """Collect nested timing spans and HTTP calls of a run.
+
+    Spans are identified by their path, i.e. the names of the enclosing
+    spans in the same thread and their own name. Spans with the same path
+    are added up. Nothing is recorded until ``enabled`` is set.
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.enabled = False
+        self.clock = clock
+        self.spans = {}
+        self.http_calls = {}
+        self._lock = Lock()
+        self._local = local()
+
+    def current_path(self):
+        return getattr(self._local, "path", ())
+
+    @contextmanager
+    def span(self, name, parent=None):
+        """Time the enclosed block as a child of the current span.
+
+        ``parent`` overrides the enclosing span, e.g. to attach work done in
+        a worker thread to the span that started it.
+        """
+        if not self.enabled:
+            yield
+            return
+        if parent is None:
+            parent = self.current_path()
+        path = parent + (name,)
+        previous = self.current_path()
+        self._local.path = path
+        started = self.clock()
+        try:
+            yield
+        finally:
+            elapsed = self.clock() - started
+            self._local.path = previous
+            with self._lock:
+                span = self.spans.setdefault(path, [0, 0.0])
+                span[0] += 1
+                span[1] += elapsed
+
+    def record_http(self, backend, method, url, seconds, status_code):
+        if not self.enabled:
+            return
+        key = (backend, method, get_endpoint(url))
+        with self._lock:
+            call = self.http_calls.setdefault(key, [0, 0.0, 0])
+            call[0] += 1
+            call[1] += seconds
+            if status_code >= 400:
+                call[2] += 1
+
+    def install(self, session, backend):
+        """Account for the requests made through a requests session."""
+
+        def account(response, *args, **kwargs):
+            self.record_http(
+                backend,
+                response.request.method,
+                response.request.url,
+                response.elapsed.total_seconds(),
+                response.status_code,
+            )
+            return response
+
+        session.hooks.setdefault("response", []).append(account)
+        return session
+
+    def as_dict(self):
+        spans = [
+            {"path": list(path), "count": count, "seconds": seconds}
+            for path, (count, seconds) in self.spans.items()
+        ]
+        http_calls = []
+        for key, (count, seconds, errors) in self.http_calls.items():
+            backend, method, endpoint = key
+            http_calls.append(
+                {
+                    "backend": backend,
+                    "method": method,
+                    "endpoint": endpoint,
+                    "count": count,
+                    "seconds": seconds,
+                    "errors": errors,
+                }
+            )
+        return {"spans": spans, "http": http_calls}
+
+    def write_json(self, file_name):
+        with open(file_name, "w") as json_file:
+            json.dump(self.as_dict(), json_file, indent=2)
+
+    def format_summary(self):
+        rows = []
+        # sorting the paths puts every span right after its parent
+        for path in sorted(self.spans):
+            count, seconds = self.spans[path]
+            rows.append(
+                [
+                    "  " * (len(path) - 1) + path[-1],
+                    str(count),
+                    "{0:.1f} ms".format(seconds * 1000),
+                ]
+            )
+        summary = make_table(rows, header=["Phase", "Calls", "Time"])
+        rows = []
+        for key in sorted(self.http_calls):
+            count, seconds, errors = self.http_calls[key]
+            rows.append(
+                list(key)
+                + [
+                    str(count),
+                    str(errors),
+                    "{0:.1f} ms".format(seconds * 1000),
+                    "{0:.1f} ms".format(seconds * 1000 / count),
+                ]
+            )
+        if rows:
+            header = ["Backend", "Method", "Endpoint", "Calls", "Errors", "Time", "Avg"]
+            summary += "\n" + make_table(rows, header=header)
+        return summary
+
+
+# timings of the current run, enabled with --timings
+timings = Timings()
@@ -1,10 +1,13 @@
 # from octodon.exceptions import ConnectionError
 from octodon.exceptions import NotFound
+from octodon.timing import timings
 from octodon.utils import get_data_home
+from octodon.utils import read_from_file
 
 import os
 import socket
 import sys
+import threading
 
 
 class Tracking(object):
@@ -18,6 +21,10 @@ class Tracking(object):
         self.trackers = trackers
         self._projects = []
         self._issue_to_project = {}
+        self._issues = {}
+        self._prefetched = {}
+        # guards the issue lookups, which may run in background threads
+        self._lock = threading.RLock()
         if project_history_file is None:
             self.project_history_file = os.path.join(
                 get_data_home(), "octodon-projects.pickle"
@@ -25,12 +32,83 @@ class Tracking(object):
         else:
             self.project_history_file = project_history_file
 
-    def get_issue_title(self, issue_id):
-        issue_title = ""
+    def prefetch(self, issue_ids, quiet=False):
+        """Resolve many issues up front with one batch call per tracker.
+
+        Trackers without a ``get_issues`` method are left out; their issues
+        are looked up one by one when they are first needed. With quiet set,
+        failures aren't reported.
+        """
+        with self._lock:
+            self._prefetch(issue_ids, quiet)
+
+    def _resolved(self, issue_id):
+        """Whether issue_id is known to be missing or has been found with a title."""
+        if issue_id not in self._issues:
+            return False
+        issue = self._issues[issue_id]
+        return issue is None or bool(issue.get_title())
+
+    def _prefetch(self, issue_ids, quiet):
+        remaining = set(
+            issue_id
+            for issue_id in issue_ids
+            if issue_id is not None and not self._resolved(issue_id)
+        )
         for tracker in self.trackers:
-            issue = None
+            get_issues = getattr(tracker, "get_issues", None)
+            # the batch lookup already came up empty for some of them
+            lookup = [
+                issue_id
+                for issue_id in remaining
+                if tracker not in self._prefetched.get(issue_id, ())
+            ]
+            if not lookup or get_issues is None:
+                continue
             try:
-                issue = tracker.get_issue(issue_id)
+                with timings.span(tracker.__class__.__name__ + " batch lookup"):
+                    issues = get_issues(sorted(lookup))
+            except NotFound as nf:
+                if not quiet:
+                    print(
+                        "Could not look up issues: {0} - {1}".format(
+                            nf.status_code, nf.text
+                        ),
+                        file=sys.stderr,
+                    )
+                continue
+            except (ConnectionError, socket.error):
+                if not quiet:
+                    print("Could not look up issues", file=sys.stderr)
+                continue
+            for issue_id in lookup:
+                self._prefetched.setdefault(issue_id, set()).add(tracker)
+            for issue_id, issue in issues.items():
+                if not self._resolved(issue_id):
+                    self._issues[issue_id] = issue
+            # issues without a title are looked for in the next tracker
+            remaining -= set(
+                issue_id for issue_id in issues if self._resolved(issue_id)
+            )
+
+    def get_issue(self, issue_id):
+        with self._lock:
+            return self._get_issue(issue_id)
+
+    def _get_issue(self, issue_id):
+        issue = self._issues.get(issue_id)
+        if self._resolved(issue_id):
+            return issue
+        failed = False
+        tried = self._prefetched.setdefault(issue_id, set())
+        for tracker in self.trackers:
+            if tracker in tried:
+                # the tracker was already asked for it
+                continue
+            found = None
+            try:
+                with timings.span(tracker.__class__.__name__ + " lookup"):
+                    found = tracker.get_issue(issue_id)
             except NotFound as nf:
                 print(
                     "Could not find issue {0}: {1} - {2}".format(
@@ -39,16 +117,48 @@ class Tracking(object):
                     file=sys.stderr,
                 )
             except (ConnectionError, socket.error):
-                print(
-                    "Could not find issue " + str(issue_id),
-                    file=sys.stderr,
-                )
-            if issue is None:
+                print("Could not find issue " + str(issue_id), file=sys.stderr)
+                failed = True
+                continue
+            tried.add(tracker)
+            if found is None:
                 continue
-            issue_title = issue.get_title()
-            if issue_title:
+            # an issue without a title is only used if no tracker has a better one
+            if issue is None or not issue.get_title():
+                issue = found
+            if found.get_title():
                 break
-        return issue_title
+        if issue is not None or not failed:
+            # only a confirmed miss is remembered, transport errors are retried
+            self._issues[issue_id] = issue
+        return issue
+
+    def forget_misses(self):
+        """Drop the issues that weren't found, so they're looked up again."""
+        with self._lock:
+            for issue_id in list(self._issues):
+                if self._issues[issue_id] is None:
+                    del self._issues[issue_id]
+            for issue_id in list(self._prefetched):
+                if self._issues.get(issue_id) is None:
+                    del self._prefetched[issue_id]
+
+    def warm_up(self):
+        """Load the project catalogs behind the issues looked up so far."""
+        with self._lock:
+            issues = [issue for issue in self._issues.values() if issue is not None]
+        for issue in issues:
+            try:
+                issue.get_project()
+            except Exception:
+                # reported when the booking targets are determined
+                pass
+
+    def get_issue_title(self, issue_id):
+        issue = self.get_issue(issue_id)
+        if issue is None:
+            return ""
+        return issue.get_title()
 
     def get_booking_target(self, entry):
         harvest_projects = [project["code"] for project in self.harvest.projects]
@@ -58,29 +168,14 @@ class Tracking(object):
         project = ""
         contracts = []
         if issue_no is not None:
-            for tracker in self.trackers:
-                try:
-                    issue = tracker.get_issue(issue_no)
-                except NotFound as nf:
-                    print(
-                        "Could not find issue {0}: {1} - {2}".format(
-                            str(issue_no), nf.status_code, nf.text
-                        ),
-                        file=sys.stderr,
-                    )
-                except (ConnectionError, socket.error):
-                    print("Could not find issue " + str(issue_no), file=sys.stderr)
-                if issue:
-                    break
+            issue = self.get_issue(issue_no)
 
         if issue is not None:
             try:
                 project = issue.get_project()
             except Exception as e:
                 print(
-                    "Could not get project identifier: {0}; {1}".format(
-                        issue["project"]["name"], e
-                    ),
+                    "Could not get project identifier: {0}; {1}".format(issue_no, e),
                     file=sys.stderr,
                 )
                 project = ""
@@ -119,3 +214,66 @@ class Tracking(object):
             project=project, description=entry["description"]
         )
         return harvest_project, task
+
+
+class SessionPrefetcher(object):
+    """Prefetch in background threads while the session file is edited.
+
+    The harvest projects and tasks and the projects of the known issues are
+    loaded, and issues newly entered into the session file are looked up
+    whenever it is saved. Failures are left to be retried and reported once
+    the editor is closed.
+    """
+
+    poll_interval = 0.5
+
+    def __init__(self, tracking, sessionfile, activities):
+        self.tracking = tracking
+        self.sessionfile = sessionfile
+        self.activities = activities
+        self.stopped = threading.Event()
+        self.threads = []
+
+    def start(self):
+        jobs = [self.tracking.warm_up, self.watch_session]
+        if self.tracking.harvest:
+            jobs.append(self.tracking.harvest.prefetch)
+        for job in jobs:
+            thread = threading.Thread(target=self._run, args=(job,), daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def _run(self, job):
+        try:
+            job()
+        except Exception:
+            pass
+
+    def stop(self):
+        """Stop watching and wait for the running requests to finish."""
+        self.stopped.set()
+        for thread in self.threads:
+            thread.join()
+
+    def watch_session(self):
+        mtime = None
+        while True:
+            try:
+                current = os.stat(self.sessionfile).st_mtime
+            except OSError:
+                current = None
+            if current is not None and current != mtime:
+                mtime = current
+                try:
+                    spent_on, bookings = read_from_file(
+                        self.sessionfile, self.activities
+                    )
+                except Exception:
+                    # the file is being written or has syntax errors
+                    bookings = []
+                self.tracking.prefetch(
+                    (entry["issue_id"] for entry in bookings), quiet=True
+                )
+            if self.stopped.wait(self.poll_interval):
+                break
@@ -3,14 +3,26 @@ from datetime import timedelta
 from functools import reduce
 from tempfile import NamedTemporaryFile
 
+import hashlib
 import math
 import os
+import pickle
 import re
 import sys
+import time
 
 
 ticket_pattern = re.compile("#([A-Z0-9-]+)")
 
+# per-entry results of a booking target's book_time
+BOOKED = "booked"
+SKIPPED = "-"
+
+
+def booking_error(error):
+    """The result of an entry that couldn't be booked because of error."""
+    return "Error while booking - {0}: {1}".format(error.__class__.__name__, error)
+
 
 def get_default_activity(activities):
     default_activity = [act for act in activities if act.get("is_default", False)]
@@ -45,20 +57,22 @@ def pad(string, length):
 
 
 def make_row(entry, activities):
-    act_name = entry["activity"]
+    act_name = entry["activity"] or ""
     return [
         "1",
         entry["description"],
         format_spent_time(entry["time"]),
         act_name,
         entry["issue_id"] or "",
-        entry["project"],
+        entry["project"] or "",
         entry["comments"],
     ]
 
 
-def make_table(rows):
-    rows = [["L", "Headline", "Time", "Activity", "iss", "Project", "Comments"]] + rows
+def make_table(rows, header=None):
+    if header is None:
+        header = ["L", "Headline", "Time", "Activity", "iss", "Project", "Comments"]
+    rows = [header] + rows
     columns = zip(*rows)
     max_lens = [max([len(entry) for entry in column]) for column in columns]
     out_strs = []
@@ -75,6 +89,25 @@ def make_table(rows):
     return "\n".join(out_strs)
 
 
+def make_status_table(bookings, results):
+    """Tabulate the outcome of booking each entry to each target.
+
+    ``results`` maps a target name to the list of per-entry results that
+    its ``book_time`` returned.
+    """
+    targets = list(results)
+    rows = []
+    for i, entry in enumerate(bookings):
+        row = [
+            entry["issue_id"] or "",
+            entry["description"],
+            format_spent_time(entry["time"]),
+        ]
+        row.extend([results[target][i] for target in targets])
+        rows.append(row)
+    return make_table(rows, header=["iss", "Headline", "Time"] + targets)
+
+
 def get_time_sum(bookings):
     if len(bookings) == 0:
         return 0.0
@@ -206,3 +239,36 @@ def get_data_home():
     if not os.path.exists(os.path.join(xdg_home, "octodon")):
         os.mkdir(os.path.join(xdg_home, "octodon"))
     return os.path.join(xdg_home, "octodon")
+
+
+def read_cache(file_name, max_age=None):
+    """Return the data pickled to file_name, or None if missing or stale.
+
+    ``max_age`` is the time in seconds after which the cache is considered
+    stale.
+    """
+    try:
+        mtime = os.path.getmtime(file_name)
+    except OSError:
+        return None
+    if max_age is not None and time.time() - mtime > max_age:
+        return None
+    try:
+        with open(file_name, "rb") as cache:
+            return pickle.load(cache)
+    except (OSError, EOFError, pickle.UnpicklingError):
+        return None
+
+
+def write_cache(file_name, data):
+    """Pickle data to file_name, replacing the previous cache atomically."""
+    tmp_name = "{0}.{1}.tmp".format(file_name, os.getpid())
+    with open(tmp_name, "wb") as cache:
+        pickle.dump(data, cache)
+    os.replace(tmp_name, file_name)
+
+
+def get_cache_file(prefix, key):
+    """Return a cache path in the data home that is unique for key."""
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+    return os.path.join(get_data_home(), "{0}-{1}.pickle".format(prefix, digest))
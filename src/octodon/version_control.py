@@ -1,16 +1,134 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
 from datetime import datetime
 from datetime import timedelta
+from datetime import timezone
+from functools import partial
+from octodon.utils import get_cache_file
+from octodon.utils import read_cache
+from octodon.utils import write_cache
+from tempfile import TemporaryFile
+from xml.etree import ElementTree
 
 import os
 import re
+import shlex
 import subprocess
 import sys
+import time
 
 
 ref_keyword_pattern = re.compile("([Rr]efs? ?|[Ff]ixes ?)$")
 
 
+# directories that never hold repositories worth scanning
+prune_dirs = frozenset(
+    [
+        "__pycache__",
+        "bower_components",
+        "env",
+        "node_modules",
+        "site-packages",
+        "venv",
+    ]
+)
+
+
+def _scan_dir(path, marker):
+    """Return whether path is a repository and which subdirectories to walk."""
+    subdirs = []
+    try:
+        entries = list(os.scandir(path))
+    except OSError:
+        return False, ()
+    names = set(entry.name for entry in entries)
+    if marker in names:
+        return True, ()
+    if "pyvenv.cfg" in names:
+        # a virtualenv, whatever it is called
+        return False, ()
+    for entry in entries:
+        if entry.name.startswith(".") or entry.name in prune_dirs:
+            continue
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.name)
+        except OSError:
+            continue
+    return False, tuple(sorted(subdirs))
+
+
+def find_repos(roots, marker, cache_file=None):
+    """Find the working copies below the root directories.
+
+    A directory is a working copy if it contains ``marker``, e.g. ``.git``;
+    working copies, hidden directories, virtualenvs and ``prune_dirs`` are
+    not descended into. The listing of every directory is cached along with
+    its mtime, so later walks only have to stat the directories and list
+    the ones that changed.
+    """
+    cache = {}
+    if cache_file:
+        cache = read_cache(cache_file) or {}
+    listings = {}
+    repos = []
+    paths = [os.path.abspath(os.path.expanduser(root)) for root in reversed(roots)]
+    while paths:
+        path = paths.pop()
+        if path in listings:
+            continue
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            continue
+        listing = cache.get(path)
+        if listing is None or listing[0] != mtime:
+            listing = (mtime,) + _scan_dir(path, marker)
+        listings[path] = listing
+        if listing[1]:
+            repos.append(path)
+        else:
+            paths.extend(os.path.join(path, name) for name in reversed(listing[2]))
+    if cache_file and listings != cache:
+        write_cache(cache_file, listings)
+    return repos
+
+
+class WindowedLogInfo(object):
+    """The ticket references of the days up to end, read a window at a time.
+
+    Days should be asked for in ascending order: the repositories are read
+    for ``window`` days from the first day asked for, and the previous
+    window is dropped, so memory doesn't grow with the length of the range.
+    """
+
+    def __init__(self, vcs_list, end, window=7):
+        self.vcs_list = vcs_list
+        self.end = end.date()
+        self.window = window
+        self.start = self.stop = None
+        self.loginfo = {}
+
+    def get(self, day, default=None):
+        if day >= self.end:
+            return default
+        if self.start is None or not self.start <= day < self.stop:
+            self.start = day
+            self.stop = min(day + timedelta(self.window), self.end)
+            self.loginfo = {}
+            for vcs in self.vcs_list:
+                self.loginfo = vcs.get_loginfo_range(
+                    datetime(day.year, day.month, day.day),
+                    datetime(self.stop.year, self.stop.month, self.stop.day),
+                    mergewith=self.loginfo,
+                )
+        return self.loginfo.get(day, default)
+
+
 class VCSLog(object):
+    repos = []
+    workers = 1
+
     def __init__(self, exe=None, patterns=[]):
         self.exe = exe
         self.patterns = patterns
@@ -28,8 +146,44 @@ class VCSLog(object):
                     logdict.setdefault(match.group(1), []).append(comment)
         return logdict
 
-    def _get_loginfo(self, command, args, mergewith={}):
-        logdict = mergewith
+    def parse_log(self, stream):
+        """Split the raw output of a log command into commit messages."""
+        out = stream.read().decode("utf-8", "replace")
+        return [
+            entry.replace("\n", " ").strip() for entry in out.split("\n\n") if entry
+        ]
+
+    def read_log(self, command, cwd=None, parse=None):
+        """Run a log command and yield its commit messages as they arrive.
+
+        Raises CalledProcessError once the output is consumed if the command
+        failed.
+        """
+        if parse is None:
+            parse = self.parse_log
+        with TemporaryFile() as errors:
+            process = subprocess.Popen(
+                command, cwd=cwd, stdout=subprocess.PIPE, stderr=errors
+            )
+            try:
+                for entry in parse(process.stdout):
+                    yield entry
+            finally:
+                process.stdout.close()
+                returncode = process.wait()
+            if returncode:
+                errors.seek(0)
+                raise subprocess.CalledProcessError(
+                    returncode, command, output=errors.read().decode("utf-8")
+                )
+
+    def _map_repos(self, func):
+        """Call func for every existing repository, several at a time.
+
+        The results are returned in the order of ``self.repos``, regardless
+        of which repository finishes first.
+        """
+        repos = []
         for repo in self.repos:
             if not os.path.exists(repo):
                 print(
@@ -37,69 +191,420 @@ class VCSLog(object):
                     file=sys.stderr,
                 )
                 continue
-            os.chdir(repo)
-            try:
-                out = subprocess.check_output(" ".join(command + args), shell=True)
-            except subprocess.CalledProcessError as cpe:
-                print(
-                    "%s returned %d: %s" % (command, cpe.returncode, cpe.output),
-                    file=sys.stderr,
-                )
-                continue
-            out = out.decode("utf-8")
-            log = [
-                entry.replace("\n", " ").strip() for entry in out.split("\n\n") if entry
-            ]
-            logdict = self.extract_loginfo(log, logdict)
+            repos.append(repo)
+        workers = max(1, min(self.workers, len(repos)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return list(executor.map(func, repos))
+
+    def _merge_loginfo(self, results, mergewith={}):
+        logdict = dict(
+            (ticket, list(comments)) for ticket, comments in mergewith.items()
+        )
+        for repo_logdict in results:
+            for ticket, comments in repo_logdict.items():
+                logdict.setdefault(ticket, []).extend(comments)
         return logdict
 
+    def parse_dated_log(self, stream):
+        """Split the raw output of a log command into (date, message) pairs."""
+        raise NotImplementedError
+
+    def bucket_loginfo(self, log):
+        """Extract the ticket references of (date, message) pairs by day."""
+        messages = {}
+        for day, entry in log:
+            messages.setdefault(day, []).append(entry)
+        return dict(
+            (day, self.extract_loginfo(entries)) for day, entries in messages.items()
+        )
+
+    def _get_repo_loginfo(self, repo, command, parse=None, extract=None):
+        if extract is None:
+            extract = self.extract_loginfo
+        try:
+            return extract(self.read_log(command, cwd=repo, parse=parse))
+        except OSError as e:
+            print("Could not run {0}: {1}".format(command[0], e), file=sys.stderr)
+        except subprocess.CalledProcessError as cpe:
+            print(
+                "%s returned %d: %s" % (command, cpe.returncode, cpe.output),
+                file=sys.stderr,
+            )
+        return {}
+
+    def _get_loginfo(self, command, args, mergewith={}):
+        """Run the log command in all repositories concurrently."""
+        return self._merge_loginfo(
+            self._map_repos(partial(self._get_repo_loginfo, command=command + args)),
+            mergewith,
+        )
+
+    def _get_loginfo_range(self, command, args, start, end, mergewith={}):
+        """Run one log command per repository covering the whole range."""
+        return self._merge_loginfo_range(
+            self._map_repos(
+                partial(
+                    self._get_repo_loginfo,
+                    command=command + args,
+                    parse=self.parse_dated_log,
+                    extract=self.bucket_loginfo,
+                )
+            ),
+            start,
+            end,
+            mergewith,
+        )
+
+    def _merge_loginfo_range(self, results, start, end, mergewith={}):
+        days = [
+            (start + timedelta(offset)).date() for offset in range((end - start).days)
+        ]
+        return dict(
+            (
+                day,
+                self._merge_loginfo(
+                    [repo_loginfo.get(day, {}) for repo_loginfo in results],
+                    mergewith.get(day, {}),
+                ),
+            )
+            for day in days
+        )
+
     def get_loginfo(self, date=datetime.now(), mergewith={}):
         raise NotImplemented
 
+    def get_loginfo_range(self, start, end, mergewith={}):
+        """Return the ticket references of every day in [start, end).
+
+        The result maps each ``date`` in the range to a dict of ticket ids
+        and comments like the one returned by ``get_loginfo``.
+        """
+        raise NotImplementedError
+
 
 class SvnLog(VCSLog):
-    def __init__(self, exe="/usr/bin/svn", author=None, repos=[], patterns=[]):
+    def __init__(
+        self, exe="/usr/bin/svn", author=None, repos=[], patterns=[], workers=4
+    ):
         self.exe = exe
         self.author = author
         self.repos = repos
         self.patterns = patterns
+        self.workers = workers
+
+    def parse_entries(self, stream, since, until):
+        """Parse ``svn log --xml`` incrementally into (time, message) pairs.
+
+        Entries by other authors or outside [since, until) are skipped, since
+        svn also reports the revision that was current at the start date.
+        """
+        root = None
+        for event, elem in ElementTree.iterparse(stream, events=("start", "end")):
+            if root is None:
+                root = elem
+            if event != "end" or elem.tag != "logentry":
+                continue
+            author = elem.findtext("author")
+            timestamp = elem.findtext("date")
+            message = (elem.findtext("msg") or "").replace("\n", " ").strip()
+            # drop parsed entries so memory use doesn't grow with the history
+            root.clear()
+            if not timestamp or not message:
+                continue
+            if self.author and author != self.author:
+                continue
+            timestamp = datetime.strptime(timestamp[:19], "%Y-%m-%dT%H:%M:%S")
+            timestamp = timestamp.replace(tzinfo=timezone.utc).astimezone()
+            timestamp = timestamp.replace(tzinfo=None)
+            if since <= timestamp < until:
+                yield timestamp, message
+
+    def parse_dated_log(self, stream, since, until):
+        for timestamp, message in self.parse_entries(stream, since, until):
+            yield timestamp.date(), message
 
     def get_loginfo(self, date=datetime.now(), mergewith={}):
-        command = [self.exe, "log"]
-        args = ['-r "{%s}:{%s}"' % (date, date + timedelta(1))]
-        if self.author:
-            args.append('--search="%s"' % self.author)
-        return self._get_loginfo(command=command, args=args, mergewith=mergewith)
+        day = date.date()
+        loginfo = self.get_loginfo_range(
+            date, date + timedelta(1), mergewith={day: mergewith}
+        )
+        return loginfo[day]
+
+    def get_loginfo_range(self, start, end, mergewith={}):
+        command = shlex.split(self.exe) + [
+            "log",
+            "--xml",
+            "-r",
+            "{%s}:{%s}" % (start.isoformat(), end.isoformat()),
+        ]
+        return self._merge_loginfo_range(
+            self._map_repos(
+                partial(
+                    self._get_repo_loginfo,
+                    command=command,
+                    parse=partial(self.parse_dated_log, since=start, until=end),
+                    extract=self.bucket_loginfo,
+                )
+            ),
+            start,
+            end,
+            mergewith,
+        )
+
+
+def read_ref_tips(repo):
+    """Read the branch tips of a git repository without running git.
+
+    Returns a dict mapping branch ref names to commit ids, or None if the
+    refs can't be read directly, e.g. with the reftable backend.
+    """
+    git_dir = os.path.join(repo, ".git")
+    if os.path.isfile(git_dir):
+        # worktrees and submodules point to their git directory
+        with open(git_dir) as git_file:
+            content = git_file.read().strip()
+        if not content.startswith("gitdir:"):
+            return None
+        git_dir = os.path.join(repo, content[len("gitdir:") :].strip())
+    elif not os.path.isdir(git_dir):
+        git_dir = repo
+    commondir_file = os.path.join(git_dir, "commondir")
+    if os.path.isfile(commondir_file):
+        with open(commondir_file) as commondir:
+            git_dir = os.path.join(git_dir, commondir.read().strip())
+    heads = os.path.join(git_dir, "refs", "heads")
+    if not os.path.isdir(heads) or os.path.exists(os.path.join(git_dir, "reftable")):
+        return None
+
+    tips = {}
+    packed_refs = os.path.join(git_dir, "packed-refs")
+    if os.path.isfile(packed_refs):
+        with open(packed_refs) as packed:
+            for line in packed:
+                if line.startswith(("#", "^")):
+                    continue
+                sha, _, name = line.strip().partition(" ")
+                if name.startswith("refs/heads/"):
+                    tips[name] = sha
+    for root, dirs, files in os.walk(heads):
+        for file_name in files:
+            path = os.path.join(root, file_name)
+            name = "refs/heads/" + os.path.relpath(path, heads).replace(os.sep, "/")
+            with open(path) as ref:
+                sha = ref.read().strip()
+            if re.match("^[0-9a-f]{40,64}$", sha):
+                tips[name] = sha
+    return tips
 
 
 class GitLog(VCSLog):
-    def __init__(self, exe="/usr/bin/git", author=None, repos=[], patterns=[]):
+    # %x1f separates the fields of a commit, -z separates the commits
+    commit_format = "--format=%H%x1f%ct%x1f%an <%ae>%x1f%B"
+
+    def __init__(
+        self,
+        exe="/usr/bin/git",
+        author=None,
+        repos=[],
+        patterns=[],
+        workers=4,
+        cache=False,
+        cache_days=365,
+    ):
         self.exe = exe
         self.author = author
         self.repos = repos
         self.patterns = patterns
+        self.workers = workers
+        self.cache = cache
+        self.cache_days = cache_days
+        self._commits = {}
+
+    def split_log(self, stream):
+        """Yield the NUL separated records of ``git log -z`` incrementally."""
+        rest = b""
+        for chunk in iter(partial(stream.read1, 65536), b""):
+            records = (rest + chunk).split(b"\0")
+            rest = records.pop()
+            for record in records:
+                yield record.decode("utf-8", "replace")
+        if rest:
+            yield rest.decode("utf-8", "replace")
+
+    def parse_log(self, stream):
+        for record in self.split_log(stream):
+            entry = record.replace("\n", " ").strip()
+            if entry:
+                yield entry
+
+    def parse_dated_log(self, stream):
+        for record in self.split_log(stream):
+            timestamp, _, message = record.lstrip("\n").partition("\x1f")
+            entry = message.replace("\n", " ").strip()
+            if entry:
+                yield date.fromtimestamp(int(timestamp)), entry
+
+    def parse_commits(self, stream):
+        for record in self.split_log(stream):
+            fields = record.lstrip("\n").split("\x1f", 3)
+            if len(fields) == 4:
+                sha, timestamp, author, message = fields
+                yield sha, int(timestamp), author, message.strip()
+
+    def get_commits(self, repo):
+        """Return the cached commits of a repository.
+
+        Commits are cached as (timestamp, author, message) by commit id in
+        the data home, together with the branch tips they were read at. As
+        long as the tips haven't moved git isn't run at all; otherwise only
+        the commits that aren't reachable from the old tips are read, and
+        the commits no branch leads to anymore, e.g. after an amend, a rebase
+        or a deleted branch, are dropped. Returns None if the cache can't be
+        used for this repository.
+        """
+        tips = read_ref_tips(repo)
+        if tips is None:
+            return None
+        cache = self._commits.get(repo)
+        cache_file = get_cache_file("octodon-git-commits", os.path.abspath(repo))
+        if cache is None:
+            cache = read_cache(cache_file)
+        if cache is None:
+            since = datetime.now() - timedelta(self.cache_days)
+            since = since.replace(hour=0, minute=0, second=0, microsecond=0)
+            cache = {"since": since, "tips": {}, "commits": {}}
+        if cache["tips"] != tips:
+            command = shlex.split(self.exe) + [
+                "--no-pager",
+                "log",
+                "--branches",
+                "-z",
+                self.commit_format,
+                "--since=%s" % cache["since"],
+                "--ignore-missing",
+            ]
+            command.extend("^" + sha for sha in sorted(set(cache["tips"].values())))
+            try:
+                for sha, timestamp, author, message in self.read_log(
+                    command, cwd=repo, parse=self.parse_commits
+                ):
+                    cache["commits"][sha] = (timestamp, author, message)
+                if cache["tips"]:
+                    self.prune_commits(repo, cache)
+            except OSError as e:
+                print("Could not run {0}: {1}".format(command[0], e), file=sys.stderr)
+                return None
+            except subprocess.CalledProcessError as cpe:
+                print(
+                    "%s returned %d: %s" % (command, cpe.returncode, cpe.output),
+                    file=sys.stderr,
+                )
+                return None
+            cache["tips"] = tips
+            write_cache(cache_file, cache)
+        self._commits[repo] = cache
+        return cache
+
+    def prune_commits(self, repo, cache):
+        """Drop the cached commits that aren't on any branch anymore."""
+        command = shlex.split(self.exe) + [
+            "rev-list",
+            "--branches",
+            "--since=%s" % cache["since"],
+        ]
+        reachable = set(
+            self.read_log(
+                command,
+                cwd=repo,
+                parse=lambda stream: (line.decode("ascii").strip() for line in stream),
+            )
+        )
+        for sha in set(cache["commits"]) - reachable:
+            del cache["commits"][sha]
+
+    def _get_cached_log(self, cache, since, until):
+        """Return the cached commits in [since, until) as (date, message)."""
+        since = time.mktime(since.timetuple())
+        until = time.mktime(until.timetuple())
+        author_pattern = self.author and re.compile(self.author)
+        return [
+            (date.fromtimestamp(timestamp), message.replace("\n", " "))
+            for timestamp, author, message in sorted(cache["commits"].values())
+            if since <= timestamp < until
+            and (not author_pattern or author_pattern.search(author))
+        ]
+
+    def _get_cached_repo_loginfo(self, repo, command, since, until):
+        cache = self.get_commits(repo)
+        if cache is None or since < cache["since"]:
+            return self._get_repo_loginfo(repo, command)
+        log = self._get_cached_log(cache, since, until)
+        return self.extract_loginfo(entry for day, entry in log)
+
+    def _get_cached_repo_loginfo_range(self, repo, command, since, until):
+        cache = self.get_commits(repo)
+        if cache is None or since < cache["since"]:
+            return self._get_repo_loginfo(
+                repo,
+                command,
+                parse=self.parse_dated_log,
+                extract=self.bucket_loginfo,
+            )
+        return self.bucket_loginfo(self._get_cached_log(cache, since, until))
+
+    def get_loginfo_range(self, start, end, mergewith={}):
+        command = shlex.split(self.exe) + [
+            "--no-pager",
+            "log",
+            "--branches",
+            "--reverse",
+            "-z",
+            "--format=%ct%x1f%B",
+            "--since=%s" % start,
+            "--until=%s" % end,
+        ]
+        if self.author:
+            command.append("--author=%s" % self.author)
+        if not self.cache:
+            return self._get_loginfo_range(command, [], start, end, mergewith)
+        return self._merge_loginfo_range(
+            self._map_repos(
+                partial(
+                    self._get_cached_repo_loginfo_range,
+                    command=command,
+                    since=start,
+                    until=end,
+                )
+            ),
+            start,
+            end,
+            mergewith,
+        )
 
     def get_loginfo(self, date=datetime.now(), mergewith={}):
-        command = [
-            self.exe,
+        command = shlex.split(self.exe) + [
             "--no-pager",
             "-c",
             "color.diff=false",
             "log",
             "--branches",
             "--reverse",
-            "--pretty=%h",
+            "-z",
+            "--format=%B",
         ]
-        args = ['--since="{%s}"' % date, '--until="{%s}"' % (date + timedelta(1))]
+        args = ["--since=%s" % date, "--until=%s" % (date + timedelta(1))]
         if self.author:
-            args.append('--author="%s"' % self.author)
-        command = (
-            command
-            + args
-            + (
-                "| while read sha1; do "
-                "git show -s --format='%B' $sha1 | tr -d '\n'; echo; "
-                "done".split(" ")
-            )
+            args.append("--author=%s" % self.author)
+        if not self.cache:
+            return self._get_loginfo(command=command, args=args, mergewith=mergewith)
+        return self._merge_loginfo(
+            self._map_repos(
+                partial(
+                    self._get_cached_repo_loginfo,
+                    command=command + args,
+                    since=date,
+                    until=date + timedelta(1),
+                )
+            ),
+            mergewith,
         )
-        return self._get_loginfo(command=command, args=[], mergewith=mergewith)